@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+F0 推定ベンチマーク: 従来のフレームごとの np.correlate ループ vs 一括 rFFT 版（pitch.estimate_f0_batch）
+
+    python benchmarks/bench_f0.py [--seconds 30]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'netlify', 'functions'))
+from pitch import estimate_f0_batch  # noqa: E402
+
+
+def estimate_f0_loop(audio_data, sample_rate):
+    """比較用: 置き換え前の estimate_f0（f0_analyze.py）"""
+    frame_size = int(sample_rate * 0.025)
+    hop_size = int(sample_rate * 0.010)
+    min_period = max(1, int(sample_rate / 400))
+    max_period = min(frame_size // 2, int(sample_rate / 80))
+    f0_values = []
+    for i in range(0, len(audio_data) - frame_size, hop_size):
+        frame = audio_data[i:i + frame_size]
+        autocorr = np.correlate(frame, frame, mode='full')
+        autocorr = autocorr[len(autocorr)//2:]
+        if max_period <= min_period:
+            f0_values.append(0)
+            continue
+        seg = autocorr[min_period:max_period]
+        peak_idx = np.argmax(seg) + min_period
+        if peak_idx > 0:
+            f0_values.append(sample_rate / peak_idx)
+        else:
+            f0_values.append(0)
+    return f0_values
+
+
+def make_voice(sample_rate, seconds, seed=0):
+    """F0 がゆっくり変化する調波音 + ノイズ"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    f0 = 140 + 40 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    x = sum((1.0 / h) * np.sin(h * phase) for h in range(1, 8))
+    x += 0.05 * rng.standard_normal(len(t))
+    return (x / np.max(np.abs(x)) * 0.8).astype(np.float32)
+
+
+def timeit(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--seconds', type=float, default=30.0)
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    print('%-8s %8s %10s %10s %8s %9s' % ('rate', 'frames', 'loop[s]', 'batch[s]', 'speedup', 'agree[%]'))
+    for sr in (16000, 22050, 44100):
+        x = make_voice(sr, args.seconds)
+        t_loop, ref = timeit(lambda: estimate_f0_loop(x, sr), 1)
+        t_batch, out = timeit(lambda: estimate_f0_batch(x, sr), args.repeat)
+        assert len(ref) == len(out)
+        agree = 100.0 * np.mean(np.isclose(ref, out)) if ref else 100.0
+        print('%-8d %8d %10.3f %10.3f %7.1fx %9.2f' % (sr, len(out), t_loop, t_batch, t_loop / t_batch, agree))
+
+
+if __name__ == '__main__':
+    main()
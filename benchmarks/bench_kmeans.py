@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+k-means++ / Bregman k-means のベンチマーク: 従来の点ごとの Python ループ vs bregman エンジン（一括計算）
+従来版は点数を絞って測り、1 点・1 中心あたりの時間から N 点での所要時間を見積もる。
+エンジンは N 点 × D 次元（既定 100 万 × 64、float32）で k-means++ と Lloyd 反復の実時間を測る。
+
+    python benchmarks/bench_kmeans.py [--n 1000000] [--dim 64] [--k 16]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'netlify', 'functions'))
+from bregman import kmeans, kmeans_pp  # noqa: E402
+
+
+def _skew_jensen_legacy(p, q, alpha):
+    """比較用: 置き換え前の skew_jensen（F=squared、呼び出しごとに np.asarray）"""
+    p, q = np.asarray(p, dtype=float), np.asarray(q, dtype=float)
+    alpha = float(np.clip(alpha, 1e-6, 1 - 1e-6))
+    F = lambda x: float(np.sum(np.asarray(x, dtype=float) ** 2))
+    return float((1 - alpha) * F(p) + alpha * F(q) - F((1 - alpha) * p + alpha * q))
+
+
+def kmeans_pp_legacy(points, k, alpha=0.5):
+    """比較用: 置き換え前の kmeans_pp（毎回すべての中心との min を Python で取る）"""
+    points = np.asarray(points, dtype=float)
+    n = len(points)
+    indices = [int(np.random.randint(0, n))]
+    for _ in range(k - 1):
+        d2 = np.array([min(_skew_jensen_legacy(points[i], points[c], alpha) for c in indices) for i in range(n)])
+        d2 = np.maximum(d2, 0)
+        probs = d2 / (np.sum(d2) + 1e-12)
+        indices.append(int(np.random.choice(n, p=probs)))
+    return indices
+
+
+def blobs(n, dim, k, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(0.5, 10, size=(k, dim)).astype(np.float32)
+    labels = rng.integers(k, size=n)
+    X = centers[labels]
+    X += rng.normal(0, 0.3, size=X.shape).astype(np.float32)
+    np.abs(X, out=X)
+    return X
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--n', type=int, default=1000000)
+    ap.add_argument('--dim', type=int, default=64)
+    ap.add_argument('--k', type=int, default=16)
+    ap.add_argument('--legacy-n', type=int, default=2000)
+    ap.add_argument('--max-iter', type=int, default=20)
+    args = ap.parse_args()
+
+    small = blobs(args.legacy_n, args.dim, args.k)
+    t0 = time.perf_counter()
+    kmeans_pp_legacy(small, args.k)
+    t_legacy = time.perf_counter() - t0
+    # 従来版は 1 ステップごとに (既存の中心数) × n 回の呼び出し: 合計 n·k(k-1)/2
+    per_call = t_legacy / (args.legacy_n * args.k * (args.k - 1) / 2)
+    est = per_call * args.n * args.k * (args.k - 1) / 2
+    print('legacy kmeans_pp: n=%d k=%d %.2f s -> estimated %.0f s for n=%d' % (args.legacy_n, args.k, t_legacy, est, args.n))
+
+    t0 = time.perf_counter()
+    X = blobs(args.n, args.dim, args.k)
+    print('data: %d x %d float32 (%.0f MB), generated in %.1f s' % (args.n, args.dim, X.nbytes / 1e6, time.perf_counter() - t0))
+
+    print('%-34s %10s %8s %14s' % ('engine', 'time[s]', 'iters', 'inertia'))
+    for kind, F_name in (('skew_jensen', 'squared'), ('bregman', 'squared'), ('bregman', 'entropy'),
+                         ('skew_jensen', 'entropy')):
+        t0 = time.perf_counter()
+        kmeans_pp(X, args.k, kind, 0.5, F_name, seed=0)
+        t_pp = time.perf_counter() - t0
+        print('%-34s %10.2f' % ('kmeans_pp %s/%s' % (kind, F_name), t_pp))
+        t0 = time.perf_counter()
+        r = kmeans(X, args.k, kind, 0.5, F_name, max_iter=args.max_iter, seed=0)
+        t_km = time.perf_counter() - t0
+        print('%-34s %10.2f %8d %14.4g' % ('kmeans %s/%s' % (kind, F_name), t_km, r['iterations'], r['inertia']))
+
+
+if __name__ == '__main__':
+    main()
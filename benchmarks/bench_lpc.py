@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+フレームごとの LPC のベンチマーク: フレームごとの Python ループ（np.correlate + スカラーの Levinson-Durbin）vs lpc.analyze
+従来相当のループは先頭の一部のフレームだけ測って全体を見積もり、lpc.analyze は N 秒（既定 1 時間・16 kHz）の
+信号全体を次数 48 で処理して実時間と作業領域のピーク（tracemalloc）を測る。結果が一致することも確認する。
+
+    python benchmarks/bench_lpc.py [--seconds 3600] [--order 48] [--sr 16000]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'netlify', 'functions'))
+from lpc import PRE_EMPHASIS, analyze  # noqa: E402
+
+
+def levinson_scalar(r, order):
+    a = [1.0] + [0.0] * order
+    err = r[0]
+    for i in range(1, order + 1):
+        acc = r[i] + sum(a[j] * r[i - j] for j in range(1, i))
+        k = -acc / err
+        a = [a[j] + k * a[i - j] if 0 < j < i else a[j] for j in range(order + 1)]
+        a[i] = k
+        err *= 1 - k * k
+    return np.array(a)
+
+
+def loop_lpc(x, sr, order, n_frames):
+    """比較用: フレームごとに自己相関と Levinson-Durbin を Python で回す"""
+    frame_len, hop = int(sr * 0.025), int(sr * 0.010)
+    x = x.astype(np.float64)
+    pe = np.append(x[:1], x[1:] - PRE_EMPHASIS * x[:-1])
+    window = np.hamming(frame_len)
+    out = []
+    for i in range(n_frames):
+        f = pe[i * hop:i * hop + frame_len] * window
+        r = np.correlate(f, f, 'full')[frame_len - 1:frame_len + order]
+        r[0] *= 1 + 1e-9
+        out.append(levinson_scalar(r, order))
+    return np.array(out)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--seconds', type=float, default=3600)
+    ap.add_argument('--sr', type=int, default=16000)
+    ap.add_argument('--order', type=int, default=48)
+    ap.add_argument('--loop-frames', type=int, default=500)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    x = (0.1 * rng.normal(size=int(args.seconds * args.sr))).astype(np.float32)
+    n_frames = (len(x) - int(args.sr * 0.025)) // int(args.sr * 0.010) + 1
+
+    t0 = time.perf_counter()
+    ref = loop_lpc(x, args.sr, args.order, args.loop_frames)
+    t_loop = time.perf_counter() - t0
+    print('loop:    %d frames %.2f s -> estimated %.0f s for %d frames' % (
+        args.loop_frames, t_loop, t_loop / args.loop_frames * n_frames, n_frames))
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    frames = 0
+    first = None
+    for block in analyze(x, args.sr, args.order):
+        frames += len(block['time'])
+        if first is None:
+            first = block['lpc'][:args.loop_frames]
+    t_batch = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print('batched: %d frames %.2f s, working-set peak %.1f MB (input %.1f MB)' % (
+        frames, t_batch, peak / 1e6, x.nbytes / 1e6))
+    print('max |a_loop - a_batched| = %.2e' % float(np.max(np.abs(ref - first))))
+
+
+if __name__ == '__main__':
+    main()
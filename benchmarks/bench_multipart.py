@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+multipart/form-data パーサの検証コーパスとベンチマーク。
+まず境界まわりの扱いにくいケースで parse_multipart / parse_multipart_stream の結果を確認し、
+次に 20 MB の WAV アップロードで従来の split 版と処理時間・ピークメモリを比較する。
+
+    python benchmarks/bench_multipart.py [--mb 20]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'netlify', 'functions'))
+from multipart import extract_boundary, parse_multipart, parse_multipart_stream  # noqa: E402
+
+
+def parse_multipart_split(body_bytes, boundary):
+    """比較用: 置き換え前の parse_multipart（split + strip）"""
+    if not boundary or not body_bytes:
+        return {}, {}
+    boundary = boundary.strip().strip('"').replace('\r', '')
+    sep = b'--' + boundary.encode('utf-8') if isinstance(boundary, str) else b'--' + boundary
+    parts = body_bytes.split(sep)
+    fields = {}
+    files = {}
+    for part in parts:
+        part = part.strip()
+        if not part or part == b'--' or part.endswith(b'--'):
+            continue
+        if b'\r\n\r\n' not in part:
+            continue
+        header_block, content = part.split(b'\r\n\r\n', 1)
+        if len(content) >= 2 and content[-2:] == b'\r\n':
+            content = content[:-2]
+        elif len(content) >= 1 and content[-1:] == b'\n':
+            content = content[:-1]
+        disp = None
+        for line in header_block.split(b'\r\n'):
+            if line.lower().startswith(b'content-disposition:'):
+                disp = line.decode('utf-8', errors='ignore')
+                break
+        if not disp:
+            continue
+        name = None
+        filename = None
+        for m in re.finditer(r'name="([^"]+)"', disp, re.I):
+            name = m.group(1)
+        for m in re.finditer(r'filename="([^"]*)"', disp, re.I):
+            filename = m.group(1)
+        if name is None:
+            continue
+        if filename:
+            files[name] = (filename, content)
+        else:
+            fields[name] = content.decode('utf-8', errors='replace')
+    return fields, files
+
+
+def part(name, content, filename=None, nl=b'\r\n'):
+    disp = b'Content-Disposition: form-data; name="' + name.encode() + b'"'
+    if filename is not None:
+        disp += b'; filename="' + filename.encode() + b'"' + nl + b'Content-Type: application/octet-stream'
+    return disp + nl + nl + content
+
+
+def body(boundary, parts, nl=b'\r\n', preamble=b'', epilogue=b''):
+    b = boundary.encode()
+    out = preamble
+    for p in parts:
+        out += b'--' + b + nl + p + nl
+    return out + b'--' + b + b'--' + nl + epilogue
+
+
+RIFF = b'RIFF\x24\x00\x00\x00WAVEfmt '
+# (説明, Content-Type, ボディ, 期待 fields, 期待 files{name: (filename, bytes)})
+CORPUS = [
+    ('simple field + file', 'multipart/form-data; boundary=XyZ',
+     body('XyZ', [part('strength', b'70'), part('audio', RIFF + b'\x00\x01', 'a.wav')]),
+     {'strength': '70'}, {'audio': ('a.wav', RIFF + b'\x00\x01')}),
+    ('CRLF inside binary data', 'multipart/form-data; boundary=b0',
+     body('b0', [part('audio', b'\r\n\r\n\x00\r\n--b\r\n', 'x.bin')]),
+     {}, {'audio': ('x.bin', b'\r\n\r\n\x00\r\n--b\r\n')}),
+    ('binary ends with CRLF and whitespace', 'multipart/form-data; boundary=b0',
+     body('b0', [part('audio', b' \t\x00\r\n', 'x.bin')]),
+     {}, {'audio': ('x.bin', b' \t\x00\r\n')}),
+    ('boundary prefix inside data', 'multipart/form-data; boundary=----WebKitFormBoundaryAbC',
+     body('----WebKitFormBoundaryAbC', [part('audio', b'\r\n------WebKitFormBoundaryAb\r\n', 'x.bin')]),
+     {}, {'audio': ('x.bin', b'\r\n------WebKitFormBoundaryAb\r\n')}),
+    ('quoted boundary with space', 'multipart/form-data; boundary="a b:c=d"',
+     body('a b:c=d', [part('k', b'v')]),
+     {'k': 'v'}, {}),
+    ('filename= must not override name=', 'multipart/form-data; charset=utf-8; boundary=q',
+     body('q', [part('audio', b'DATA', 'recording.wav')]),
+     {}, {'audio': ('recording.wav', b'DATA')}),
+    ('empty file and empty field', 'multipart/form-data; boundary=q',
+     body('q', [part('empty', b''), part('audio', b'', 'e.wav')]),
+     {'empty': ''}, {'audio': ('e.wav', b'')}),
+    ('preamble and epilogue', 'multipart/form-data; boundary=q',
+     body('q', [part('k', b'v')], preamble=b'This is a preamble\r\n', epilogue=b'trailing junk --q\r\n'),
+     {'k': 'v'}, {}),
+    ('LF-only line endings', 'multipart/form-data; boundary=q',
+     body('q', [part('k', b'v\r', nl=b'\n'), part('audio', b'\n\x01', 'a.wav', nl=b'\n')], nl=b'\n'),
+     {'k': 'v'}, {'audio': ('a.wav', b'\n\x01')}),
+    ('Japanese field value', 'multipart/form-data; boundary=q',
+     body('q', [part('title', 'メモ\r\n本文'.encode('utf-8'))]),
+     {'title': 'メモ\r\n本文'}, {}),
+]
+
+
+def check_corpus():
+    failures = 0
+    for label, ct, data, want_fields, want_files in CORPUS:
+        boundary = extract_boundary(ct)
+        results = [('buffer', parse_multipart(data, boundary))]
+        for size in (1, 3, 7, 64):
+            chunks = (data[i:i + size] for i in range(0, len(data), size))
+            results.append(('stream/%d' % size, parse_multipart_stream(chunks, boundary)))
+        case_failures = 0
+        for mode, (fields, files) in results:
+            got_files = {k: (fn, bytes(v)) for k, (fn, v) in files.items()}
+            if fields != want_fields or got_files != want_files:
+                case_failures += 1
+                print('FAIL %-40s %-10s fields=%r files=%r' % (label, mode, fields, got_files))
+        legacy_ok = parse_multipart_split(data, boundary) == (want_fields, want_files)
+        if not case_failures:
+            print('ok   %-40s (legacy split parser: %s)' % (label, 'ok' if legacy_ok else 'wrong'))
+        failures += case_failures
+    return failures
+
+
+def measure(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--mb', type=float, default=20.0)
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    failures = check_corpus()
+    print()
+
+    payload = RIFF + os.urandom(int(args.mb * 1e6))
+    data = body('----WebKitFormBoundary7MA4YWxkTrZu0gW',
+                [part('strength', b'50'), part('audio', payload, 'upload.wav')])
+    boundary = '----WebKitFormBoundary7MA4YWxkTrZu0gW'
+    mb = len(data) / 1e6
+    chunk = 64 * 1024
+    cases = [
+        ('split (legacy)', lambda: parse_multipart_split(data, boundary)),
+        ('buffer', lambda: parse_multipart(data, boundary)),
+        ('stream 64 KiB', lambda: parse_multipart_stream((data[i:i + chunk] for i in range(0, len(data), chunk)), boundary)),
+    ]
+    print('%-16s %8s %10s %12s %14s' % ('parser', 'MB', 'ms', 'MB/s', 'peak MB / MB'))
+    for name, fn in cases:
+        t, peak = measure(fn, args.repeat)
+        print('%-16s %8.1f %10.2f %12.0f %14.2f' % (name, mb, t * 1e3, mb / t, peak / 1e6 / mb))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
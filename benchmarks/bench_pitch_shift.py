@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ピッチシフトのベンチマーク: 従来の最近傍インデックスの読み飛ばし vs pitch_shift（WSOLA / 位相ボコーダ）
+合成した N 秒（既定 60 秒）の有声音（F0 が揺れる倍音列＋雑音）で、実時間比（処理時間 / 音声の長さ、
+小さいほど速い）、作業領域のピーク（tracemalloc）、出力の長さ、出力の F0（スペクトルのピーク）を比べる。
+
+    python benchmarks/bench_pitch_shift.py [--seconds 60] [--sr 16000 44100] [--semitones -7 4 12]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'netlify', 'functions'))
+from pitch_shift import semitone_ratio, shift  # noqa: E402
+
+
+def legacy(x, semitones):
+    """比較用: 置き換え前の voice_convert（長さが 1/比 になり、折り返しも起きる）"""
+    indices = np.round(np.arange(0, len(x), semitone_ratio(semitones))).astype(np.int64)
+    return x[indices[indices < len(x)]]
+
+
+def voiced(seconds, sr, f0=150.0):
+    rng = np.random.default_rng(0)
+    n = int(seconds * sr)
+    t = np.arange(n) / sr
+    phase = np.cumsum(f0 * (1 + 0.02 * np.sin(2 * np.pi * 3 * t))) / sr
+    x = sum(np.sin(2 * np.pi * h * phase) / h for h in range(1, 16)) * 0.2
+    return (x + 0.005 * rng.normal(size=n)).astype(np.float32)
+
+
+def peak_hz(y, sr):
+    seg = y[:min(len(y), 4 * sr)]
+    spec = np.abs(np.fft.rfft(seg * np.hanning(len(seg))))
+    return np.argmax(spec) * sr / len(seg)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--seconds', type=float, default=60)
+    ap.add_argument('--sr', type=int, nargs='+', default=[16000, 44100])
+    ap.add_argument('--semitones', type=float, nargs='+', default=[-7, 4, 12])
+    args = ap.parse_args()
+
+    print('%-8s %-10s %6s %10s %10s %10s %12s %10s' % ('sr', 'mode', 'semi', 'time[s]', 'RTF', 'peak[MB]',
+                                                   'len ratio', 'F0[Hz]'))
+    for sr in args.sr:
+        x = voiced(args.seconds, sr)
+        for semi in args.semitones:
+            for mode in ('legacy', 'wsola', 'vocoder'):
+                tracemalloc.start()
+                t0 = time.perf_counter()
+                y = legacy(x, semi) if mode == 'legacy' else shift(x, sr, semi, mode)
+                elapsed = time.perf_counter() - t0
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print('%-8d %-10s %+6.0f %10.2f %10.4f %10.1f %12.3f %10.1f' % (
+                    sr, mode, semi, elapsed, elapsed / args.seconds, peak / 1e6, len(y) / len(x), peak_hz(y, sr)))
+        print('%-8d %-10s %6s %10s %10s %10s %12s %10.1f  (input)' % (sr, '', '', '', '', '', '', peak_hz(x, sr)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+メモ全文検索のベンチマーク: 全件の部分文字列走査 vs InvertedIndex（n-gram 転置インデックス＋BM25）
+合成した N 件の日本語メモで、索引構築時間・クエリ遅延（中央値 / p95）を測り、
+部分文字列で一致するメモがすべて検索結果（ヒット総数）に含まれることを確認する。
+削除・更新を通した索引のスコアが、残ったメモだけで作り直した索引のスコアと一致することも確認する。
+
+    python benchmarks/bench_search.py [--n 100000] [--repeat 50]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'netlify', 'functions'))
+from search import InvertedIndex, normalize  # noqa: E402
+
+WORDS = ('音声 合成 フォルマント 基本周波数 スペクトログラム 会議 議事録 買い物 牛乳 卵 旅行 京都 東京 予定 '
+         '締め切り 論文 実験 結果 データ 分析 モデル 学習 推論 ネットワーク 声質 変換 話者 録音 マイク '
+         'ノイズ 除去 フィルタ 周波数 振幅 位相 窓関数 プログラム バグ 修正 レビュー テスト デプロイ '
+         'サーバー 関数 メモ タスク アイデア 読書 映画 料理 レシピ 散歩 運動 睡眠 健康 Python numpy '
+         'FFT LPC MFCC WaveNet Netlify').split()
+PARTICLES = 'の を に は が と で も から まで より'.split()
+
+QUERIES = ['音声', '音声合成', 'フォルマント', '京都 旅行', '議事録', 'python', 'wavenet', '卵', '話者変換', '存在しない語']
+
+
+def make_memo(rng, i):
+    def sentence(n):
+        return ''.join(rng.choice(WORDS) + rng.choice(PARTICLES) for _ in range(n))
+    return {'id': i, 'title': sentence(rng.randint(1, 3)), 'content': sentence(rng.randint(8, 30)),
+            'created_at': '2026-01-01T00:00:%09d' % i}
+
+
+def linear_search(memos, q):
+    """比較用: 全件を正規化して部分文字列で探す（空白区切りの語はすべて含むもの）"""
+    terms = normalize(q).split()
+    hits = []
+    for m in memos:
+        text = normalize(m['title'] + ' ' + m['content'])
+        if all(t in text for t in terms):
+            hits.append(m['id'])
+    return hits
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return result, samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+def check_scores(memos, queries):
+    """削除（墓標）と更新を通した索引と、残ったメモだけで作り直した索引のスコアが一致するか。不一致のクエリ数を返す"""
+    index = InvertedIndex({'title': 2, 'content': 1})
+    for m in memos:
+        index.put(m)
+    live = {m['id']: m for m in memos}
+    rng = random.Random(1)
+    for m in memos[1::5]:
+        new = make_memo(rng, m['id'])
+        index.put(new, m)
+        live[m['id']] = new
+    # 削除は最後に（墓標が残ったまま検索する）
+    for m in memos[::3]:
+        index.delete(live.pop(m['id']))
+    fresh = InvertedIndex({'title': 2, 'content': 1})
+    for m in live.values():
+        fresh.put(m)
+    failures = 0
+    for q in queries:
+        got, want = dict(index.search(q, None)), dict(fresh.search(q, None))
+        if got.keys() != want.keys() or any(abs(got[d] - want[d]) > 1e-4 * max(1.0, abs(want[d])) for d in want):
+            failures += 1
+            print('FAIL scores after delete/update: %s' % q)
+    return failures
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--n', type=int, default=100000)
+    ap.add_argument('--repeat', type=int, default=50)
+    ap.add_argument('--limit', type=int, default=20)
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    memos = [make_memo(rng, i + 1) for i in range(args.n)]
+    index = InvertedIndex({'title': 2, 'content': 1})
+    t0 = time.perf_counter()
+    for m in memos:
+        index.put(m)
+    build = time.perf_counter() - t0
+    print('n = %d, build %.2f s (%.1f us/memo), %d grams' % (args.n, build, build / args.n * 1e6, len(index._ids)))
+
+    # 1 割を削除して墓標・掃除の経路も通す
+    for m in memos[::10]:
+        index.delete(m)
+    live = [m for i, m in enumerate(memos) if i % 10]
+
+    print('%-14s %8s %12s %12s %12s' % ('query', 'hits', 'linear[ms]', 'index p50', 'index p95'))
+    failures = 0
+    worst = 0.0
+    for q in QUERIES:
+        expected, t_lin, _ = timed(lambda: linear_search(live, q), 1)
+        (hits, total), p50, p95 = timed(lambda: index.search_with_total(q, args.limit), args.repeat)
+        worst = max(worst, p95)
+        # 部分文字列一致は bigram の積集合に必ず含まれる（逆は語境界をまたぐ一致があり得る）
+        found = set(d for d, _ in index.search(q, None))
+        missing = set(expected) - found
+        if missing or total != len(found):
+            failures += 1
+            print('FAIL %-12s missing=%d' % (q, len(missing)))
+        print('%-14s %8d %12.2f %12.3f %12.3f' % (q, total, t_lin * 1e3, p50 * 1e3, p95 * 1e3))
+    print('worst p95 = %.3f ms (%s 10 ms)' % (worst * 1e3, 'under' if worst < 0.010 else 'OVER'))
+    # 削除が PURGE_MIN に届かない件数で（墓標の掃除が起きない）
+    failures += check_scores(memos[:min(len(memos), 2000)], QUERIES)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+スペクトログラム API のベンチマーク: 従来の signal.spectrogram + tolist() の JSON vs spectrogram.Spectrogram
+合成した N 秒（既定 5 分・44.1 kHz）の音声で、レスポンスの大きさ、サーバー側の生成時間、
+最初のチャンクまでの時間、クライアント側のデコード時間（JSON は json.loads、バイナリは frombuffer）を比べる。
+間引きは描画先の canvas（既定 1600 × 600 ピクセル）に合わせる。
+
+    python benchmarks/bench_spectrogram.py [--seconds 300] [--fft-size 2048] [--width 1600] [--height 600]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import scipy.signal as signal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'netlify', 'functions'))
+from spectrogram import HEADER, Spectrogram  # noqa: E402
+
+
+def legacy_json(x, sr, fft_size):
+    """比較用: 置き換え前の /api/spectrum/analyze（全フレーム・全ビンを入れ子の JSON 浮動小数で返す）"""
+    frequencies, times, spectrogram = signal.spectrogram(x, sr, nperseg=fft_size, window='hamming',
+                                                         noverlap=fft_size // 2)
+    return json.dumps({'frequencies': frequencies.tolist(), 'times': times.tolist(),
+                       'spectrogram': spectrogram.tolist()}).encode()
+
+
+def streamed(sp, fmt):
+    t0 = time.perf_counter()
+    chunks = sp.stream(fmt)
+    first = next(chunks)
+    first += next(chunks, b'')
+    t_first = time.perf_counter() - t0
+    body = first + b''.join(chunks)
+    return body, t_first, time.perf_counter() - t0
+
+
+def decode(body):
+    h = HEADER.unpack(body[:HEADER.size])
+    n_frames, n_bins = h[4], h[5]
+    offset = HEADER.size + 4 * n_bins
+    dtype = '<f2' if h[1] == 1 else np.uint8
+    return np.frombuffer(body, dtype=dtype, offset=offset).reshape(n_frames, n_bins)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--seconds', type=float, default=300)
+    ap.add_argument('--sr', type=int, default=44100)
+    ap.add_argument('--fft-size', type=int, default=2048)
+    ap.add_argument('--width', type=int, default=1600)
+    ap.add_argument('--height', type=int, default=600)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    n = int(args.seconds * args.sr)
+    t = np.arange(n) / args.sr
+    x = (0.3 * np.sin(2 * np.pi * (200 + 50 * np.sin(t)) * t) + 0.05 * rng.normal(size=n)).astype(np.float32)
+
+    print('%-26s %12s %12s %12s %12s' % ('mode', 'bytes', 'server[s]', 'first[ms]', 'decode[s]'))
+    t0 = time.perf_counter()
+    body = legacy_json(x, args.sr, args.fft_size)
+    t_server = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    json.loads(body)
+    t_decode = time.perf_counter() - t0
+    # JSON は全体を作り終えるまで 1 バイトも返せない
+    print('%-26s %12d %12.2f %12.0f %12.2f' % ('legacy json', len(body), t_server, t_server * 1000, t_decode))
+
+    for label, kwargs in (('stream u8 (full)', {}),
+                          ('stream u8 (decimated)', {'max_frames': args.width, 'max_bins': args.height}),
+                          ('stream f16 (decimated)', {'max_frames': args.width, 'max_bins': args.height})):
+        fmt = 'f16' if 'f16' in label else 'u8'
+        sp = Spectrogram(x, args.sr, args.fft_size, 'hamming', max_frames=kwargs.get('max_frames'),
+                         max_bins=kwargs.get('max_bins'))
+        body, t_first, t_server = streamed(sp, fmt)
+        t0 = time.perf_counter()
+        frames = decode(body)
+        t_decode = time.perf_counter() - t0
+        print('%-26s %12d %12.2f %12.1f %12.4f  (%d x %d)' % (label, len(body), t_server, t_first * 1000, t_decode,
+                                                             frames.shape[0], frames.shape[1]))
+
+
+if __name__ == '__main__':
+    main()
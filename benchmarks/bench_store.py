@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+タスク保存エンジンの負荷ベンチマーク: 従来の JSON 全体書き換え vs LogStore（追記ログ＋ id インデックス）
+N 件の追加・トグル・削除の 1 操作あたりの時間、1 件ずつの追加と insert_many / delete_many（一括 API）の比較、
+複数プロセス同時追加での id 重複・取りこぼしを確認する。
+
+    python benchmarks/bench_store.py [--n 5000] [--workers 4]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'netlify', 'functions'))
+from store import JsonStore, LogStore  # noqa: E402
+
+
+class LegacyJsonFile(object):
+    """比較用: 置き換え前の tasks.py（毎回全件 load、indent=2 で全件 save、max() で採番）"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return []
+
+    def _save(self, tasks):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(tasks, f, ensure_ascii=False, indent=2)
+
+    def insert(self, fields):
+        tasks = self._load()
+        new_id = max([t.get('id', 0) for t in tasks], default=0) + 1
+        task = dict(id=new_id, **fields)
+        tasks.append(task)
+        self._save(tasks)
+        return task
+
+    def update(self, task_id, fn):
+        tasks = self._load()
+        for i, t in enumerate(tasks):
+            if t['id'] == task_id:
+                tasks[i] = fn(t)
+                self._save(tasks)
+                return tasks[i]
+        return None
+
+    def delete(self, task_id):
+        tasks = self._load()
+        n = len(tasks)
+        tasks = [t for t in tasks if t['id'] != task_id]
+        self._save(tasks)
+        return len(tasks) < n
+
+
+def toggle(task):
+    task['completed'] = not task['completed']
+    return task
+
+
+def run_ops(store, n):
+    timings = {}
+    t0 = time.perf_counter()
+    ids = [store.insert({'text': 'タスク %d' % i, 'completed': False,
+                         'created_at': datetime.now().isoformat()})['id'] for i in range(n)]
+    timings['insert'] = (time.perf_counter() - t0) / n
+    t0 = time.perf_counter()
+    for i in ids[::2]:
+        store.update(i, toggle)
+    timings['toggle'] = (time.perf_counter() - t0) / len(ids[::2])
+    t0 = time.perf_counter()
+    for i in ids[::3]:
+        store.delete(i)
+    timings['delete'] = (time.perf_counter() - t0) / len(ids[::3])
+    return timings
+
+
+def _worker(args):
+    path, n = args
+    store = LogStore(path)
+    return [store.insert({'text': 'w%d' % os.getpid(), 'completed': False})['id'] for _ in range(n)]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--n', type=int, default=5000)
+    ap.add_argument('--workers', type=int, default=4)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        stores = [
+            ('legacy json', LegacyJsonFile(os.path.join(d, 'legacy.json'))),
+            ('JsonStore', JsonStore(os.path.join(d, 'tasks.json'))),
+            ('LogStore', LogStore(os.path.join(d, 'tasks.log'))),
+            ('LogStore nofsync', LogStore(os.path.join(d, 'nofsync.log'), fsync=False)),
+        ]
+        print('n = %d' % args.n)
+        print('%-18s %12s %12s %12s' % ('store', 'insert[ms]', 'toggle[ms]', 'delete[ms]'))
+        for name, store in stores:
+            n = args.n if not name.startswith(('legacy', 'JsonStore')) else min(args.n, 2000)
+            t = run_ops(store, n)
+            print('%-18s %12.3f %12.3f %12.3f%s' % (name, t['insert'] * 1e3, t['toggle'] * 1e3, t['delete'] * 1e3,
+                                                 '' if n == args.n else '  (n=%d)' % n))
+
+        print()
+        print('%-18s %14s %14s %14s' % ('bulk (n=%d)' % args.n, 'loop insert[s]', 'insert_many[s]', 'delete_many[s]'))
+        for name, cls in (('JsonStore', JsonStore), ('LogStore', LogStore)):
+            fields = [{'text': 'タスク %d' % i, 'completed': False, 'created_at': datetime.now().isoformat()}
+                      for i in range(args.n)]
+            n_loop = args.n if cls is LogStore else min(args.n, 2000)
+            loop_store = cls(os.path.join(d, 'loop-' + name))
+            t0 = time.perf_counter()
+            for f in fields[:n_loop]:
+                loop_store.insert(f)
+            t_loop = (time.perf_counter() - t0) * args.n / n_loop
+            bulk_store = cls(os.path.join(d, 'bulk-' + name))
+            t0 = time.perf_counter()
+            ids = [r['id'] for r in bulk_store.insert_many(fields)]
+            t_bulk = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            assert bulk_store.delete_many(ids) == []
+            t_del = time.perf_counter() - t0
+            print('%-18s %14.3f %14.3f %14.3f%s' % (name, t_loop, t_bulk, t_del,
+                                                   '' if n_loop == args.n else '  (loop extrapolated from n=%d)' % n_loop))
+            assert len(bulk_store) == 0
+
+        path = os.path.join(d, 'concurrent.log')
+        per_worker = max(1, args.n // args.workers)
+        with multiprocessing.Pool(args.workers) as pool:
+            results = pool.map(_worker, [(path, per_worker)] * args.workers)
+        ids = [i for r in results for i in r]
+        store = LogStore(path)
+        print('concurrent: %d workers x %d inserts -> %d records, %d unique ids'
+              % (args.workers, per_worker, len(store), len(set(ids))))
+        assert len(store) == len(ids) == len(set(ids))
+
+
+if __name__ == '__main__':
+    main()
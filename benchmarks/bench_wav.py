@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WAV デコードのマイクロベンチマーク: 従来の struct.unpack 版 vs wav_codec（np.frombuffer）
+1 MB あたりのデコード時間とピークメモリ（tracemalloc）を表示する。
+
+    python benchmarks/bench_wav.py [--seconds 60]
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'netlify', 'functions'))
+from wav_codec import decode_wav, encode_wav, read_wav_bytes  # noqa: E402
+
+
+def read_wav_bytes_struct(data):
+    """比較用: 置き換え前の read_wav_bytes（16-bit モノラル前提）"""
+    pos = 12
+    sample_rate = 44100
+    raw = data
+    while pos < len(data) - 8:
+        chunk_id = data[pos:pos+4]
+        chunk_size = struct.unpack('<I', data[pos+4:pos+8])[0]
+        pos += 8
+        if chunk_id == b'fmt ' and chunk_size >= 16:
+            sample_rate = struct.unpack('<I', data[pos+4:pos+8])[0]
+        if chunk_id == b'data':
+            raw = data[pos:pos+chunk_size]
+            break
+        pos += chunk_size
+    n = len(raw) // 2
+    samples = struct.unpack('<%dh' % n, raw[:n*2])
+    return sample_rate, np.array(samples, dtype=np.float32) / 32768.0
+
+
+def measure(fn, data, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(data)
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--seconds', type=float, default=60.0)
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    sr = 44100
+    rng = np.random.default_rng(0)
+    n = int(sr * args.seconds)
+    cases = [
+        ('int16 mono', rng.integers(-32768, 32767, n).astype(np.int16)),
+        ('int16 stereo', rng.integers(-32768, 32767, (n, 2)).astype(np.int16)),
+        ('int32 mono', rng.integers(-2**31, 2**31 - 1, n).astype(np.int32)),
+        ('float32 mono', rng.uniform(-1, 1, n).astype(np.float32)),
+    ]
+    print('%-14s %-10s %8s %12s %14s' % ('format', 'decoder', 'MB', 'ms / MB', 'peak MB / MB'))
+    for label, samples in cases:
+        data = bytes(encode_wav(sr, samples))
+        mb = len(data) / 1e6
+        decoders = [('codec', read_wav_bytes), ('codec(all)', decode_wav)]
+        if label == 'int16 mono':
+            decoders.insert(0, ('struct', read_wav_bytes_struct))
+        for name, fn in decoders:
+            t, peak = measure(fn, data, args.repeat)
+            print('%-14s %-10s %8.1f %12.2f %14.2f' % (label, name, mb, t * 1e3 / mb, peak / 1e6 / mb))
+
+    samples = rng.integers(-32768, 32767, n).astype(np.int16)
+    t0 = time.perf_counter()
+    out = encode_wav(sr, samples)
+    dt = time.perf_counter() - t0
+    print('encode int16 mono: %.2f ms / MB' % (dt * 1e3 / (len(out) / 1e6)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WaveNet のベンチマーク: wavenet.WaveNet（拡張因果畳み込み・ゲート付き残差・スキップ接続）の処理速度
+N 秒（既定 5 秒・16 kHz）の入力で、チャネル数ごとに 1 秒あたりの処理サンプル数と実時間比
+（処理時間 / 音声の長さ、小さいほど速い）を比べる。
+  generate   BLOCK_SAMPLES ずつのオフライン処理
+  stream B   B サンプルずつ process() に渡すストリーミング（層ごとの循環バッファで過去を持ち越す）
+比較用に、置き換え前の移動平均の連鎖（np.convolve(mode='same') を拡張ごとに）の時間も表示する。
+
+    python benchmarks/bench_wavenet.py [--seconds 5] [--sr 16000] [--channels 32 64 128 256]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'netlify', 'functions'))
+from wavenet import WaveNet  # noqa: E402
+
+DILATIONS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+
+
+def legacy(x, dilations):
+    """比較用: 置き換え前の apply_wavenet_generation（拡張ごとの移動平均）"""
+    y = x.copy()
+    for d in dilations:
+        if d < len(y):
+            y = np.convolve(y, np.ones(d) / d, mode='same')
+    return y
+
+
+def stream(net, x, block):
+    s = net.stream()
+    for i in range(0, len(x), block):
+        s.process(x[i:i + block])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--seconds', type=float, default=5)
+    ap.add_argument('--sr', type=int, default=16000)
+    ap.add_argument('--channels', type=int, nargs='+', default=[32, 64, 128, 256])
+    args = ap.parse_args()
+    n = int(args.seconds * args.sr)
+    x = (0.3 * np.random.default_rng(0).standard_normal(n)).astype(np.float32)
+
+    t0 = time.perf_counter()
+    legacy(x, DILATIONS)
+    t = time.perf_counter() - t0
+    print('legacy moving average: %.3f s (%.0f samples/s)' % (t, n / t))
+    print('%-10s %-14s %12s %14s %10s' % ('channels', 'mode', 'time[s]', 'samples/s', 'RTF'))
+    for C in args.channels:
+        net = WaveNet.random(DILATIONS, C, C)
+        runs = [('generate', x, lambda v: net.generate(v))]
+        for block in (512, 64, 1):
+            # 1 サンプルずつは Python の呼び出しが支配的なので短い区間だけ
+            part = x[:min(n, args.sr // 4)] if block == 1 else x
+            runs.append(('stream %d' % block, part, lambda v, b=block: stream(net, v, b)))
+        for name, v, fn in runs:
+            t0 = time.perf_counter()
+            fn(v)
+            t = time.perf_counter() - t0
+            print('%-10d %-14s %12.3f %14.0f %10.3f' % (C, name, t, len(v) / t, t * args.sr / len(v)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+倍音合成のベンチマーク: 従来の倍音ごとの np.sin ループ vs wavetable.Oscillator（帯域制限ウェーブテーブル）
+N 秒（既定 60 秒・44.1 kHz）の出力で、倍音数ごとの実時間と作業領域のピーク（tracemalloc）を比べる。
+F0 は一定（150 Hz）と軌跡（100〜300 Hz）の 2 通り。ループは F0 一定のときだけ（軌跡には位相の積分が要る）。
+倍音数 10 では両者の差（テーブルの線形補間の誤差）も表示する。
+
+    python benchmarks/bench_wavetable.py [--seconds 60] [--sr 44100]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'netlify', 'functions'))
+from wavetable import Oscillator, mipmap  # noqa: E402
+
+
+def sine_loop(f0, n_harmonics, n, sr):
+    """比較用: 置き換え前の formant_synthesize の倍音ループ（cutoff を超える倍音も足す）"""
+    t = np.arange(1, n + 1) / sr
+    waveform = np.zeros(n)
+    for h in range(1, n_harmonics + 1):
+        waveform += (1.0 / h) * np.sin(2 * np.pi * f0 * h * t)
+    return waveform
+
+
+def measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    out = fn()
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out, elapsed, peak
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--seconds', type=float, default=60)
+    ap.add_argument('--sr', type=int, default=44100)
+    args = ap.parse_args()
+    n = int(args.seconds * args.sr)
+    contour = 200 + 100 * np.sin(2 * np.pi * 0.5 * np.arange(n) / args.sr)
+
+    print('%-34s %10s %14s' % ('mode', 'time[s]', 'peak[MB]'))
+    for H in (10, 100, 1000):
+        mipmap(H, 1.0, args.sr)  # テーブルの作成（初回のみ）は計測から外す
+        ref, t_loop, p_loop = measure(lambda: sine_loop(150.0, H, n, args.sr))
+        print('%-34s %10.2f %14.1f' % ('sin loop   H=%d' % H, t_loop, p_loop / 1e6))
+        y, t_wt, p_wt = measure(lambda: Oscillator(args.sr, H).render(np.full(n, 150.0)))
+        note = '  max diff %.1e' % float(np.max(np.abs(y - ref))) if H == 10 else ''
+        print('%-34s %10.2f %14.1f%s' % ('wavetable  H=%d' % H, t_wt, p_wt / 1e6, note))
+        _, t_ct, p_ct = measure(lambda: Oscillator(args.sr, H).render(contour))
+        print('%-34s %10.2f %14.1f' % ('wavetable  H=%d, f0 contour' % H, t_ct, p_ct / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+ブロック処理の共通モジュール（pitch_shift・cepstral_vc・speaker_stats から使う）。
+
+長い入力を一度に変換せず、ブロックごとに処理して状態を次のブロックへ持ち越す。
+作業領域はブロックの大きさで決まり、結果は全体を一度に処理したときと同じになる。
+  stft_process   Hann 窓でフレームに切り（ホップ N/4）、FRAME_BLOCK フレームずつ rFFT してコールバックに渡し、
+                 返ってきたスペクトルを同じ窓で合成してオーバーラップ加算する（末尾を持ち越す）。
+                 コールバックを恒等にすると入力がそのまま戻る。
+  stft_process_many  分析を 1 回だけ行い、その結果から複数の出力を合成する（出力ごとにオーバーラップ加算）。
+  iter_stft      合成しない分析だけ（同じフレーム分けの rFFT をブロックごとに）。
+  OverlapAdd     フレームの重ね合わせ（pitch_shift の WSOLA・位相ボコーダも使う）。
+iter_* は出力をブロックごとに返すジェネレータで、つなげると段ごとの途中結果を全長で持たずに済む。
+"""
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:
+    np = None
+
+# 一度に処理するフレーム数
+FRAME_BLOCK = 256
+
+
+def segment(x, start, stop):
+    """x[start:stop]。範囲外は 0（先頭・末尾の 0 詰めを入力全体のコピーなしで行う）"""
+    out = np.zeros(stop - start)
+    lo, hi = max(start, 0), min(stop, len(x))
+    if hi > lo:
+        out[lo - start:hi - start] = x[lo:hi]
+    return out
+
+
+def hann(n):
+    """周期 Hann 窓"""
+    return 0.5 - 0.5 * np.cos(2.0 * np.pi * np.arange(n) / n)
+
+
+def collect(blocks, n):
+    """ブロック列をつないだ長さ n の配列（先に確保して埋める）"""
+    out = np.empty(n)
+    pos = 0
+    for b in blocks:
+        out[pos:pos + len(b)] = b
+        pos += len(b)
+    if pos != n:
+        raise ValueError('expected %d samples, got %d' % (n, pos))
+    return out
+
+
+def _trim(blocks, skip, total):
+    """ブロック列の先頭 skip サンプルを捨て、続く total サンプルだけを返す（ブロックは最後の軸がサンプル）"""
+    for b in blocks:
+        length = b.shape[-1]
+        if skip >= length:
+            skip -= length
+            continue
+        b = b[..., skip:skip + total]
+        skip = 0
+        if b.shape[-1]:
+            total -= b.shape[-1]
+            yield b
+        if total <= 0:
+            return
+
+
+class OverlapAdd(object):
+    """ホップ hop でフレーム (m, N) を重ね合わせ、確定した m·hop サンプルずつ返す（末尾 N - hop を持ち越す）"""
+
+    def __init__(self, frame_len, hop):
+        self.frame_len = frame_len
+        self.hop = hop
+        self.tail = np.zeros(frame_len - hop)
+
+    def push(self, frames):
+        m = len(frames)
+        N, hop = self.frame_len, self.hop
+        out = np.zeros((m - 1) * hop + N)
+        out[:N - hop] += self.tail
+        for q in range(0, N, hop):
+            w = min(hop, N - q)
+            out[q:q + m * hop].reshape(m, hop)[:, :w] += frames[:, q:q + w]
+        self.tail = out[m * hop:].copy()
+        return out[:m * hop]
+
+
+def _spectra(x, N, hop, block_frames):
+    window = hann(N)
+    # フレーム k の先頭は k·hop - (N - hop)。0..n-1 のどのサンプルも N/hop 個のフレームに覆われる
+    n_frames = -(-(len(x) + N - hop) // hop)
+    for k0 in range(0, n_frames, block_frames):
+        m = min(block_frames, n_frames - k0)
+        start = k0 * hop - (N - hop)
+        seg = segment(x, start, start + (m - 1) * hop + N)
+        yield np.fft.rfft(sliding_window_view(seg, N)[::hop] * window, axis=1)
+
+
+def iter_stft(x, frame_len, hop=None, block_frames=FRAME_BLOCK):
+    """stft_process と同じフレーム分け・窓の rFFT (m, frame_len // 2 + 1) をブロックごとに返すジェネレータ"""
+    N, hop = _frame_hop(frame_len, hop)
+    return _spectra(np.asarray(x), N, hop, block_frames)
+
+
+def _stft_blocks(x, analysis, synthesis, N, hop, block_frames):
+    """出力ごとのブロックを重ねた (len(synthesis), サンプル数) を返すジェネレータ"""
+    window = hann(N)
+    # 分析窓と合成窓の積（Hann² はホップ N/4 で一定 sum(w²)/hop）で割って元の振幅に戻す
+    synthesis_window = window / (np.dot(window, window) / hop)
+    olas = [OverlapAdd(N, hop) for _ in synthesis]
+    for spec in _spectra(x, N, hop, block_frames):
+        m = len(spec)
+        state = analysis(spec)
+        out = np.empty((len(olas), m * hop))
+        for j, ola in enumerate(olas):
+            frames = np.fft.irfft(synthesis[j](state), n=N, axis=1)
+            frames *= synthesis_window
+            out[j] = ola.push(frames)
+        yield out
+    yield np.vstack([ola.tail for ola in olas])
+
+
+def _frame_hop(frame_len, hop):
+    N = int(frame_len)
+    hop = N // 4 if hop is None else int(hop)
+    if hop < 1 or N % hop or N // hop < 4:
+        raise ValueError('hop must divide frame_len into at least 4 steps')
+    return N, hop
+
+
+def iter_stft_process(x, callback, frame_len, hop=None, block_frames=FRAME_BLOCK):
+    """stft_process の出力をブロックごとに返すジェネレータ"""
+    N, hop = _frame_hop(frame_len, hop)
+    blocks = _stft_blocks(np.asarray(x), callback, (_identity,), N, hop, block_frames)
+    return (b[0] for b in _trim(blocks, N - hop, len(x)))
+
+
+def _identity(spec):
+    return spec
+
+
+def stft_process(x, callback, frame_len, hop=None, block_frames=FRAME_BLOCK):
+    """
+    x を STFT（Hann 窓・ホップ hop、既定 frame_len // 4）し、callback(spec) で変えたスペクトルから合成した信号（長さは x と同じ）。
+    spec は連続するフレームの rFFT (m, frame_len // 2 + 1) で、フレーム順に FRAME_BLOCK 個ずつ渡される。
+    フレームをまたぐ状態はコールバック側で持つ。
+    """
+    return collect(iter_stft_process(x, callback, frame_len, hop, block_frames), len(x))
+
+
+def stft_process_many(x, analysis, synthesis, frame_len, hop=None, block_frames=FRAME_BLOCK):
+    """
+    stft_process の分析を共有する版。state = analysis(spec) をブロックごとに 1 回だけ求め、
+    synthesis の各関数 f について f(state) のスペクトルから合成した信号を並べた (len(synthesis), len(x)) を返す。
+    """
+    N, hop = _frame_hop(frame_len, hop)
+    out = np.empty((len(synthesis), len(x)))
+    pos = 0
+    for b in _trim(_stft_blocks(np.asarray(x), analysis, synthesis, N, hop, block_frames), N - hop, len(x)):
+        out[:, pos:pos + b.shape[-1]] = b
+        pos += b.shape[-1]
+    return out
+
@@ -0,0 +1,605 @@
+# -*- coding: utf-8 -*-
+"""
+Bregman / スキュー Jensen ダイバージェンスの一括計算エンジン（divergence と research_api から使う）。
+
+点は (n, d) の行列で受け取り、生成関数 F と ∇F を行ごとに一括で評価する。
+1 つの中心に対するダイバージェンスは
+  Bregman:                B_F(x:c)   = F(x) - F(c) - <x - c, ∇F(c)>
+  スキュー Jensen:         J_F^α(x:c) = (1-α)F(x) + αF(c) - F((1-α)x + αc)
+で、F(x) を 1 回だけ前計算しておけば、Bregman（と F=squared のスキュー Jensen）は行列ベクトル積 1 回になる。
+それ以外のスキュー Jensen は ROW_BLOCK 行ずつ混合点を作って評価し、作業領域を一定に抑える。
+
+生成関数は register_generator で登録する（squared / entropy / logsumexp / burg = itakura_saito が組み込み）。
+各生成関数は行ごとの F、out に書き込める ∇F、構造付き Hessian（DiagHessian / LowRankHessian。
+密行列は dense() を呼んだときだけ作る）と、あれば ∇F の逆写像を持つ。
+bregman_div / skew_jensen_div / jensen_bregman_div / chord_gap_div は組ごと（前の軸はブロードキャスト）の値を返す。
+
+- kmeans_pp: 各点の「既存の中心までの最小ダイバージェンス」配列を持ち、新しい中心との距離だけで更新する D² シーディング。
+- skew_jensen_centroid: 重み付きスキュー Jensen セントロイド argmin_c Σ w_i J_F^α(p_i:c)。
+  F=squared は閉形式（重み付き平均）、それ以外は CCCP（凹凸手続き）の固定点反復
+  c ← (∇F)^{-1}(Σ w_i ∇F((1-α)p_i + αc)) を 1 反復 O(n·d) で回す。
+- kmeans: k-means++ で初期化した Lloyd 反復（割り当て → セントロイド更新）。
+- pairwise: P (n, d) と Q (m, d) の全組のダイバージェンス行列（または行ごとの近傍 top-k）。
+  内積で書けるもの（Bregman、F=squared の Jensen 系、離散 Bhattacharyya）は行列積、
+  それ以外は (行, 列, 次元) のブロードキャストを PAIR_BLOCK 要素ずつに区切って計算する。
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 混合点などの作業領域を作るときの 1 ブロックの行数
+ROW_BLOCK = 65536
+# pairwise で一度に作る (行, 列, 次元) の要素数の上限
+PAIR_BLOCK = 1 << 22
+# API で pairwise の行列全体を返すときのセル数の上限（超える場合は top_k を指定してもらう）
+PAIRWISE_MAX_CELLS = 1 << 23
+
+_EPS = 1e-12
+
+
+# ---------- 構造付き Hessian（密行列は作らない） ----------
+
+class DiagHessian(object):
+    """対角 Hessian diag(d)。d は (..., dim) の配列か、定数ならスカラー（F=squared の 2I など）。"""
+    __slots__ = ('diag', 'shape')
+
+    def __init__(self, diag, shape):
+        self.diag = diag
+        self.shape = tuple(shape)
+
+    def matvec(self, V):
+        return self.diag * V
+
+    def quad(self, V):
+        """vᵀ H v を行ごとに"""
+        return np.einsum('...i,...i->...', V * self.diag, V)
+
+    def solve(self, V):
+        return V / self.diag
+
+    def dense(self):
+        d = self.shape[-1]
+        H = np.zeros(self.shape + (d,))
+        idx = np.arange(d)
+        H[..., idx, idx] = self.diag
+        return H
+
+
+class LowRankHessian(object):
+    """対角 + 低ランク補正 diag(d) + s·U Uᵀ。U は (..., dim, r)、s は ±1。
+    logsumexp は diag(g) - g gᵀ（r=1, s=-1）。"""
+    __slots__ = ('diag', 'U', 'sign', 'shape')
+
+    def __init__(self, diag, U, sign=1.0):
+        self.diag = diag
+        self.U = U
+        self.sign = float(sign)
+        self.shape = np.shape(diag)
+
+    def _proj(self, V):
+        return np.einsum('...ir,...i->...r', self.U, V)
+
+    def matvec(self, V):
+        return self.diag * V + self.sign * np.einsum('...ir,...r->...i', self.U, self._proj(V))
+
+    def quad(self, V):
+        p = self._proj(V)
+        return np.einsum('...i,...i->...', V * self.diag, V) + self.sign * np.einsum('...r,...r->...', p, p)
+
+    def solve(self, V):
+        """Woodbury 恒等式で H x = v を解く（H は正定値であること）"""
+        DU = self.U / self.diag[..., None]
+        DV = V / self.diag
+        r = self.U.shape[-1]
+        S = self.sign * np.eye(r) + np.einsum('...ir,...is->...rs', self.U, DU)
+        t = np.linalg.solve(S, self._proj(DV)[..., None])[..., 0]
+        return DV - np.einsum('...ir,...r->...i', DU, t)
+
+    def dense(self):
+        H = self.sign * np.einsum('...ir,...jr->...ij', self.U, self.U)
+        idx = np.arange(self.shape[-1])
+        H[..., idx, idx] += self.diag
+        return H
+
+
+# ---------- 生成関数 ----------
+# F(X) は最後の軸について行ごとの値、grad(X, out=None) は ∇F を out（省略時は新しい配列）に書き込む。
+# 作業領域は 1 つだけ使い、log / exp などは in-place で重ねる。
+
+def _F_squared(X):
+    return np.einsum('...i,...i->...', X, X)
+
+
+def _grad_F_squared(X, out=None):
+    return np.multiply(X, 2, out=out)
+
+
+def _hess_F_squared(X):
+    # 2I: 入力によらない定数なのでスカラーのまま持つ
+    return DiagHessian(2.0, np.shape(X))
+
+
+def _F_entropy(X):
+    # x log x（0 log 0 = 0）。log の引数だけ最小正数で下から押さえる
+    W = np.maximum(X, np.finfo(X.dtype).tiny)
+    np.log(W, out=W)
+    W *= X
+    return np.sum(W, axis=-1)
+
+
+def _grad_F_entropy(X, out=None):
+    out = np.maximum(X, _EPS, out=out)
+    np.log(out, out=out)
+    out += 1
+    return out
+
+
+def _hess_F_entropy(X):
+    return DiagHessian(1.0 / np.maximum(X, _EPS), np.shape(X))
+
+
+def _F_logsumexp(X):
+    m = np.max(X, axis=-1, keepdims=True)
+    W = np.subtract(X, m)
+    np.exp(W, out=W)
+    return m[..., 0] + np.log(np.sum(W, axis=-1))
+
+
+def _grad_F_logsumexp(X, out=None):
+    out = np.subtract(X, np.max(X, axis=-1, keepdims=True), out=out)
+    np.exp(out, out=out)
+    out /= np.sum(out, axis=-1, keepdims=True)
+    return out
+
+
+def _hess_F_logsumexp(X):
+    g = _grad_F_logsumexp(X)
+    return LowRankHessian(g, g[..., None], -1.0)
+
+
+def _F_burg(X):
+    # Burg エントロピー F(x) = -Σ log x_i（x > 0）
+    W = np.maximum(X, _EPS)
+    np.log(W, out=W)
+    return -np.sum(W, axis=-1)
+
+
+def _grad_F_burg(X, out=None):
+    out = np.maximum(X, _EPS, out=out)
+    np.reciprocal(out, out=out)
+    np.negative(out, out=out)
+    return out
+
+
+def _hess_F_burg(X):
+    W = np.maximum(X, _EPS)
+    W *= W
+    return DiagHessian(np.reciprocal(W, out=W), np.shape(X))
+
+
+def _grad_inv_squared(Y):
+    return Y / 2
+
+
+def _grad_inv_entropy(Y):
+    return np.maximum(np.exp(Y - 1) - _EPS, 0)
+
+
+def _grad_inv_logsumexp(Y):
+    # softmax は定数の平行移動で不変なので逆像は log(y) + t。t は呼び出し側で決める
+    return np.log(np.maximum(Y, _EPS))
+
+
+def _grad_inv_burg(Y):
+    return -1.0 / np.minimum(Y, -_EPS)
+
+
+class Generator(object):
+    """登録された凸生成関数。
+    quadratic: F(x) = |x|²（内積に書き直せる閉形式を使う）
+    shift_invariant: ∇F が x + t·1 で不変（logsumexp）。セントロイドでは平行移動を固定する
+    grad_inv がなければ hess を使った Newton 法で ∇F を逆に解く。"""
+    __slots__ = ('name', 'F', 'grad', 'hess', 'grad_inv', 'quadratic', 'shift_invariant')
+
+    def __init__(self, name, F, grad, hess=None, grad_inv=None, quadratic=False, shift_invariant=False):
+        self.name = name
+        self.F = F
+        self.grad = grad
+        self.hess = hess
+        self.grad_inv = grad_inv
+        self.quadratic = quadratic
+        self.shift_invariant = shift_invariant
+
+    @property
+    def invertible(self):
+        return self.grad_inv is not None or self.hess is not None
+
+
+_GENERATORS = {}
+
+
+def register_generator(name, F, grad, hess=None, grad_inv=None, quadratic=False, shift_invariant=False):
+    """生成関数を登録する（同名は置き換え）。
+    F(X) -> (...,)、grad(X, out=None) -> (..., d)、hess(X) -> DiagHessian / LowRankHessian、
+    grad_inv(Y) -> (..., d)。いずれも最後の軸について行ごとに計算すること。"""
+    gen = Generator(name, F, grad, hess, grad_inv, quadratic, shift_invariant)
+    _GENERATORS[name] = gen
+    return gen
+
+
+def get_generator(F_name):
+    """名前から生成関数を引く（未知の名前は squared）"""
+    if isinstance(F_name, Generator):
+        return F_name
+    return _GENERATORS.get(F_name) or _GENERATORS['squared']
+
+
+def generator_names():
+    return sorted(_GENERATORS)
+
+
+register_generator('squared', _F_squared, _grad_F_squared, _hess_F_squared, _grad_inv_squared, quadratic=True)
+register_generator('entropy', _F_entropy, _grad_F_entropy, _hess_F_entropy, _grad_inv_entropy)
+register_generator('logsumexp', _F_logsumexp, _grad_F_logsumexp, _hess_F_logsumexp, _grad_inv_logsumexp,
+                   shift_invariant=True)
+register_generator('burg', _F_burg, _grad_F_burg, _hess_F_burg, _grad_inv_burg)
+# Burg の Bregman ダイバージェンスが Itakura-Saito: Σ p/q - log(p/q) - 1
+_GENERATORS['itakura_saito'] = _GENERATORS['burg']
+
+# セントロイドの CCCP 反復の既定値
+CENTROID_MAX_ITER = 100
+CENTROID_TOL = 1e-10
+# grad_inv のない生成関数で ∇F を逆に解く Newton 法の反復上限
+NEWTON_MAX_ITER = 50
+
+KINDS = ('skew_jensen', 'bregman')
+PAIRWISE = ('jensen', 'skew_jensen', 'bregman', 'jensen_bregman', 'bhattacharyya', 'chord_gap')
+
+
+def as_points(points):
+    """(n, d) の float 行列にする（float32 はそのまま使う）"""
+    X = np.asarray(points)
+    if X.dtype not in (np.float32, np.float64):
+        X = X.astype(np.float64)
+    if X.ndim == 1:
+        X = X[:, None]
+    return X
+
+
+def _check(kind, alpha):
+    if kind not in KINDS:
+        raise ValueError('unknown divergence: %s' % kind)
+    return float(np.clip(alpha, 1e-6, 1 - 1e-6))
+
+
+# ---------- 組ごとのダイバージェンス（P, Q は最後の軸が次元で、前の軸はブロードキャスト） ----------
+
+def _as_float(X):
+    X = np.asarray(X)
+    return X if X.dtype in (np.float32, np.float64) else X.astype(np.float64)
+
+
+def _mix(P, Q, a):
+    """(1-a)P + aQ = P + a(Q - P)（ブロードキャスト後の大きさの配列を 1 つだけ作る）"""
+    M = np.subtract(Q, P)
+    M *= a
+    M += P
+    return M
+
+
+def bregman_div(P, Q, F_name='squared'):
+    """B_F(p:q) = F(p) - F(q) - <p - q, ∇F(q)>"""
+    gen = get_generator(F_name)
+    P, Q = _as_float(P), _as_float(Q)
+    G = gen.grad(Q)
+    G = G * np.subtract(P, Q)
+    return gen.F(P) - gen.F(Q) - np.sum(G, axis=-1)
+
+
+def skew_jensen_div(P, Q, alpha=0.5, F_name='squared'):
+    """J_F^α(p:q) = (1-α)F(p) + αF(q) - F((1-α)p + αq)"""
+    gen = get_generator(F_name)
+    P, Q = _as_float(P), _as_float(Q)
+    a = float(np.clip(alpha, 1e-6, 1 - 1e-6))
+    return (1 - a) * gen.F(P) + a * gen.F(Q) - gen.F(_mix(P, Q, a))
+
+
+def jensen_bregman_div(P, Q, alpha=0.5, F_name='squared'):
+    """JB_F^α(p|q) = (1-α)B_F(p:m) + αB_F(q:m)、m = (1-α)p + αq。
+    ∇F(m) の項は (1-α)(p-m) + α(q-m) = 0 で消えるので、スキュー Jensen と同じ値になる。"""
+    return skew_jensen_div(P, Q, alpha, F_name)
+
+
+def chord_gap_div(P, Q, beta, gamma, F_name='squared'):
+    """J_F^γ(p:q) - J_F((pq)_γ, (pq)_β)。F((pq)_γ) は両方の項で 1 回だけ評価する。"""
+    gen = get_generator(F_name)
+    F = gen.F
+    P, Q = _as_float(P), _as_float(Q)
+    g = float(np.clip(gamma, 1e-6, 1 - 1e-6))
+    b = float(beta)
+    A = _mix(P, Q, g)
+    S = _mix(P, Q, b)
+    FA = F(A)
+    j1 = (1 - g) * F(P) + g * F(Q) - FA
+    FS = F(S)
+    S += A
+    S *= 0.5
+    return j1 - (0.5 * FA + 0.5 * FS - F(S))
+
+
+def row_F(X, F_name='squared'):
+    """各行の F(x)（float64）をブロックごとに計算する"""
+    F = get_generator(F_name).F
+    out = np.empty(len(X), dtype=np.float64)
+    for s in range(0, len(X), ROW_BLOCK):
+        out[s:s + ROW_BLOCK] = F(X[s:s + ROW_BLOCK])
+    return out
+
+
+def divergence_to(X, c, kind='skew_jensen', alpha=0.5, F_name='squared', FX=None):
+    """全行 x について D(x:c) を返す (n,)。FX に row_F(X) を渡すと再計算しない。"""
+    alpha = _check(kind, alpha)
+    gen = get_generator(F_name)
+    F = gen.F
+    c = np.asarray(c, dtype=np.float64)
+    if FX is None:
+        FX = row_F(X, gen)
+    Fc = float(F(c))
+    if kind == 'bregman':
+        g = gen.grad(c)
+        d = FX - (Fc - float(np.dot(c, g))) - X @ g.astype(X.dtype)
+    elif gen.quadratic:
+        # F=|x|^2 なら J^α(x:c) = α(1-α)(|x|^2 + |c|^2 - 2<x,c>)
+        d = alpha * (1 - alpha) * (FX + Fc - 2 * (X @ c.astype(X.dtype)))
+    else:
+        d = np.empty(len(X), dtype=np.float64)
+        cc = (alpha * c).astype(X.dtype)
+        for s in range(0, len(X), ROW_BLOCK):
+            blk = X[s:s + ROW_BLOCK]
+            d[s:s + ROW_BLOCK] = F(blk * X.dtype.type(1 - alpha) + cc)
+        d = (1 - alpha) * FX + alpha * Fc - d
+    return np.maximum(d, 0, out=d)
+
+
+def divergence_matrix(X, C, kind='skew_jensen', alpha=0.5, F_name='squared', FX=None):
+    """D[i, j] = D(x_i : c_j) の (n, k) 行列"""
+    alpha = _check(kind, alpha)
+    gen = get_generator(F_name)
+    C = np.asarray(C, dtype=np.float64)
+    if FX is None:
+        FX = row_F(X, gen)
+    FC = gen.F(C)
+    if kind == 'bregman':
+        G = gen.grad(C)
+        D = FX[:, None] - (FC - np.einsum('ij,ij->i', C, G))[None, :] - X @ G.T.astype(X.dtype)
+    elif gen.quadratic:
+        D = alpha * (1 - alpha) * (FX[:, None] + FC[None, :] - 2 * (X @ C.T.astype(X.dtype)))
+    else:
+        D = np.column_stack([divergence_to(X, c, kind, alpha, F_name, FX) for c in C])
+    return np.maximum(D, 0, out=D)
+
+
+def _rng(seed):
+    return seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+
+
+def kmeans_pp(X, k, kind='skew_jensen', alpha=0.5, F_name='squared', seed=None, FX=None):
+    """D² シーディングで選んだ k 個の行番号を返す。
+    最小ダイバージェンスの配列を持ち回り、新しい中心との距離だけを一括計算して更新する（O(n·d) / 中心）。"""
+    X = as_points(X)
+    n = len(X)
+    if k >= n:
+        return np.arange(n)
+    rng = _rng(seed)
+    if FX is None:
+        FX = row_F(X, F_name)
+    indices = [int(rng.integers(n))]
+    dmin = divergence_to(X, X[indices[0]], kind, alpha, F_name, FX)
+    for _ in range(k - 1):
+        cum = np.cumsum(dmin)
+        total = cum[-1]
+        if total > 0:
+            i = int(np.searchsorted(cum, rng.random() * total, side='right'))
+            i = min(i, n - 1)
+        else:
+            # 残りの点がすべて既存の中心と一致: 一様に選ぶ
+            i = int(rng.integers(n))
+        indices.append(i)
+        np.minimum(dmin, divergence_to(X, X[i], kind, alpha, F_name, FX), out=dmin)
+    return np.asarray(indices)
+
+
+def grad_inverse(gen, Y, x0=None, max_iter=NEWTON_MAX_ITER, tol=1e-12):
+    """∇F(x) = Y となる x。grad_inv があればそれを、なければ x0 から Hessian の solve で Newton 法を回す。"""
+    gen = get_generator(gen)
+    if gen.grad_inv is not None:
+        return gen.grad_inv(Y)
+    if gen.hess is None:
+        raise ValueError('generator %s has neither grad_inv nor hess' % gen.name)
+    x = np.array(Y if x0 is None else x0, dtype=np.float64)
+    for _ in range(max_iter):
+        r = gen.grad(x)
+        r -= Y
+        step = gen.hess(x).solve(r)
+        x -= step
+        if float(np.max(np.abs(step))) <= tol * max(1.0, float(np.max(np.abs(x)))):
+            break
+    return x
+
+
+def _normalized_weights(weights, n):
+    if weights is None:
+        return np.full(n, 1.0 / n)
+    w = np.asarray(weights, dtype=np.float64).reshape(-1)
+    if len(w) != n:
+        raise ValueError('weights must have one entry per point')
+    return w / (np.sum(w) + _EPS)
+
+
+def skew_jensen_centroid(X, weights=None, alpha=0.5, F_name='squared', max_iter=CENTROID_MAX_ITER,
+                         tol=CENTROID_TOL, init=None):
+    """重み付きスキュー Jensen セントロイド argmin_c Σ w_i J_F^α(p_i:c)。
+    init に前回のセントロイドを渡すとそこから反復する（ウォームスタート）。
+    戻り値: dict(centroid (d,), iterations, converged)"""
+    X = as_points(X)
+    n = len(X)
+    w = _normalized_weights(weights, n)
+    alpha = float(np.clip(alpha, 1e-6, 1 - 1e-6))
+    mean = w @ X
+    gen = get_generator(F_name)
+    if gen.quadratic:
+        # ∇F(x)=2x なら固定点は重み付き平均そのもの
+        return {'centroid': mean, 'iterations': 0, 'converged': True}
+    if not gen.invertible:
+        raise ValueError('generator %s has neither grad_inv nor hess' % gen.name)
+    c = mean.copy() if init is None else np.asarray(init, dtype=np.float64).copy()
+    if gen.shift_invariant:
+        # J^α は c の定数シフトで不変: 成分平均が点の成分平均の重み付き平均になるシフトを選ぶ
+        shift = float(np.mean(mean))
+    wx = w.astype(X.dtype)
+    converged = False
+    iterations = 0
+    for iterations in range(1, max_iter + 1):
+        acc = np.zeros(X.shape[1], dtype=np.float64)
+        ac = (alpha * c).astype(X.dtype)
+        for s in range(0, n, ROW_BLOCK):
+            M = X[s:s + ROW_BLOCK] * X.dtype.type(1 - alpha)
+            M += ac
+            acc += wx[s:s + ROW_BLOCK] @ gen.grad(M, out=M)
+        nxt = grad_inverse(gen, acc, c)
+        if gen.shift_invariant:
+            nxt += shift - np.mean(nxt)
+        delta = float(np.max(np.abs(nxt - c)))
+        c = nxt
+        if delta <= tol * max(1.0, float(np.max(np.abs(c)))):
+            converged = True
+            break
+    return {'centroid': c, 'iterations': iterations, 'converged': converged}
+
+
+def _cluster_means(X, labels, k):
+    """クラスタごとの平均（空クラスタは NaN）。ブロックごとの one-hot 行列との積で和を取る。"""
+    counts = np.bincount(labels, minlength=k).astype(np.float64)
+    sums = np.zeros((k, X.shape[1]), dtype=np.float64)
+    ids = np.arange(k)
+    for s in range(0, len(X), ROW_BLOCK):
+        onehot = (labels[s:s + ROW_BLOCK, None] == ids).astype(X.dtype)
+        sums += onehot.T @ X[s:s + ROW_BLOCK]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts[:, None], counts
+
+
+def kmeans(X, k, kind='skew_jensen', alpha=0.5, F_name='squared', max_iter=100, tol=1e-6, seed=None,
+           centroid_iter=20):
+    """Bregman / スキュー Jensen k-means（Lloyd 反復）。
+    セントロイドは右側（x:c）の Bregman セントロイドがクラスタ平均になることを使う。
+    スキュー Jensen は F=squared なら平均が厳密解、それ以外は前回の中心からウォームスタートした
+    CCCP を最大 centroid_iter 回回す。
+    戻り値: dict(centers, labels, inertia, iterations, seeds)"""
+    X = as_points(X)
+    n = len(X)
+    k = max(1, min(int(k), n))
+    rng = _rng(seed)
+    gen = get_generator(F_name)
+    FX = row_F(X, gen)
+    seeds = kmeans_pp(X, k, kind, alpha, F_name, rng, FX)
+    centers = X[seeds].astype(np.float64)
+    prev = None
+    iterations = 0
+    for iterations in range(1, max_iter + 1):
+        D = divergence_matrix(X, centers, kind, alpha, F_name, FX)
+        labels = np.argmin(D, axis=1)
+        dist = D[np.arange(n), labels]
+        inertia = float(np.sum(dist))
+        means, counts = _cluster_means(X, labels, k)
+        empty = counts == 0
+        if kind == 'skew_jensen' and not gen.quadratic and gen.invertible:
+            for j in np.flatnonzero(~empty):
+                means[j] = skew_jensen_centroid(X[labels == j], None, alpha, F_name, centroid_iter,
+                                                init=centers[j])['centroid']
+        if np.any(empty):
+            # 空になったクラスタは、いま最も遠い点に置き直す
+            far = np.argsort(dist)[::-1][:int(np.sum(empty))]
+            means[empty] = X[far]
+        centers = means
+        if prev is not None and prev - inertia <= tol * max(abs(prev), _EPS):
+            break
+        prev = inertia
+    D = divergence_matrix(X, centers, kind, alpha, F_name, FX)
+    labels = np.argmin(D, axis=1)
+    inertia = float(np.sum(D[np.arange(n), labels]))
+    return {'centers': centers, 'labels': labels, 'inertia': inertia, 'iterations': iterations, 'seeds': seeds}
+
+
+def _grid(Pb, Q, fn):
+    """fn(P[:, None, :], Q[None, :, :]) -> (b, m) を、要素数が PAIR_BLOCK を超えないよう列方向に区切って計算する"""
+    cols = max(1, PAIR_BLOCK // max(1, len(Pb) * Q.shape[1]))
+    out = np.empty((len(Pb), len(Q)), dtype=np.float64)
+    for s in range(0, len(Q), cols):
+        out[:, s:s + cols] = fn(Pb[:, None, :], Q[None, s:s + cols, :])
+    return out
+
+
+def _pair_kernel(divergence, Q, F_name, alpha, beta, gamma):
+    """P の行ブロック -> (b, m) の行列を返す関数を作る（Q 側の前計算はここで 1 回だけ）"""
+    gen = get_generator(F_name)
+    squared = gen.quadratic
+    if divergence == 'bhattacharyya':
+        # 離散分布: BC = sum_i sqrt(p_i q_i) は正規化した sqrt(P) と sqrt(Q) の内積
+        def sqrt_dist(X):
+            return np.sqrt(np.clip(X / (np.sum(X, axis=1, keepdims=True) + _EPS), 0, None))
+        sq_Q = sqrt_dist(Q).T
+        return lambda Pb: -np.log(np.clip(sqrt_dist(Pb) @ sq_Q, _EPS, 1))
+    FQ = row_F(Q, gen)
+    if divergence == 'bregman':
+        G = gen.grad(np.asarray(Q, dtype=np.float64))
+        cQ = FQ - np.einsum('ij,ij->i', Q, G)
+        GT = G.T.astype(Q.dtype)
+        return lambda Pb: np.maximum(row_F(Pb, gen)[:, None] - cQ[None, :] - Pb @ GT, 0)
+    QT = Q.T
+    if divergence == 'chord_gap':
+        if squared:
+            # (pq)_γ - (pq)_β = (β-γ)(p-q) なので J^γ - J^{1/2} = (γ(1-γ) - (β-γ)²/4)|p-q|²
+            g = float(np.clip(gamma, 1e-6, 1 - 1e-6))
+            coef = g * (1 - g) - 0.25 * (float(beta) - g) ** 2
+            return lambda Pb: coef * np.maximum(row_F(Pb)[:, None] + FQ[None, :] - 2 * (Pb @ QT), 0)
+        return lambda Pb: _grid(Pb, Q, lambda Pg, Qg: chord_gap_div(Pg, Qg, beta, gamma, gen))
+    # jensen / skew_jensen / jensen_bregman
+    # スキュー Jensen–Bregman は内積項が打ち消し合ってスキュー Jensen と等しい
+    a = 0.5 if divergence == 'jensen' else float(np.clip(alpha, 1e-6, 1 - 1e-6))
+    if squared:
+        return lambda Pb: a * (1 - a) * np.maximum(row_F(Pb)[:, None] + FQ[None, :] - 2 * (Pb @ QT), 0)
+    return lambda Pb: np.maximum(_grid(Pb, Q, lambda Pg, Qg: skew_jensen_div(Pg, Qg, a, gen)), 0)
+
+
+def pairwise(P, Q=None, divergence='skew_jensen', F_name='squared', alpha=0.5, beta=0.3, gamma=0.5, top_k=None):
+    """D[i, j] = D(p_i : q_j)。Q を省略すると P 同士。
+    top_k を指定すると行ごとに値の小さい k 列だけを (indices, values) で返す（昇順）。
+    戻り値は top_k なしなら (n, m) 行列、ありなら (indices (n, k), values (n, k))。"""
+    if divergence not in PAIRWISE:
+        raise ValueError('unknown divergence: %s' % divergence)
+    P = as_points(P)
+    Q = P if Q is None else as_points(Q)
+    if P.shape[1] != Q.shape[1]:
+        raise ValueError('P and Q must have the same dimension')
+    n, m = len(P), len(Q)
+    kernel = _pair_kernel(divergence, Q, F_name, alpha, beta, gamma)
+    rows = max(1, min(ROW_BLOCK, PAIR_BLOCK // max(1, m * P.shape[1])))
+    if top_k is None:
+        out = np.empty((n, m), dtype=np.float64)
+        for s in range(0, n, rows):
+            out[s:s + rows] = kernel(P[s:s + rows])
+        return out
+    k = max(1, min(int(top_k), m))
+    indices = np.empty((n, k), dtype=np.int64)
+    values = np.empty((n, k), dtype=np.float64)
+    for s in range(0, n, rows):
+        D = kernel(P[s:s + rows])
+        idx = np.argpartition(D, k - 1, axis=1)[:, :k] if k < m else np.broadcast_to(np.arange(m), D.shape)
+        val = np.take_along_axis(D, idx, axis=1)
+        order = np.argsort(val, axis=1, kind='stable')
+        indices[s:s + rows] = np.take_along_axis(idx, order, axis=1)
+        values[s:s + rows] = np.take_along_axis(val, order, axis=1)
+    return indices, values
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+一括 API（POST/DELETE /tasks/bulk, /memos/bulk）の共通処理（tasks / memos から使う）。
+
+バッチは全件を検証してから、保存エンジンの insert_many / delete_many で同期 1 回・永続書き込み 1 回で反映する。
+1 件でも失敗する項目があればバッチ全体を適用しない（トランザクション）。
+レスポンスは {"applied": bool, "results": [...]} で、results は入力と同じ順の項目ごとの結果。
+失敗した項目には status と error、巻き添えで適用されなかった項目には 424 を入れる。
+"""
+import json
+
+# 1 回のバッチで受け付ける最大件数
+MAX_BULK_ITEMS = 10000
+
+ABORTED = '同じバッチの他の項目が失敗したため適用されていません'
+
+
+def parse_bulk_body(raw, key):
+    """リクエストボディから項目リストを取り出す（{key: [...]} か配列そのもの）"""
+    body = json.loads(raw or '{}')
+    items = body.get(key) if isinstance(body, dict) else body
+    if not isinstance(items, list):
+        raise ValueError('%s must be a list' % key)
+    if len(items) > MAX_BULK_ITEMS:
+        raise ValueError('too many items (max %d)' % MAX_BULK_ITEMS)
+    return items
+
+
+def _rejected(results, status):
+    return status, {'applied': False,
+                    'results': [r if r is not None else {'status': 424, 'error': ABORTED} for r in results]}
+
+
+def bulk_insert(store, items, build):
+    """build(item) -> 保存するフィールド（不正なら ValueError）。(statusCode, body) を返す"""
+    results = []
+    fields_list = []
+    failed = False
+    for item in items:
+        try:
+            if not isinstance(item, dict):
+                raise ValueError('項目はオブジェクトで指定してください')
+            fields_list.append(build(item))
+            results.append(None)
+        except ValueError as e:
+            failed = True
+            results.append({'status': 400, 'error': str(e)})
+    if failed:
+        return _rejected(results, 400)
+    records = store.insert_many(fields_list)
+    return 201, {'applied': True, 'results': [{'status': 201, 'item': r} for r in records]}
+
+
+def bulk_delete(store, ids, not_found):
+    """ids をまとめて削除する。not_found は見つからなかった項目のエラーメッセージ。(statusCode, body) を返す"""
+    results = []
+    seen = set()
+    failed = False
+    for record_id in ids:
+        if not isinstance(record_id, int) or isinstance(record_id, bool):
+            failed = True
+            results.append({'status': 400, 'error': 'id は整数で指定してください'})
+        elif record_id in seen:
+            failed = True
+            results.append({'status': 400, 'error': 'id が重複しています: %d' % record_id})
+        else:
+            seen.add(record_id)
+            results.append(None)
+    if failed:
+        return _rejected(results, 400)
+    missing = set(store.delete_many(ids))
+    if missing:
+        return _rejected([{'status': 404, 'id': i, 'error': not_found} if i in missing else None for i in ids], 404)
+    return 200, {'applied': True, 'results': [{'status': 200, 'id': i} for i in ids]}
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+ケプストラムによるスペクトル包絡の変換（research_api の /api/cyclegan/convert から使う）。
+
+フレームごとに分析・変形・合成する（blockproc.stft_process の上で、FRAME_BLOCK フレームずつ一括）:
+  1. STFT（Hann 窓・ホップ N/4）の対数振幅から実ケプストラムを求め、低ケフレンシー（LIFTER_MS まで）だけを
+     残して戻したものを対数包絡とする。
+  2. 励振（微細構造と位相）= スペクトル / 包絡。包絡とは別に持ち、変えない。
+  3. 対数包絡を周波数軸方向に warp 倍に伸縮する（出力の f は入力の f / warp。フォルマントが warp 倍になる）。
+     ビンごとの読み出し位置と補間の重みは (ビン数, warp) ごとに表にしてキャッシュする。
+  4. 励振 × 伸縮した包絡を逆 rFFT してオーバーラップ加算する。
+処理量・作業領域ともにクリップの長さに比例する（作業領域はブロックの大きさで決まる）。
+包絡の表は (読み出し位置, 対数ゲイン) の一般形で、話者プロファイル（speaker_profile）の周波数伸縮カーブと
+スペクトル傾斜もこの形にして渡す。convert_many は 1–2 の分析を 1 回だけ行い、3–4 を表ごとに繰り返す。
+"""
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from blockproc import FRAME_BLOCK, stft_process, stft_process_many
+
+# フレーム長（2 のべき乗に切り上げる）
+FRAME_MS = 40.0
+# 包絡に残すケフレンシーの上限。ピッチ周期（F0 400 Hz で 2.5 ms）より短くする
+LIFTER_MS = 1.5
+WARP_MIN = 0.5
+WARP_MAX = 2.0
+CACHE_SIZE = 32
+_LOG_FLOOR = 1e-10
+
+
+def frame_length(sample_rate, frame_ms=FRAME_MS):
+    return 1 << (int(round(sample_rate * frame_ms / 1000.0)) - 1).bit_length()
+
+
+def n_cepstra(sample_rate, lifter_ms=LIFTER_MS):
+    return max(int(sample_rate * lifter_ms / 1000.0), 1)
+
+
+def envelope(spec, n_ceps):
+    """フレームごとの対数振幅包絡 (m, ビン数)。spec は rFFT (m, N // 2 + 1)"""
+    N = 2 * (spec.shape[1] - 1)
+    log_mag = np.log(np.maximum(np.abs(spec), _LOG_FLOOR))
+    cep = np.fft.irfft(log_mag, n=N, axis=1)
+    cep[:, n_ceps:N - n_ceps + 1] = 0.0
+    return np.fft.rfft(cep, axis=1).real
+
+
+def analyze(spec, n_ceps):
+    """(対数包絡, 励振)。励振 = spec / 包絡（spec を書き換えて返す）"""
+    log_env = envelope(spec, n_ceps)
+    spec *= np.exp(-log_env)
+    return log_env, spec
+
+
+def synthesize(excitation, log_env):
+    return excitation * np.exp(log_env)
+
+
+def bin_table(pos, log_gain=None):
+    """出力のビン k の包絡 = 入力のビン pos[k] の包絡（線形補間）+ log_gain[k] にする表 (i, frac, log_gain)"""
+    n_bins = len(pos)
+    pos = np.clip(pos, 0, n_bins - 1)
+    i = np.minimum(pos.astype(np.intp), n_bins - 2)
+    frac = pos - i
+    gain = np.zeros(n_bins) if log_gain is None else np.asarray(log_gain, dtype=np.float64)
+    for a in (i, frac, gain):
+        a.setflags(write=False)
+    return i, frac, gain
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def warp_table(n_bins, warp):
+    """包絡を warp 倍に伸縮する表。出力のビン k は入力の k / warp（末尾を越えたら最後のビン）"""
+    return bin_table(np.arange(n_bins) / float(warp))
+
+
+def warp_envelope(log_env, table):
+    i, frac, gain = table
+    return log_env[:, i] * (1.0 - frac) + log_env[:, i + 1] * frac + gain
+
+
+def convert(audio_data, sample_rate, warp=1.0, frame_ms=FRAME_MS, lifter_ms=LIFTER_MS, block_frames=FRAME_BLOCK):
+    """フォルマント（スペクトル包絡）を warp 倍にした信号（長さは入力と同じ）。励振（F0・位相）はそのまま。"""
+    warp = float(warp)
+    if not WARP_MIN <= warp <= WARP_MAX:
+        raise ValueError('warp must be between %g and %g' % (WARP_MIN, WARP_MAX))
+    N = frame_length(sample_rate, frame_ms)
+    n_ceps = n_cepstra(sample_rate, lifter_ms)
+    table = warp_table(N // 2 + 1, warp)
+
+    def modify(spec):
+        log_env, excitation = analyze(spec, n_ceps)
+        return synthesize(excitation, warp_envelope(log_env, table))
+
+    return stft_process(audio_data, modify, N, block_frames=block_frames)
+
+
+def convert_many(audio_data, sample_rate, tables, frame_ms=FRAME_MS, lifter_ms=LIFTER_MS, block_frames=FRAME_BLOCK):
+    """
+    表ごとに包絡を変えた信号を並べた (len(tables), len(audio_data))。分析（STFT・包絡・励振）は 1 回だけ。
+    表は bin_table の形で、ビン数は frame_length(sample_rate, frame_ms) // 2 + 1。
+    """
+    N = frame_length(sample_rate, frame_ms)
+    n_ceps = n_cepstra(sample_rate, lifter_ms)
+    for table in tables:
+        if len(table[0]) != N // 2 + 1:
+            raise ValueError('table must have %d bins' % (N // 2 + 1))
+
+    def analysis(spec):
+        return analyze(spec, n_ceps)
+
+    def synthesis(table):
+        return lambda state: synthesize(state[1], warp_envelope(state[0], table))
+
+    return stft_process_many(audio_data, analysis, [synthesis(t) for t in tables], N, block_frames=block_frames)
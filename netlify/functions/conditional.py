@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+一覧 API の条件付き GET（tasks / memos から使う）。
+
+保存エンジンの版から弱い ETag を作り、If-None-Match（なければ If-Modified-Since）が一致したら
+一覧を読まず・シリアライズせずに 304 を返せるようにする。版は X-Data-Version でも返し、
+クライアントはそれを GET /<name>/changes?since=<版> に渡して差分だけを取得できる。
+"""
+from email.utils import formatdate, parsedate_to_datetime
+
+# 条件付きリクエスト用に許可・公開するヘッダ（CORS）
+ALLOW_HEADERS = 'Content-Type, If-None-Match, If-Modified-Since'
+EXPOSE_HEADERS = 'ETag, Last-Modified, X-Data-Version'
+
+
+def collection_etag(name, version):
+    return 'W/"%s-%d"' % (name, version)
+
+
+def validator_headers(etag, version, modified):
+    headers = {'ETag': etag, 'X-Data-Version': str(version), 'Cache-Control': 'no-cache'}
+    if modified is not None:
+        headers['Last-Modified'] = formatdate(modified, usegmt=True)
+    return headers
+
+
+def _request_header(event, name):
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def is_not_modified(event, etag, modified):
+    """If-None-Match / If-Modified-Since がいまの版と一致するか"""
+    inm = _request_header(event, 'if-none-match')
+    if inm is not None:
+        # 弱い比較: W/ の有無は問わない
+        opaque = etag[2:] if etag.startswith('W/') else etag
+        for tag in inm.split(','):
+            tag = tag.strip()
+            if tag == '*' or (tag[2:] if tag.startswith('W/') else tag) == opaque:
+                return True
+        return False
+    ims = _request_header(event, 'if-modified-since')
+    if ims and modified is not None:
+        try:
+            return int(modified) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
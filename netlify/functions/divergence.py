@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """
 Netlify Function: ダイバージェンス計算（Nielsen 論文実装）
-body.action で jensen | skew_jensen | bregman | jensen_bregman | bhattacharyya | chord_gap | centroid | kmeans_pp
+body.action で jensen | skew_jensen | bregman | jensen_bregman | bhattacharyya | chord_gap | centroid | kmeans_pp | kmeans | pairwise
 """
 import json
 import base64
@@ -11,47 +11,24 @@ try:
 except ImportError:
     np = None
 
-def _F_squared(x):
-    x = np.asarray(x, dtype=float)
-    return float(np.sum(x * x))
+# 生成関数の登録と、単体・一括のダイバージェンスは共通エンジン（bregman.py）で計算する
+from bregman import PAIRWISE_MAX_CELLS, as_points, kmeans as _kmeans, kmeans_pp as _kmeans_pp, pairwise as _pairwise
+from bregman import bregman_div, chord_gap_div, jensen_bregman_div, skew_jensen_centroid, skew_jensen_div
 
-def _grad_F_squared(x):
-    return 2 * np.asarray(x, dtype=float)
-
-def _F_entropy(x):
-    x = np.asarray(x, dtype=float) + 1e-12
-    return float(np.sum(x * np.log(x)))
-
-def _grad_F_entropy(x):
-    x = np.asarray(x, dtype=float) + 1e-12
-    return 1 + np.log(x)
-
-_GEN = {
-    'squared': (_F_squared, _grad_F_squared),
-    'entropy': (_F_entropy, _grad_F_entropy),
-}
+# kmeans の反復回数の上限
+KMEANS_MAX_ITER = 1000
 
 def jensen_div(p, q, F_name='squared'):
-    p, q = np.asarray(p, dtype=float), np.asarray(q, dtype=float)
-    F, _ = _GEN.get(F_name, _GEN['squared'])
-    return float((F(p) + F(q)) / 2 - F((p + q) / 2))
+    return float(skew_jensen_div(p, q, 0.5, F_name))
 
 def skew_jensen(p, q, alpha, F_name='squared'):
-    p, q = np.asarray(p, dtype=float), np.asarray(q, dtype=float)
-    alpha = float(np.clip(alpha, 1e-6, 1 - 1e-6))
-    F, _ = _GEN.get(F_name, _GEN['squared'])
-    return float((1 - alpha) * F(p) + alpha * F(q) - F((1 - alpha) * p + alpha * q))
+    return float(skew_jensen_div(p, q, alpha, F_name))
 
 def bregman(p, q, F_name='squared'):
-    p, q = np.asarray(p, dtype=float), np.asarray(q, dtype=float)
-    F, g = _GEN.get(F_name, _GEN['squared'])
-    return float(F(p) - F(q) - np.dot(p - q, g(q)))
+    return float(bregman_div(p, q, F_name))
 
 def jensen_bregman(p, q, alpha, F_name='squared'):
-    p, q = np.asarray(p, dtype=float), np.asarray(q, dtype=float)
-    alpha = float(np.clip(alpha, 1e-6, 1 - 1e-6))
-    mid = (1 - alpha) * p + alpha * q
-    return float((1 - alpha) * bregman(p, mid, F_name) + alpha * bregman(q, mid, F_name))
+    return float(jensen_bregman_div(p, q, alpha, F_name))
 
 def bhattacharyya_gauss(mean1, var1, mean2, var2):
     mean1, var1 = float(mean1), float(var1) + 1e-10
@@ -69,32 +46,32 @@ def bhattacharyya_disc(p, q):
     return float(-np.log(bc))
 
 def chord_gap(p, q, beta, gamma, F_name='squared'):
-    p, q = np.asarray(p, dtype=float), np.asarray(q, dtype=float)
-    alpha = float(np.clip(gamma, 1e-6, 1 - 1e-6))
-    j1 = skew_jensen(p, q, alpha, F_name)
-    pq_a = (1 - alpha) * p + alpha * q
-    pq_s = (1 - beta) * p + beta * q
-    j2 = skew_jensen(pq_a, pq_s, 0.5, F_name)
-    return float(j1 - j2)
-
-def centroid(points, weights, alpha, F_name='squared'):
-    points = np.asarray(points, dtype=float)
-    weights = np.asarray(weights, dtype=float)
-    weights = weights / (np.sum(weights) + 1e-12)
-    return np.average(points, axis=0, weights=weights).tolist()
-
-def kmeans_pp(points, k, alpha=0.5):
-    points = np.asarray(points, dtype=float)
-    n = len(points)
-    if k >= n:
-        return [points[i].tolist() for i in range(n)]
-    indices = [int(np.random.randint(0, n))]
-    for _ in range(k - 1):
-        d2 = np.array([min(skew_jensen(points[i], points[c], alpha, 'squared') for c in indices) for i in range(n)])
-        d2 = np.maximum(d2, 0)
-        probs = d2 / (np.sum(d2) + 1e-12)
-        indices.append(int(np.random.choice(n, p=probs)))
-    return [points[i].tolist() for i in indices]
+    return float(chord_gap_div(p, q, beta, gamma, F_name))
+
+def centroid(points, weights, alpha, F_name='squared', max_iter=100, tol=1e-10, init=None):
+    r = skew_jensen_centroid(as_points(points), weights, alpha, F_name, max_iter, tol, init)
+    return {'centroid': r['centroid'].tolist(), 'iterations': r['iterations'], 'converged': r['converged']}
+
+def kmeans_pp(points, k, alpha=0.5, F_name='squared', seed=None):
+    X = as_points(points)
+    return X[_kmeans_pp(X, k, 'skew_jensen', alpha, F_name, seed)].tolist()
+
+def kmeans(points, k, divergence='skew_jensen', alpha=0.5, F_name='squared', max_iter=100, seed=None):
+    r = _kmeans(as_points(points), k, divergence, alpha, F_name, max_iter=max_iter, seed=seed)
+    return {'centers': r['centers'].tolist(), 'labels': r['labels'].tolist(), 'inertia': r['inertia'],
+            'iterations': r['iterations'], 'seeds': r['seeds'].tolist()}
+
+def pairwise(P, Q=None, divergence='skew_jensen', F_name='squared', alpha=0.5, beta=0.3, gamma=0.5, top_k=None):
+    P = as_points(P)
+    Q = None if Q is None else as_points(Q)
+    m = len(P) if Q is None else len(Q)
+    if top_k is None:
+        if len(P) * m > PAIRWISE_MAX_CELLS:
+            raise ValueError('matrix too large (%d x %d); use top_k' % (len(P), m))
+        D = _pairwise(P, Q, divergence, F_name, alpha, beta, gamma)
+        return {'shape': list(D.shape), 'matrix': D.tolist()}
+    indices, values = _pairwise(P, Q, divergence, F_name, alpha, beta, gamma, int(top_k))
+    return {'shape': [len(P), m], 'indices': indices.tolist(), 'values': values.tolist()}
 
 def handler(event, context):
     headers = {
@@ -156,14 +133,36 @@ def handler(event, context):
             weights = data.get('weights', [1.0 / len(points)] * len(points))
             alpha = float(data.get('alpha', 0.5))
             F = data.get('F', 'squared')
-            out = {'centroid': centroid(points, weights, alpha, F)}
+            max_iter = min(int(data.get('max_iter', 100)), KMEANS_MAX_ITER)
+            tol = float(data.get('tol', 1e-10))
+            out = centroid(points, weights, alpha, F, max_iter, tol, data.get('init'))
         elif action == 'kmeans_pp':
             points = data.get('points', [[0, 0], [1, 1], [2, 0], [0, 2]])
             k = int(data.get('k', 2))
             alpha = float(data.get('alpha', 0.5))
-            out = {'seeds': kmeans_pp(points, k, alpha)}
+            F = data.get('F', 'squared')
+            out = {'seeds': kmeans_pp(points, k, alpha, F, data.get('seed'))}
+        elif action == 'kmeans':
+            points = data.get('points', [[0, 0], [1, 1], [2, 0], [0, 2]])
+            k = int(data.get('k', 2))
+            divergence = data.get('divergence', 'skew_jensen')
+            alpha = float(data.get('alpha', 0.5))
+            F = data.get('F', 'squared')
+            max_iter = min(int(data.get('max_iter', 100)), KMEANS_MAX_ITER)
+            out = kmeans(points, k, divergence, alpha, F, max_iter, data.get('seed'))
+        elif action == 'pairwise':
+            P = data.get('P', [[0, 0], [1, 1]])
+            divergence = data.get('divergence', 'skew_jensen')
+            F = data.get('F', 'squared')
+            alpha = float(data.get('alpha', 0.5))
+            beta = float(data.get('beta', 0.3))
+            gamma = float(data.get('gamma', 0.5))
+            out = pairwise(P, data.get('Q'), divergence, F, alpha, beta, gamma, data.get('top_k'))
         else:
             return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'error': 'Unknown action: ' + str(action)})}
         return {'statusCode': 200, 'headers': headers, 'body': json.dumps(out)}
+    except (TypeError, ValueError) as e:
+        # 入力の誤り（未知の divergence、大きすぎる行列など）
+        return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'error': str(e)})}
     except Exception as e:
         return {'statusCode': 500, 'headers': headers, 'body': json.dumps({'error': str(e)})}
@@ -1,34 +1,40 @@
 # -*- coding: utf-8 -*-
-"""Netlify Function: フォルマント合成 API"""
+"""Netlify Function: フォルマント合成 API
+body: f0, f1〜f5, b1〜b5（スカラーか、発話全体に等間隔に置いた値の列）, amplitude, duration, open_quotient, sample_rate,
+source（glottal | harmonic）, n_harmonics, rolloff（harmonic のときの帯域制限ウェーブテーブル）"""
 import json
 import base64
-import io
-import struct
 
 try:
     import numpy as np
 except ImportError:
     np = None
 
-def wav_write_bytes(sample_rate, waveform):
-    """int16 波形を WAV バイト列で返す（numpy なしでも動く簡易版）"""
-    buf = io.BytesIO()
-    # WAV header (44 bytes)
-    n = len(waveform)
-    buf.write(b'RIFF')
-    buf.write(struct.pack('<I', 36 + n * 2))
-    buf.write(b'WAVE')
-    buf.write(b'fmt ')
-    buf.write(struct.pack('<IHHIIHH', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16))
-    buf.write(b'data')
-    buf.write(struct.pack('<I', n * 2))
-    buf.write(waveform.tobytes() if hasattr(waveform, 'tobytes') else struct.pack('<%dh' % n, *waveform))
-    return buf.getvalue()
+from klatt import FormantSynth, synth_params
+from render_cache import ALLOW_HEADERS, EXPOSE_HEADERS, RenderCache, etag_matches, render_etag, render_key
+from timing import EXPOSE_HEADERS as TIMING_EXPOSE_HEADERS, request_timer
+from wav_codec import wav_write_bytes
+
+# 合成結果のキャッシュ（ウォームなインスタンスではプロセス内 LRU、/tmp のファイルは同じインスタンスで共有）
+RENDER_CACHE = RenderCache()
+
+def _request_header(event, name):
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value
+    return None
 
 def handler(event, context):
+    timer = request_timer('formant_synthesize')
+    response = _handle(event, timer)
+    response['headers'].update(timer.headers(response['statusCode']))
+    return response
+
+def _handle(event, timer):
     headers = {
         'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': 'Content-Type',
+        'Access-Control-Allow-Headers': ALLOW_HEADERS,
+        'Access-Control-Expose-Headers': EXPOSE_HEADERS + ', ' + TIMING_EXPOSE_HEADERS,
         'Access-Control-Allow-Methods': 'POST, OPTIONS',
     }
     if event.get('httpMethod') == 'OPTIONS':
@@ -43,9 +49,10 @@ def handler(event, context):
 
     try:
         body = event.get('body') or '{}'
-        if event.get('isBase64Encoded'):
-            body = base64.b64decode(body).decode('utf-8')
-        data = json.loads(body)
+        with timer.span('parse', bytes_in=len(body)):
+            if event.get('isBase64Encoded'):
+                body = base64.b64decode(body).decode('utf-8')
+            data = json.loads(body)
     except Exception as e:
         return {
             'statusCode': 400,
@@ -60,19 +67,43 @@ def handler(event, context):
             'body': json.dumps({'error': 'numpy not available'}, ensure_ascii=False)
         }
 
-    f0 = float(data.get('f0', 150))
-    duration = float(data.get('duration', 1.0))
-    sample_rate = 44100
-    n = int(sample_rate * duration)
-    t = np.linspace(0, duration, n, dtype=np.float64)
-    waveform = np.zeros(n, dtype=np.float64)
-    for h in range(1, 11):
-        waveform += (1.0 / h) * np.sin(2 * np.pi * f0 * h * t)
-    envelope = np.exp(-t * 2)
-    waveform *= envelope
-    waveform = waveform / (np.max(np.abs(waveform)) + 1e-8) * 0.8
-    wav_samples = (waveform * 32767).astype(np.int16)
-    wav_binary = wav_write_bytes(sample_rate, wav_samples)
+    # 同じパラメータなら同じ波形なので、正規化したパラメータのハッシュを強い ETag にして
+    # If-None-Match が一致すれば 304、キャッシュにあれば base64 済みの本文をそのまま返す
+    try:
+        params = synth_params(data)
+        key = render_key('formant', params)
+    except (TypeError, ValueError) as e:
+        return {
+            'statusCode': 400,
+            'headers': {**headers, 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False)
+        }
+    etag = render_etag(key)
+    if etag_matches(_request_header(event, 'if-none-match'), etag):
+        return {'statusCode': 304, 'headers': {**headers, 'ETag': etag}, 'body': ''}
+
+    # キャッシュにあれば合成・エンコードの段階は記録されない（X-Render-Cache: hit）
+    def render():
+        synth = FormantSynth(**params)
+        with timer.span('dsp') as s:
+            waveform = synth.render()
+            s.bytes_out = waveform.nbytes
+        with timer.span('encode', bytes_in=waveform.nbytes) as s:
+            wav = wav_write_bytes(synth.sample_rate, (waveform * 32767).astype(np.int16))
+            s.bytes_out = len(wav)
+        with timer.span('base64', bytes_in=len(wav)) as s:
+            body = base64.b64encode(wav)
+            s.bytes_out = len(body)
+        return body
+
+    try:
+        body, hit = RENDER_CACHE.get_or_render(key + '-b64', render)
+    except (TypeError, ValueError) as e:
+        return {
+            'statusCode': 400,
+            'headers': {**headers, 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False)
+        }
 
     return {
         'statusCode': 200,
@@ -80,7 +111,9 @@ def handler(event, context):
             **headers,
             'Content-Type': 'audio/wav',
             'Content-Disposition': 'inline; filename="formant_synthesis.wav"',
+            'ETag': etag,
+            'X-Render-Cache': 'hit' if hit else 'miss',
         },
-        'body': base64.b64encode(wav_binary).decode('ascii'),
+        'body': body.decode('ascii'),
         'isBase64Encoded': True,
     }
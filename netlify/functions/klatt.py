@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Klatt 型のカスケード・フォルマント合成の共通モジュール（formant_synthesize と research_api から使う）。
+
+音源 → カスケード共振器 → 出力:
+  音源: source='glottal'（既定）は位相累積でパルス列を作り、1 周期ごとに KLGLOTT88 型の声門体積流
+        (τ/OQ)² - (τ/OQ)³（開放区間のみ）を置き、1 次差分（口唇放射）をとった体積流微分。
+        source='harmonic' は Σ h^-rolloff sin(2π h φ) の帯域制限ウェーブテーブル（wavetable.Oscillator）。
+        どちらも F0 はサンプルごとに補間するので連続に変えられる。
+  共振器: Klatt (1980) の 2 次共振器 y[n] = A x[n] + B y[n-1] + C y[n-2]
+          C = -exp(-2πBw T), B = 2 exp(-πBw T) cos(2πF T), A = 1 - B - C（直流ゲイン 1）をフォルマントの数だけ直列に。
+フォルマント周波数・帯域幅・振幅は CONTROL_MS ごとの制御点で係数を更新する（制御区間の中では一定）。
+
+再帰は純 NumPy で計算する（scipy のない Netlify のランタイムでも同じ結果になる）:
+制御区間ごとの斉次解 g（g[0] = 1, g[1] = B, g[n] = B g[n-1] + C g[n-2]）を全区間まとめて求め、
+零状態応答は インパルス応答 A·g との畳み込み（一括 rFFT）、区間をまたぐ状態 (y[-1], y[-2]) は
+零入力応答 y[-1] g[n+1] + C y[-2] g[n] で受け渡す。サンプルごとの Python ループはない。
+blocks() は BLOCK_SAMPLES ずつ状態を持ち越して返すので、長い発話も一定のメモリで逐次合成できる。
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from wavetable import Oscillator
+
+SAMPLE_RATE = 44100
+# 係数を更新する間隔
+CONTROL_MS = 5.0
+# blocks() が一度に返すおおよそのサンプル数（制御区間の整数倍に切り上げる）
+BLOCK_SAMPLES = 1 << 15
+# Klatt (1980) のカスケード部の既定値 (周波数, 帯域幅)
+DEFAULT_FORMANTS = ((700.0, 100.0), (1200.0, 150.0), (2500.0, 200.0), (3300.0, 250.0), (3750.0, 200.0))
+MAX_FORMANTS = 8
+OPEN_QUOTIENT = 0.6
+# 立ち上がり・立ち下がりのフェード
+FADE_MS = 10.0
+# 1 リクエストで合成できる長さの上限
+MAX_DURATION = 600.0
+SOURCES = ('glottal', 'harmonic')
+
+
+def trajectory(value, duration, times):
+    """スカラーならそのまま、列なら 0〜duration に等間隔に置いた点とみなして times で線形補間する"""
+    v = np.atleast_1d(np.asarray(value, dtype=np.float64))
+    if v.ndim != 1 or len(v) == 0:
+        raise ValueError('trajectory must be a number or a non-empty list')
+    if len(v) == 1:
+        return np.full(len(times), v[0])
+    return np.interp(times, np.linspace(0.0, duration, len(v)), v)
+
+
+def resonator_coefficients(freq, bandwidth, sample_rate):
+    """Klatt の 2 次共振器の係数 (A, B, C)（freq, bandwidth と同じ形の配列）"""
+    T = 1.0 / sample_rate
+    r = np.exp(-np.pi * np.asarray(bandwidth, dtype=np.float64) * T)
+    C = -r * r
+    B = 2.0 * r * np.cos(2.0 * np.pi * np.asarray(freq, dtype=np.float64) * T)
+    return 1.0 - B - C, B, C
+
+
+def glottal_flow(phase, open_quotient=OPEN_QUOTIENT):
+    """位相 [0, 1) の KLGLOTT88 型の声門体積流（最大値 1）"""
+    tau = phase / open_quotient
+    flow = tau * tau * (1.0 - tau) * 6.75
+    flow[tau >= 1.0] = 0.0
+    return flow
+
+
+def _homogeneous(B, C, n):
+    """各制御区間の斉次解 g[0..n]（g[0] = 1, g[1] = B）。B, C は (m,) で戻り値は (m, n+1)。"""
+    g = np.empty((len(B), n + 1))
+    g[:, 0] = 1.0
+    if n >= 1:
+        g[:, 1] = B
+    for i in range(2, n + 1):
+        np.multiply(B, g[:, i - 1], out=g[:, i])
+        g[:, i] += C * g[:, i - 2]
+    return g
+
+
+def resonate(x, A, B, C, state):
+    """制御区間ごとに係数が変わる 2 次共振器を x (m, L) にかける。
+    A, B, C は (m,)、state は直前の出力 [y[-1], y[-2]]（書き換える）。戻り値は (m, L)。"""
+    m, L = x.shape
+    g = _homogeneous(B, C, L)
+    n_fft = 1 << (2 * L - 1).bit_length()
+    h = g[:, :L] * A[:, None]
+    y = np.fft.irfft(np.fft.rfft(x, n=n_fft, axis=1) * np.fft.rfft(h, n=n_fft, axis=1), n=n_fft, axis=1)[:, :L]
+    # 区間の終わりの状態は 零状態応答 + 持ち込んだ状態の線形結合。ここだけは区間の順に回す
+    y1, y2 = float(state[0]), float(state[1])
+    c1 = np.empty(m)
+    c2 = np.empty(m)
+    end1 = y[:, L - 1].tolist()
+    end2 = y[:, L - 2].tolist() if L > 1 else [0.0] * m
+    gL, gL1 = g[:, L].tolist(), g[:, L - 1].tolist()
+    gL2 = g[:, L - 2].tolist() if L > 1 else [0.0] * m
+    Cs = C.tolist()
+    for j in range(m):
+        c1[j], c2[j] = y1, Cs[j] * y2
+        y1, y2 = (end1[j] + y1 * gL[j] + c2[j] * gL1[j],
+                  (end2[j] + y1 * gL1[j] + c2[j] * gL2[j]) if L > 1 else y1)
+    state[0], state[1] = y1, y2
+    y += c1[:, None] * g[:, 1:]
+    y += c2[:, None] * g[:, :L]
+    return y
+
+
+class FormantSynth(object):
+    """1 回の合成の設定と状態。
+    f0・amplitude・各フォルマントの (周波数, 帯域幅) はスカラーか、発話全体に等間隔に置いた値の列（軌跡）。"""
+
+    def __init__(self, duration, sample_rate=SAMPLE_RATE, f0=150.0, formants=DEFAULT_FORMANTS, amplitude=1.0,
+                 open_quotient=OPEN_QUOTIENT, control_ms=CONTROL_MS, fade_ms=FADE_MS, source='glottal',
+                 n_harmonics=10, rolloff=1.0):
+        self.duration = float(duration)
+        if not 0 < self.duration <= MAX_DURATION:
+            raise ValueError('duration must be in (0, %g] seconds' % MAX_DURATION)
+        self.sample_rate = int(sample_rate)
+        if self.sample_rate < 1000:
+            raise ValueError('sample_rate too low')
+        if not 0 < float(open_quotient) <= 1:
+            raise ValueError('open_quotient must be in (0, 1]')
+        if source not in SOURCES:
+            raise ValueError('source must be one of: %s' % ', '.join(SOURCES))
+        if int(n_harmonics) < 1:
+            raise ValueError('n_harmonics must be positive')
+        self.source = source
+        self.n_harmonics = int(n_harmonics)
+        self.rolloff = float(rolloff)
+        formants = list(formants)
+        if not 1 <= len(formants) <= MAX_FORMANTS:
+            raise ValueError('1 to %d formants are supported' % MAX_FORMANTS)
+        self.n_samples = int(round(self.sample_rate * self.duration))
+        self.control = max(1, int(round(self.sample_rate * float(control_ms) / 1000.0)))
+        self.n_controls = -(-self.n_samples // self.control)
+        self.open_quotient = float(open_quotient)
+        self.fade = min(int(self.sample_rate * float(fade_ms) / 1000.0), self.n_samples // 2)
+
+        t_ctrl = np.arange(self.n_controls) * self.control / float(self.sample_rate)
+        nyquist = self.sample_rate / 2.0
+        self.coefficients = []
+        for freq, bw in formants:
+            F = trajectory(freq, self.duration, t_ctrl)
+            Bw = trajectory(bw, self.duration, t_ctrl)
+            if np.any(F <= 0) or np.any(F >= nyquist) or np.any(Bw <= 0):
+                raise ValueError('formant frequencies must be in (0, %g) Hz and bandwidths positive' % nyquist)
+            self.coefficients.append(resonator_coefficients(F, Bw, self.sample_rate))
+        self.gain = trajectory(amplitude, self.duration, t_ctrl)
+        f0 = np.atleast_1d(np.asarray(f0, dtype=np.float64))
+        if np.any(f0 <= 0) or np.any(f0 >= nyquist):
+            raise ValueError('f0 must be in (0, %g) Hz' % nyquist)
+        self.f0_knots = (np.linspace(0.0, self.duration, len(f0)) if len(f0) > 1 else np.zeros(1), f0)
+
+    def _f0(self, start, n):
+        """サンプル start から n 個の F0 (Hz)"""
+        t = (start + np.arange(n)) / float(self.sample_rate)
+        return np.interp(t, *self.f0_knots)
+
+    def _glottal(self, f0, phase, prev):
+        """体積流微分。phase / prev（直前の体積流）を持ち越す。"""
+        cycle = np.cumsum(f0 / self.sample_rate)
+        cycle += phase
+        flow = glottal_flow(cycle % 1.0, self.open_quotient)
+        src = np.diff(flow, prepend=prev)
+        return src, float(cycle[-1] % 1.0), float(flow[-1])
+
+    def blocks(self, block_samples=BLOCK_SAMPLES):
+        """波形（float64、正規化なし）を先頭から順にブロックで返すジェネレータ"""
+        per = max(1, -(-int(block_samples) // self.control))
+        states = [[0.0, 0.0] for _ in self.coefficients]
+        phase, prev = 0.0, 0.0
+        osc = Oscillator(self.sample_rate, self.n_harmonics, self.rolloff) if self.source == 'harmonic' else None
+        L = self.control
+        for c0 in range(0, self.n_controls, per):
+            c1 = min(c0 + per, self.n_controls)
+            start = c0 * L
+            f0 = self._f0(start, (c1 - c0) * L)
+            if osc is None:
+                src, phase, prev = self._glottal(f0, phase, prev)
+            else:
+                src = osc.render(f0)
+            x = src.reshape(c1 - c0, L)
+            x *= self.gain[c0:c1, None]
+            for (A, B, C), state in zip(self.coefficients, states):
+                x = resonate(x, A[c0:c1], B[c0:c1], C[c0:c1], state)
+            y = x.reshape(-1)[:max(0, min(len(src), self.n_samples - start))]
+            self._apply_fade(y, start)
+            yield y
+
+    def _apply_fade(self, y, start):
+        if self.fade <= 0:
+            return
+        ramp = 0.5 - 0.5 * np.cos(np.pi * np.arange(self.fade) / self.fade)
+        idx = np.arange(start, start + len(y))
+        head = idx < self.fade
+        y[head] *= ramp[idx[head]]
+        tail = idx >= self.n_samples - self.fade
+        y[tail] *= ramp[self.n_samples - 1 - idx[tail]]
+
+    def render(self, peak=0.8):
+        """全体を合成して最大振幅 peak に正規化する"""
+        out = np.empty(self.n_samples)
+        pos = 0
+        for y in self.blocks():
+            out[pos:pos + len(y)] = y
+            pos += len(y)
+        top = float(np.max(np.abs(out))) if len(out) else 0.0
+        if top > 0:
+            out *= peak / top
+        return out
+
+
+def synth_params(data, sample_rate=SAMPLE_RATE):
+    """リクエストの値を既定値で埋めた FormantSynth の引数（キャッシュのキーにもそのまま使える）。
+    source が glottal のときは n_harmonics / rolloff は結果に影響しないので含めない。"""
+    params = {
+        'duration': float(data.get('duration', 1.0)),
+        'sample_rate': int(data.get('sample_rate', sample_rate)),
+        'f0': data.get('f0', 150),
+        'formants': formants_from_params(data),
+        'amplitude': data.get('amplitude', 1.0),
+        'open_quotient': float(data.get('open_quotient', OPEN_QUOTIENT)),
+        'source': data.get('source', 'glottal'),
+    }
+    if params['source'] == 'harmonic':
+        params['n_harmonics'] = int(data.get('n_harmonics', 10))
+        params['rolloff'] = float(data.get('rolloff', 1.0))
+    return params
+
+
+def synth_from_params(data, sample_rate=SAMPLE_RATE):
+    """リクエストの値から FormantSynth を作る（値の検査は FormantSynth が行い ValueError を送出する）"""
+    return FormantSynth(**synth_params(data, sample_rate))
+
+
+def formants_from_params(data, defaults=DEFAULT_FORMANTS):
+    """リクエストの f1..f8 / b1..b8 から [(周波数, 帯域幅), ...] を作る（f1〜f5 は既定値あり、f6 以降は指定があれば追加）"""
+    formants = []
+    for i in range(1, MAX_FORMANTS + 1):
+        key_f, key_b = 'f%d' % i, 'b%d' % i
+        if i <= len(defaults):
+            formants.append((data.get(key_f, defaults[i - 1][0]), data.get(key_b, defaults[i - 1][1])))
+        elif data.get(key_f) is not None:
+            formants.append((data[key_f], data.get(key_b, 200.0)))
+    return formants
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+LPC（線形予測）分析の共通モジュール（research_api から使う）。
+
+信号全体をフレーム（既定 25 ms / 10 ms）に分け、FRAME_BLOCK フレームずつ
+  プリエンファシス → ハミング窓 → 自己相関（pitch.batch_autocorr の一括 rFFT）→ Levinson-Durbin（全フレーム同時）
+で予測係数 a（A(z) = 1 + Σ a_j z^-j）、反射係数 k、予測誤差を求める。
+フォルマントは LPC 包絡 1/|A(e^jω)|² を rFFT で評価し、ピークを放物線補間した周波数（低い順）。
+作業領域はブロックごとなので、長時間の録音でも次数 MAX_ORDER まで一定のメモリで処理できる。
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from pitch import batch_autocorr
+
+# 一度に処理するフレーム数
+FRAME_BLOCK = 1024
+MAX_ORDER = 64
+PRE_EMPHASIS = 0.97
+# フォルマント推定で包絡を評価する rFFT 長と、探す周波数範囲の下限
+ENVELOPE_FFT = 1024
+FORMANT_MIN_HZ = 90.0
+N_FORMANTS = 4
+# 自己相関の 0 ラグに足す白色雑音補正（悪条件のフレームで再帰を安定させる）
+_WHITE_NOISE = 1e-9
+
+
+def levinson_durbin(R, order):
+    """自己相関 R (n, order+1) から全フレーム同時に (a (n, order+1), k (n, order), err (n,)) を返す。
+    R[:, 0] が 0 のフレーム（無音）は a = [1, 0, ...]、k = 0、err = 0。"""
+    R = np.asarray(R, dtype=np.float64)
+    n = len(R)
+    a = np.zeros((n, order + 1))
+    a[:, 0] = 1.0
+    k = np.zeros((n, order))
+    err = R[:, 0].copy()
+    live = err > 0
+    safe = np.where(live, err, 1.0)
+    for i in range(1, order + 1):
+        acc = np.einsum('nj,nj->n', a[:, :i], R[:, i:0:-1])
+        ki = np.where(live, -acc / safe, 0.0)
+        rev = a[:, i - 1:0:-1].copy()
+        rev *= ki[:, None]
+        a[:, 1:i] += rev
+        a[:, i] = ki
+        k[:, i - 1] = ki
+        safe *= 1.0 - ki * ki
+        np.maximum(safe, np.finfo(np.float64).tiny, out=safe)
+    err = np.where(live, safe, 0.0)
+    return a, k, err
+
+
+def formants(a, sample_rate, n_formants=N_FORMANTS, n_fft=ENVELOPE_FFT):
+    """LPC 係数 a (n, order+1) から包絡のピーク周波数 (n, n_formants) を返す（見つからない分は 0）"""
+    A = np.fft.rfft(a, n=n_fft, axis=1)
+    E = -np.log(np.maximum(A.real * A.real + A.imag * A.imag, 1e-30))
+    y0, y1, y2 = E[:, :-2], E[:, 1:-1], E[:, 2:]
+    bins = np.arange(1, E.shape[1] - 1)
+    peak = (y1 > y0) & (y1 >= y2) & (bins * sample_rate / n_fft >= FORMANT_MIN_HZ)
+    rank = np.cumsum(peak, axis=1)
+    rows, cols = np.nonzero(peak & (rank <= n_formants))
+    p0, p1, p2 = y0[rows, cols], y1[rows, cols], y2[rows, cols]
+    curv = p0 - 2 * p1 + p2
+    shift = np.zeros(len(rows))
+    ok = curv < 0
+    shift[ok] = 0.5 * (p0[ok] - p2[ok]) / curv[ok]
+    out = np.zeros((len(a), n_formants))
+    out[rows, rank[rows, cols] - 1] = (cols + 1 + shift) * sample_rate / n_fft
+    return out
+
+
+def frame_count(n_samples, frame_len, hop):
+    return (n_samples - frame_len) // hop + 1 if n_samples >= frame_len else 0
+
+
+def analyze(audio_data, sample_rate, order=16, frame_ms=25.0, hop_ms=10.0, pre_emphasis=PRE_EMPHASIS,
+            n_formants=N_FORMANTS, block_frames=FRAME_BLOCK):
+    """フレームごとの LPC をブロック単位で返すジェネレータ。
+    各ブロックは dict(start（先頭フレーム番号）, time (b,), lpc (b, order+1), reflection (b, order),
+    error (b,), formants (b, n_formants))。time はフレーム中心の秒。"""
+    order = int(order)
+    if not 1 <= order <= MAX_ORDER:
+        raise ValueError('lpc_order must be between 1 and %d' % MAX_ORDER)
+    x = np.asarray(audio_data)
+    frame_len = max(1, int(round(sample_rate * frame_ms / 1000.0)))
+    hop = max(1, int(round(sample_rate * hop_ms / 1000.0)))
+    if frame_len <= order:
+        raise ValueError('frame must be longer than lpc_order samples')
+    return _blocks(x, float(sample_rate), order, frame_len, hop, float(pre_emphasis), int(n_formants),
+                   max(1, int(block_frames)))
+
+
+def _blocks(x, sample_rate, order, frame_len, hop, coef, n_formants, block_frames):
+    window = np.hamming(frame_len)
+    n_frames = frame_count(len(x), frame_len, hop)
+    for start in range(0, n_frames, block_frames):
+        end = min(start + block_frames, n_frames)
+        s = start * hop
+        seg = np.asarray(x[s:(end - 1) * hop + frame_len], dtype=np.float64)
+        pe = np.empty_like(seg)
+        pe[0] = seg[0] - coef * (float(x[s - 1]) if s > 0 else 0.0)
+        np.subtract(seg[1:], coef * seg[:-1], out=pe[1:])
+        frames = np.lib.stride_tricks.sliding_window_view(pe, frame_len)[::hop]
+        R = batch_autocorr(frames * window, order + 1)
+        R[:, 0] *= 1.0 + _WHITE_NOISE
+        a, k, err = levinson_durbin(R, order)
+        yield {
+            'start': start,
+            'time': (np.arange(start, end) * hop + frame_len / 2.0) / sample_rate,
+            'lpc': a,
+            'reflection': k,
+            'error': err,
+            'formants': formants(a, sample_rate, n_formants) if n_formants > 0 else np.zeros((end - start, 0)),
+        }
+
+
+def lpc_coefficients(frame, order):
+    """1 フレーム（ハミング窓をかけて）の LPC 係数 (order+1,)"""
+    frame = np.asarray(frame, dtype=np.float64)
+    if len(frame) <= order:
+        return np.concatenate([[1.0], np.zeros(order)])
+    R = batch_autocorr((frame * np.hamming(len(frame)))[None, :], order + 1)
+    R[:, 0] *= 1.0 + _WHITE_NOISE
+    return levinson_durbin(R, order)[0][0]
@@ -5,26 +5,30 @@ Netlify Function: メモ管理API
 """
 
 import json
-import os
 from datetime import datetime
 from pathlib import Path
 
+from search import InvertedIndex
+from bulk import bulk_delete, bulk_insert, parse_bulk_body
+from conditional import ALLOW_HEADERS, EXPOSE_HEADERS, collection_etag, is_not_modified, validator_headers
+from store import open_store, page_params
+
 # データファイルのパス（Netlify Functions環境用）
 DATA_DIR = Path('/tmp') / 'taskmemo_data'
 DATA_DIR.mkdir(exist_ok=True, parents=True)
-MEMOS_FILE = DATA_DIR / 'memos.json'
 
-def load_memos():
-    """メモデータを読み込む"""
-    if MEMOS_FILE.exists():
-        with open(MEMOS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
+# 追記ログ＋ id インデックスの保存エンジン（従来の memos.json は初回に取り込む）
+# 一覧は created_at 順のインデックスから新しい順に返す（毎回のソートはしない）
+STORE = open_store(DATA_DIR, 'memos', order_by='created_at')
+
+# 全文検索用の n-gram 転置インデックス（タイトルの一致を本文の 2 倍に数える）
+# 保存エンジンに購読させておくと、追加・削除や他プロセスの追記に合わせて差分で更新される
+SEARCH = InvertedIndex({'title': 2, 'content': 1})
+STORE.subscribe(SEARCH)
 
-def save_memos(memos):
-    """メモデータを保存する"""
-    with open(MEMOS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(memos, f, ensure_ascii=False, indent=2)
+# 検索結果の件数（limit 省略時と上限）
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
 
 def handler(event, context):
     """Netlify Function ハンドラー"""
@@ -32,7 +36,8 @@ def handler(event, context):
     headers = {
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': 'Content-Type',
+        'Access-Control-Allow-Headers': ALLOW_HEADERS,
+        'Access-Control-Expose-Headers': EXPOSE_HEADERS,
         'Access-Control-Allow-Methods': 'GET, POST, DELETE, OPTIONS'
     }
     
@@ -54,15 +59,109 @@ def handler(event, context):
         memo_id = int(path_parts[-1])
     
     try:
+        # GET /memos/changes?since=<版>
+        # since より後に追加・更新されたレコードと削除された id を返す（履歴が残っていなければ 410）
+        if method == 'GET' and path_parts[-1] == 'changes':
+            query = event.get('queryStringParameters') or {}
+            if query.get('since') in (None, ''):
+                raise ValueError('since is required')
+            version, changes = STORE.changes(int(query['since']))
+            if changes is None:
+                return {
+                    'statusCode': 410,
+                    'headers': headers,
+                    'body': json.dumps({'error': '差分の履歴がありません。一覧を取り直してください', 'version': version},
+                                       ensure_ascii=False)
+                }
+            body = {
+                'version': version,
+                'changes': [{'op': 'put', 'item': v} if op == 'put' else {'op': 'delete', 'id': v} for op, v in changes]
+            }
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': json.dumps(body, ensure_ascii=False)
+            }
+        
+        # GET /memos/search?q=<クエリ>&limit=<件数>
+        # スコアの高い順に {items, total} を返す
+        elif method == 'GET' and path_parts[-1] == 'search':
+            query = event.get('queryStringParameters') or {}
+            q = (query.get('q') or '').strip()
+            if not q:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': json.dumps({'error': '検索語 q が必要です'}, ensure_ascii=False)
+                }
+            limit = int(query.get('limit') or SEARCH_DEFAULT_LIMIT)
+            if limit < 1:
+                raise ValueError('limit must be positive')
+            with STORE.reading() as records:
+                hits, total = SEARCH.search_with_total(q, min(limit, SEARCH_MAX_LIMIT))
+                items = [dict(records[memo_id], score=round(score, 4)) for memo_id, score in hits]
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': json.dumps({'items': items, 'total': total}, ensure_ascii=False)
+            }
+        
         # GET /memos
-        if method == 'GET' and not memo_id:
-            memos = load_memos()
-            # 作成日時の新しい順にソート
-            memos.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+        # ?limit=&after=<cursor> でページ単位
+        elif method == 'GET' and not memo_id:
+            # 版が変わっていなければ一覧を読まずに 304
+            version, modified = STORE.version_info()
+            etag = collection_etag('memos', version)
+            cache_headers = dict(headers, **validator_headers(etag, version, modified))
+            if is_not_modified(event, etag, modified):
+                return {
+                    'statusCode': 304,
+                    'headers': cache_headers,
+                    'body': ''
+                }
+            paging = page_params(event.get('queryStringParameters'))
+            # 作成日時の新しい順
+            if paging is None:
+                memos, _ = STORE.page(descending=True)
+                body = memos
+            else:
+                limit, after = paging
+                memos, next_cursor = STORE.page(limit, after, descending=True)
+                body = {'items': memos, 'next_cursor': next_cursor}
             return {
                 'statusCode': 200,
+                'headers': cache_headers,
+                'body': json.dumps(body, ensure_ascii=False)
+            }
+        
+        # POST /memos/bulk  {"items": [...]}
+        # 全件を検証してから 1 回の書き込みで追加する（1 件でも不正なら何も追加しない）
+        elif method == 'POST' and path_parts[-1] == 'bulk':
+            now = datetime.now().isoformat()
+            
+            def build(item):
+                title = str(item.get('title') or '').strip()
+                content = str(item.get('content') or '').strip()
+                if not title or not content:
+                    raise ValueError('タイトルと内容が必要です')
+                return {'title': title, 'content': content, 'created_at': now}
+            
+            status, body = bulk_insert(STORE, parse_bulk_body(event.get('body'), 'items'), build)
+            return {
+                'statusCode': status,
                 'headers': headers,
-                'body': json.dumps(memos, ensure_ascii=False)
+                'body': json.dumps(body, ensure_ascii=False)
+            }
+        
+        # DELETE /memos/bulk  {"ids": [...]}
+        # 1 件でも見つからなければ何も削除しない
+        elif method == 'DELETE' and path_parts[-1] == 'bulk':
+            ids = parse_bulk_body(event.get('body'), 'ids')
+            status, body = bulk_delete(STORE, ids, 'メモが見つかりません')
+            return {
+                'statusCode': status,
+                'headers': headers,
+                'body': json.dumps(body, ensure_ascii=False)
             }
         
         # POST /memos
@@ -78,18 +177,11 @@ def handler(event, context):
                     'body': json.dumps({'error': 'タイトルと内容が必要です'}, ensure_ascii=False)
                 }
             
-            memos = load_memos()
-            new_id = max([m.get('id', 0) for m in memos], default=0) + 1
-            
-            new_memo = {
-                'id': new_id,
+            new_memo = STORE.insert({
                 'title': title,
                 'content': content,
                 'created_at': datetime.now().isoformat()
-            }
-            
-            memos.append(new_memo)
-            save_memos(memos)
+            })
             
             return {
                 'statusCode': 201,
@@ -99,12 +191,7 @@ def handler(event, context):
         
         # DELETE /memos/:id
         elif method == 'DELETE' and memo_id:
-            memos = load_memos()
-            original_length = len(memos)
-            memos = [m for m in memos if m['id'] != memo_id]
-            
-            if len(memos) < original_length:
-                save_memos(memos)
+            if STORE.delete(memo_id):
                 return {
                     'statusCode': 200,
                     'headers': headers,
@@ -124,6 +211,13 @@ def handler(event, context):
                 'body': json.dumps({'error': 'リソースが見つかりません'}, ensure_ascii=False)
             }
     
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': f'不正なリクエストです: {str(e)}'}, ensure_ascii=False)
+        }
+    
     except Exception as e:
         return {
             'statusCode': 500,
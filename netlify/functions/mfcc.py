@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+MFCC / log-mel 特徴量の共通モジュール（research_api から使う）。
+
+信号全体をフレームごとに処理する:
+  プリエンファシス → ハミング窓 → 一括 rFFT（パワー）→ mel フィルタバンク（疎行列）→ log → DCT-II（直交）
+フィルタバンク・DCT 行列・窓は (sample_rate, n_fft, n_mels, ...) ごとに LRU キャッシュして使い回す。
+
+iter_mfcc はサンプルのチャンク列を受け取り、BLOCK_FRAMES フレームずつ特徴量を返す。
+作業領域はブロックの大きさで決まるので、長いファイルもメモリを一定に抑えて処理できる。
+Δ / ΔΔ（回帰幅 DELTA_WIDTH）は前後の文脈フレームだけを持ち越して計算し、全体を一度に計算した値と一致する。
+フレーム数は max(1, 1 + ceil((N - frame_len) / hop))（末尾は 0 詰め）。
+"""
+from functools import lru_cache
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:
+    np = None
+
+try:
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+# 一度に rFFT するフレーム数
+BLOCK_FRAMES = 1024
+# フィルタバンク・DCT 行列のキャッシュ数
+CACHE_SIZE = 32
+# Δ の回帰幅（前後 N フレーム）
+DELTA_WIDTH = 2
+
+PRE_EMPHASIS = 0.97
+_LOG_FLOOR = 1e-10
+
+
+def _next_pow2(n):
+    return 1 << (int(n) - 1).bit_length()
+
+
+def hz_to_mel(f):
+    return 2595.0 * np.log10(1.0 + np.asarray(f, dtype=np.float64) / 700.0)
+
+
+def mel_to_hz(m):
+    return 700.0 * (10.0 ** (np.asarray(m, dtype=np.float64) / 2595.0) - 1.0)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def mel_filterbank(sample_rate, n_fft, n_mels, fmin=0.0, fmax=None):
+    """三角 mel フィルタバンク (n_mels, n_fft // 2 + 1)。scipy があれば CSR 疎行列、なければ密行列。
+    キャッシュされた値を返すので書き換えないこと。"""
+    fmax = sample_rate / 2.0 if fmax is None else float(fmax)
+    freqs = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)
+    edges = mel_to_hz(np.linspace(hz_to_mel(fmin), hz_to_mel(fmax), n_mels + 2))
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    up = (freqs - lower) / np.maximum(center - lower, _LOG_FLOOR)
+    down = (upper - freqs) / np.maximum(upper - center, _LOG_FLOOR)
+    fb = np.maximum(0.0, np.minimum(up, down))
+    if sparse is not None:
+        return sparse.csr_matrix(fb)
+    fb.setflags(write=False)
+    return fb
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def dct_matrix(n_mels, n_mfcc):
+    """直交 DCT-II の先頭 n_mfcc 行を転置した (n_mels, n_mfcc)。log-mel @ これ で MFCC になる。"""
+    k = np.arange(n_mfcc)[None, :]
+    n = np.arange(n_mels)[:, None]
+    D = np.cos(np.pi / n_mels * (n + 0.5) * k) * np.sqrt(2.0 / n_mels)
+    D[:, 0] /= np.sqrt(2.0)
+    D.setflags(write=False)
+    return D
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _window(frame_len):
+    w = np.hamming(frame_len).astype(np.float32)
+    w.setflags(write=False)
+    return w
+
+
+def frame_params(sample_rate, frame_ms=25.0, hop_ms=10.0):
+    """(frame_len, hop, n_fft)"""
+    frame_len = max(1, int(round(sample_rate * frame_ms / 1000.0)))
+    hop = max(1, int(round(sample_rate * hop_ms / 1000.0)))
+    return frame_len, hop, _next_pow2(frame_len)
+
+
+def delta(feat, width=DELTA_WIDTH):
+    """回帰による Δ（両端は端のフレームを繰り返す）。feat は (frames, dims)。"""
+    n = len(feat)
+    if n == 0:
+        return np.zeros_like(feat)
+    padded = np.concatenate([np.repeat(feat[:1], width, axis=0), feat, np.repeat(feat[-1:], width, axis=0)])
+    out = np.zeros_like(feat)
+    for k in range(1, width + 1):
+        out += k * (padded[width + k:width + k + n] - padded[width - k:width - k + n])
+    out /= 2 * sum(k * k for k in range(1, width + 1))
+    return out
+
+
+class _Framer(object):
+    """サンプルのチャンクを受け取り、プリエンファシス済みのフレームを BLOCK_FRAMES 個ずつ返す"""
+
+    def __init__(self, frame_len, hop, coef, block_frames):
+        self.frame_len = frame_len
+        self.hop = hop
+        self.coef = coef
+        self.block_frames = block_frames
+        self.buf = np.zeros(0, dtype=np.float32)
+        self.prev = 0.0        # buf[0] の直前のサンプル（プリエンファシス用）
+        self.emitted = 0
+
+    def _emphasize(self, seg, prev, out=None):
+        pe = np.empty(len(seg), dtype=np.float32) if out is None else out
+        pe[0] = seg[0] - self.coef * prev
+        np.subtract(seg[1:], self.coef * seg[:-1], out=pe[1:])
+        return pe
+
+    def _take(self, n):
+        """buf の先頭から n フレームを取り出す"""
+        for a in range(0, n, self.block_frames):
+            b = min(a + self.block_frames, n)
+            start = a * self.hop
+            seg = self.buf[start:(b - 1) * self.hop + self.frame_len]
+            prev = self.prev if start == 0 else self.buf[start - 1]
+            yield sliding_window_view(self._emphasize(seg, prev), self.frame_len)[::self.hop]
+        cut = n * self.hop
+        if cut:
+            self.prev = float(self.buf[cut - 1])
+            self.buf = self.buf[cut:]
+        self.emitted += n
+
+    def push(self, samples):
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        self.buf = np.concatenate([self.buf, samples]) if len(self.buf) else samples
+        n = (len(self.buf) - self.frame_len) // self.hop + 1 if len(self.buf) >= self.frame_len else 0
+        return self._take(n) if n else iter(())
+
+    def flush(self):
+        """末尾の、まだどのフレームにも入っていないサンプルを 0 詰めの 1 フレームにする。
+        push の後なので残りは frame_len 未満で、そのうち先頭 frame_len - hop 個は出力済みのフレームに入っている。"""
+        covered = self.frame_len - self.hop if self.emitted else 0
+        r = len(self.buf)
+        if r <= covered:
+            return iter(())
+        frame = np.zeros((1, self.frame_len), dtype=np.float32)
+        self._emphasize(self.buf, self.prev, frame[0, :r])
+        self.buf = self.buf[:0]
+        self.emitted += 1
+        return iter((frame,))
+
+
+def _features(frames, sample_rate, n_fft, n_mels, n_mfcc, fmin, fmax, log_mel):
+    """フレーム (b, frame_len) -> MFCC (b, n_mfcc)（log_mel なら log-mel (b, n_mels)）"""
+    spec = np.fft.rfft(frames * _window(frames.shape[1]), n=n_fft, axis=1)
+    P = np.abs(spec)
+    P *= P
+    P /= n_fft
+    fb = mel_filterbank(sample_rate, n_fft, n_mels, fmin, fmax)
+    mel = np.asarray((fb @ P.T).T)
+    np.maximum(mel, _LOG_FLOOR, out=mel)
+    np.log(mel, out=mel)
+    if log_mel:
+        return mel.astype(np.float64)
+    return mel @ dct_matrix(n_mels, n_mfcc)
+
+
+def _with_deltas(blocks, order, width):
+    """基本特徴量のブロック列に Δ / ΔΔ を横に連結する。
+    前後 order·width フレームの文脈だけを持ち越すので、全体を一度に計算した delta() と同じ値になる。"""
+    ctx = order * width
+    left = None                  # 直前のブロックから持ち越した文脈（出力済み）
+    pending = None               # まだ出力していないフレーム（右側の文脈待ち）
+    for block in blocks:
+        pending = block if pending is None else np.concatenate([pending, block])
+        if len(pending) <= ctx:
+            continue
+        buf = pending if left is None else np.concatenate([left, pending])
+        out = _stack_deltas(buf, order, width)
+        lo = 0 if left is None else len(left)
+        hi = len(buf) - ctx
+        yield out[lo:hi]
+        keep = buf[max(0, hi - ctx):]
+        left, pending = keep[:len(keep) - ctx], keep[len(keep) - ctx:]
+    if pending is not None and len(pending):
+        buf = pending if left is None else np.concatenate([left, pending])
+        yield _stack_deltas(buf, order, width)[0 if left is None else len(left):]
+
+
+def _stack_deltas(feat, order, width):
+    parts = [feat]
+    for _ in range(order):
+        parts.append(delta(parts[-1], width))
+    return np.hstack(parts)
+
+
+def iter_mfcc(chunks, sample_rate, n_mfcc=13, n_mels=40, frame_ms=25.0, hop_ms=10.0, pre_emphasis=PRE_EMPHASIS,
+              fmin=0.0, fmax=None, deltas=0, log_mel=False, block_frames=BLOCK_FRAMES, delta_width=DELTA_WIDTH):
+    """サンプルのチャンク列から特徴量を (frames, dims) のブロックで順に返すジェネレータ。
+    dims は n_mfcc（log_mel なら n_mels）× (1 + deltas)。deltas は 0 / 1（Δ）/ 2（Δ と ΔΔ）。"""
+    if deltas not in (0, 1, 2):
+        raise ValueError('deltas must be 0, 1 or 2')
+    if not 0 < n_mfcc <= n_mels:
+        raise ValueError('n_mfcc must be between 1 and n_mels')
+    sample_rate = int(sample_rate)
+    frame_len, hop, n_fft = frame_params(sample_rate, frame_ms, hop_ms)
+    if hop > frame_len:
+        raise ValueError('hop_ms must not exceed frame_ms')
+    framer = _Framer(frame_len, hop, float(pre_emphasis), max(1, int(block_frames)))
+    fmax = None if fmax is None else float(fmax)
+
+    def base():
+        for chunk in chunks:
+            for frames in framer.push(chunk):
+                yield _features(frames, sample_rate, n_fft, n_mels, n_mfcc, float(fmin), fmax, log_mel)
+        for frames in framer.flush():
+            yield _features(frames, sample_rate, n_fft, n_mels, n_mfcc, float(fmin), fmax, log_mel)
+
+    if deltas:
+        return _with_deltas(base(), deltas, delta_width)
+    return base()
+
+
+def mfcc(audio_data, sample_rate, **kwargs):
+    """信号全体の特徴量 (frames, dims)。引数は iter_mfcc と同じ。"""
+    blocks = list(iter_mfcc([audio_data], sample_rate, **kwargs))
+    if not blocks:
+        n = kwargs.get('n_mels', 40) if kwargs.get('log_mel') else kwargs.get('n_mfcc', 13)
+        return np.zeros((0, n * (1 + kwargs.get('deltas', 0))))
+    return np.concatenate(blocks)
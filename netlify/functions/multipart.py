@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+multipart/form-data パーサの共通モジュール（f0_analyze / voice_convert / research_api から使う）。
+
+- parse_multipart(body, boundary): 受信済みのボディを bytes.find で走査し、ファイルパートを
+  memoryview のスライス（コピーなし）で返す。
+- parse_multipart_stream(chunks, boundary) / MultipartParser: チャンクの iterator を逐次パースする。
+  パーサが保持するのは区切り文字列長ぶんの末尾だけで、各パートの中身は 1 回だけコピーされる。
+
+どちらも戻り値は (fields, files)。fields[name] = str, files[name] = (filename, memoryview)。
+パートの終端は RFC 2046 どおり "CRLF--boundary" で判定するので、バイナリ中の CRLF はそのまま残る。
+"""
+import re
+
+# ヘッダ部の上限（これを超えるパートヘッダは不正とみなす）
+MAX_HEADER_SIZE = 16 * 1024
+
+_PARAM_RE = re.compile(r';\s*([\w*.-]+)\s*=\s*("(?:[^"\\]|\\.)*"|[^;]*)')
+
+
+def extract_boundary(content_type):
+    """Content-Type 文字列から boundary を大小文字を保持したまま取り出す。"""
+    if not content_type:
+        return None
+    for part in content_type.split(';'):
+        p = part.strip()
+        if p.lower().startswith('boundary='):
+            return p[len('boundary='):].strip().strip('"').replace('\r', '')
+    return None
+
+
+def _delimiter(boundary):
+    if isinstance(boundary, str):
+        boundary = boundary.strip().strip('"').replace('\r', '').encode('utf-8')
+    return b'\n--' + boundary
+
+
+def _parse_disposition(header_block):
+    """パートヘッダから (name, filename) を返す。filename= が name= に誤マッチしないようパラメータ単位で見る。"""
+    for line in bytes(header_block).split(b'\n'):
+        if line.lower().startswith(b'content-disposition:'):
+            disp = line.decode('utf-8', errors='ignore').rstrip('\r')
+            params = {}
+            for m in _PARAM_RE.finditer(disp):
+                value = m.group(2).strip()
+                if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+                    value = re.sub(r'\\(.)', r'\1', value[1:-1])
+                params[m.group(1).lower()] = value
+            return params.get('name'), params.get('filename')
+    return None, None
+
+
+def _add_part(fields, files, header_block, content):
+    name, filename = _parse_disposition(header_block)
+    if name is None:
+        return
+    if filename:
+        files[name] = (filename, content)
+    else:
+        fields[name] = bytes(content).decode('utf-8', errors='replace')
+
+
+def _header_end(buf, start, end=None):
+    """ヘッダ終端（空行）を探して (ヘッダ終端位置, 本文開始位置) を返す。見つからなければ (-1, -1)。"""
+    i = buf.find(b'\n\r\n', start, end)
+    j = buf.find(b'\n\n', start, end)
+    if i < 0 and j < 0:
+        return -1, -1
+    if j < 0 or (0 <= i < j):
+        return i, i + 3
+    return j, j + 2
+
+
+def parse_multipart(body_bytes, boundary):
+    """multipart/form-data をパースして fields と files を返す（ファイルは body のゼロコピー memoryview）"""
+    if not boundary or not body_bytes:
+        return {}, {}
+    delim = _delimiter(boundary)
+    mv = memoryview(body_bytes).cast('B')
+    # 先頭の区切りも "\n--boundary" で探せるよう、最初の 1 個だけは行頭一致も認める
+    if bytes(mv[:len(delim) - 1]) == delim[1:]:
+        pos = len(delim) - 1
+    else:
+        pos = body_bytes.find(delim)
+        if pos < 0:
+            return {}, {}
+        pos += len(delim)
+    fields, files = {}, {}
+    size = len(mv)
+    while pos + 2 <= size:
+        if bytes(mv[pos:pos + 2]) == b'--':
+            break
+        eol = body_bytes.find(b'\n', pos)
+        if eol < 0:
+            break
+        hdr_end, content_start = _header_end(body_bytes, eol, eol + MAX_HEADER_SIZE)
+        if hdr_end < 0:
+            break
+        nxt = body_bytes.find(delim, content_start)
+        if nxt < 0:
+            break
+        content_end = nxt - 1 if nxt > content_start and mv[nxt - 1] == 0x0D else nxt
+        _add_part(fields, files, mv[eol + 1:hdr_end], mv[content_start:content_end])
+        pos = nxt + len(delim)
+    return fields, files
+
+
+class MultipartParser(object):
+    """チャンク単位で feed() し、最後に close() で (fields, files) を受け取る逐次パーサ。
+
+    max_part_size を指定すると、それを超えるパートで ValueError を送出する。"""
+
+    _PREAMBLE, _DELIM_TAIL, _HEADERS, _BODY, _DONE = range(5)
+
+    def __init__(self, boundary, max_part_size=None):
+        self._delim = _delimiter(boundary)
+        self._max_part_size = max_part_size
+        # 先頭の区切りも "\n--boundary" として検出できるよう改行を 1 つ前置する
+        self._buf = bytearray(b'\n')
+        self._state = self._PREAMBLE
+        self._headers = None
+        self._content = None
+        self.fields = {}
+        self.files = {}
+
+    def feed(self, chunk):
+        if self._state == self._DONE or not chunk:
+            return
+        self._buf += chunk
+        self._process()
+
+    def _move_to_content(self, n):
+        """バッファ先頭 n バイトをパート本文へ移す（中間の bytes を作らない）"""
+        with memoryview(self._buf) as view:
+            self._content += view[:n]
+        del self._buf[:n]
+        if self._max_part_size is not None and len(self._content) > self._max_part_size:
+            raise ValueError('multipart part too large')
+
+    def _process(self):
+        buf, delim = self._buf, self._delim
+        while True:
+            if self._state == self._PREAMBLE:
+                i = buf.find(delim)
+                if i < 0:
+                    # 区切りの途中かもしれない末尾だけ残す
+                    if len(buf) > len(delim):
+                        del buf[:len(buf) - len(delim)]
+                    return
+                del buf[:i + len(delim)]
+                self._state = self._DELIM_TAIL
+            elif self._state == self._DELIM_TAIL:
+                if len(buf) < 2:
+                    return
+                if buf[:2] == b'--':
+                    self._state = self._DONE
+                    buf.clear()
+                    return
+                eol = buf.find(b'\n')
+                if eol < 0:
+                    return
+                del buf[:eol + 1]
+                self._state = self._HEADERS
+            elif self._state == self._HEADERS:
+                # 空行のみのヘッダ（ヘッダなしパート）にも対応するため改行を前置して探す
+                hdr_end, content_start = _header_end(b'\n' + bytes(buf[:MAX_HEADER_SIZE]), 0)
+                if hdr_end < 0:
+                    if len(buf) > MAX_HEADER_SIZE:
+                        raise ValueError('multipart header too large')
+                    return
+                self._headers = bytes(buf[:max(hdr_end - 1, 0)])
+                del buf[:content_start - 1]
+                self._content = bytearray()
+                self._state = self._BODY
+            elif self._state == self._BODY:
+                i = buf.find(delim)
+                if i < 0:
+                    keep = len(delim)
+                    if len(buf) > keep:
+                        self._move_to_content(len(buf) - keep)
+                    return
+                end = i - 1 if i > 0 and buf[i - 1] == 0x0D else i
+                self._move_to_content(end)
+                del buf[:i - end + len(delim)]
+                _add_part(self.fields, self.files, self._headers, memoryview(self._content))
+                self._headers = self._content = None
+                self._state = self._DELIM_TAIL
+            else:
+                return
+
+    def close(self):
+        """パース結果 (fields, files) を返す。終端区切りがない場合も完了済みのパートは返す。"""
+        self._buf = bytearray()
+        self._state = self._DONE
+        return self.fields, self.files
+
+
+def parse_multipart_stream(chunks, boundary, max_part_size=None):
+    """bytes チャンクの iterator（例: Flask の request.stream を分割読み）をパースして (fields, files) を返す"""
+    if not boundary:
+        return {}, {}
+    parser = MultipartParser(boundary, max_part_size)
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.close()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+F0 推定の共通モジュール（f0_analyze と research_api から使う）。
+全フレームをストライドビューで一括に切り出し、自己相関を rFFT でまとめて計算する。
+"""
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:
+    np = None
+
+# rFFT の作業領域を抑えるため、一度に処理するフレーム数の上限
+FRAME_BLOCK = 1024
+
+
+def _next_pow2(n):
+    return 1 << (int(n) - 1).bit_length()
+
+
+def frame_params(sample_rate, frame_ms=25.0, hop_ms=10.0, fmin=80.0, fmax=400.0):
+    """(frame_size, hop_size, min_period, max_period) を返す。従来の estimate_f0 と同じ定義。"""
+    frame_size = int(sample_rate * frame_ms / 1000.0)
+    hop_size = max(1, int(sample_rate * hop_ms / 1000.0))
+    min_period = max(1, int(sample_rate / fmax))
+    max_period = min(frame_size // 2, int(sample_rate / fmin))
+    return frame_size, hop_size, min_period, max_period
+
+
+def frame_signal(audio_data, frame_size, hop_size):
+    """(n_frames, frame_size) のストライドビュー（コピーなし）を返す。
+    フレーム開始位置は range(0, len - frame_size, hop_size) と同じ。"""
+    x = np.asarray(audio_data)
+    n_frames = 0
+    if len(x) > frame_size:
+        n_frames = (len(x) - frame_size - 1) // hop_size + 1
+    if n_frames <= 0:
+        return np.empty((0, frame_size), dtype=x.dtype)
+    return sliding_window_view(x, frame_size)[::hop_size][:n_frames]
+
+
+def batch_autocorr(frames, max_lag=None):
+    """各フレームの自己相関（ラグ 0..max_lag-1）を rFFT 一回でまとめて求める。
+    np.correlate(frame, frame, 'full') の後半と一致する（必要なラグまで循環しない長さでゼロ詰め）。"""
+    frames = np.asarray(frames, dtype=np.float64)
+    frame_size = frames.shape[-1]
+    if max_lag is None:
+        max_lag = frame_size
+    n_fft = _next_pow2(frame_size + max_lag - 1)
+    spec = np.fft.rfft(frames, n=n_fft, axis=-1)
+    spec *= spec.conj()
+    return np.fft.irfft(spec, n=n_fft, axis=-1)[..., :max_lag]
+
+
+def estimate_f0_batch(audio_data, sample_rate, frame_ms=25.0, hop_ms=10.0, fmin=80.0, fmax=400.0):
+    """F0推定（自己相関・一括 rFFT 版）。戻り値は従来どおりフレームごとの f0_values（list, Hz）。"""
+    frame_size, hop_size, min_period, max_period = frame_params(sample_rate, frame_ms, hop_ms, fmin, fmax)
+    frames = frame_signal(audio_data, frame_size, hop_size)
+    n_frames = len(frames)
+    if n_frames == 0:
+        return []
+    if max_period <= min_period:
+        return [0] * n_frames
+    f0 = np.empty(n_frames, dtype=np.float64)
+    for start in range(0, n_frames, FRAME_BLOCK):
+        block = frames[start:start + FRAME_BLOCK]
+        ac = batch_autocorr(block, max_period)
+        peak_idx = np.argmax(ac[:, min_period:max_period], axis=1) + min_period
+        f0[start:start + len(block)] = sample_rate / peak_idx
+    return f0.tolist()
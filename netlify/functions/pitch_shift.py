@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+長さを保ったピッチシフトの共通モジュール（voice_convert と research_api から使う）。
+
+比 r = 2^(semitones/12) で時間伸縮してから、帯域制限した窓付き sinc で r 倍速に読み直す（長さは元のまま）。
+時間伸縮は 2 通り:
+  'wsola'   時間領域の WSOLA。合成ホップ N/2・Hann 窓で、各フレームの位置を ±Δ の範囲でずらし、
+            直前のフレームの自然な続きとの相互相関が最大になる位置を選ぶ。相互相関は FRAME_BLOCK フレームずつ
+            一括 rFFT で求め（名目位置の続きを参照にしたラグごとの値）、ずれの選択だけをフレーム順に回す。
+  'vocoder' STFT の位相ボコーダ。合成ホップ N/4 で、瞬時周波数から出力位相を累積する（フレーム方向の cumsum）。
+どちらもフレームはブロックごとに処理し、オーバーラップ加算の末尾・位相・ずれを次のブロックへ持ち越すので、
+全体を一度に処理した結果と同じになり、作業領域はブロックの大きさで決まる。
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from blockproc import FRAME_BLOCK, OverlapAdd, hann, segment
+
+MODES = ('wsola', 'vocoder')
+MAX_SEMITONES = 24.0
+# WSOLA のフレーム長と位置のずれの許容幅
+WSOLA_FRAME_MS = 30.0
+WSOLA_TOLERANCE_MS = 8.0
+# 位相ボコーダのフレーム長（2 のべき乗に切り上げる）
+VOCODER_FRAME_MS = 46.0
+# 読み直しの sinc の片側タップ数と、一度に計算する出力サンプル数
+RESAMPLE_HALF_TAPS = 16
+RESAMPLE_BLOCK = 8192
+# sinc カーネルの表の段数（小数部の分解能）
+RESAMPLE_PHASES = 256
+_CUTOFF = 0.97
+
+
+def semitone_ratio(semitones):
+    return 2.0 ** (float(semitones) / 12.0)
+
+
+def shift_semitones(form, strength=0.5):
+    """フォームの semitones。なければ従来の strength（0〜1）から、比 1 + (strength - 0.5)·0.2 に当たる半音数"""
+    if form.get('semitones') not in (None, ''):
+        return float(form['semitones'])
+    return 12.0 * np.log2(1.0 + (float(strength) - 0.5) * 0.2)
+
+
+def _wsola(x, alpha, frame_len, tolerance, block):
+    """WSOLA で alpha 倍に伸ばした信号を先頭から返すジェネレータ（出力の 0 番目は時刻 -frame_len/2）"""
+    N, hop, D = frame_len, frame_len // 2, tolerance
+    Ha = hop / alpha
+    window = hann(N)
+    ola = OverlapAdd(N, hop)
+    n_fft = 1 << (N + 4 * D - 1).bit_length()
+    n_frames = int(np.ceil((len(x) * alpha + N) / hop)) + 2
+    delta = 0
+    for k0 in range(0, n_frames, block):
+        k = np.arange(k0, min(k0 + block, n_frames))
+        a = np.rint(k * Ha).astype(np.int64) - N // 2
+        prev = np.rint((k - 1) * Ha).astype(np.int64) - N // 2 + hop
+        lo = int(min(a[0] - 2 * D, prev[0]))
+        seg = segment(x, lo, int(max(a[-1] + 2 * D, prev[-1])) + N + 1)
+        # 参照（直前のフレームの名目位置の続き）と候補範囲のラグごとの相互相関を一括で
+        ref = seg[(prev - lo)[:, None] + np.arange(N)]
+        region = seg[(a - 2 * D - lo)[:, None] + np.arange(N + 4 * D)]
+        corr = np.fft.irfft(np.fft.rfft(region, n=n_fft, axis=1) * np.fft.rfft(ref, n=n_fft, axis=1).conj(),
+                            n=n_fft, axis=1)[:, :4 * D + 1]
+        # 実際の参照は直前のずれの分だけ動いているので、ラグ l の値を使ってずれを delta + l にする
+        shifts = np.empty(len(k), dtype=np.int64)
+        for j in range(len(k)):
+            if k[j] == 0:
+                delta = 0
+            else:
+                s = D - delta
+                delta += int(np.argmax(corr[j, s:s + 2 * D + 1])) + s - 2 * D
+            shifts[j] = delta
+        grains = seg[(a + shifts - lo)[:, None] + np.arange(N)]
+        grains *= window
+        yield ola.push(grains)
+    yield ola.tail
+
+
+def _vocoder(x, alpha, n_fft, block):
+    """位相ボコーダで alpha 倍に伸ばした信号を先頭から返すジェネレータ（出力の 0 番目は時刻 -n_fft/2）"""
+    N, hop = n_fft, n_fft // 4
+    Ha = hop / alpha
+    window = hann(N)
+    # Hann 窓を分析・合成の両方にかけたときの、ホップ N/4 での重なりの和
+    norm = 1.0 / np.sum(window[::hop] ** 2)
+    omega = 2.0 * np.pi * np.arange(N // 2 + 1) / N
+    ola = OverlapAdd(N, hop)
+    n_frames = int(np.ceil((len(x) * alpha + N) / hop)) + 4
+    prev_phase, prev_pos, out_phase = None, 0, None
+    for k0 in range(0, n_frames, block):
+        k = np.arange(k0, min(k0 + block, n_frames))
+        a = np.rint(k * Ha).astype(np.int64) - N // 2
+        seg = segment(x, int(a[0]), int(a[-1]) + N)
+        frames = seg[(a - a[0])[:, None] + np.arange(N)]
+        frames *= window
+        spec = np.fft.rfft(frames, axis=1)
+        mag = np.abs(spec)
+        phase = np.angle(spec)
+        first = prev_phase is None
+        if first:
+            prev_phase, prev_pos, out_phase = phase[0], int(a[0]), phase[0]
+        dp = np.diff(a, prepend=prev_pos).astype(np.float64)
+        dp[dp == 0] = 1.0
+        dphi = phase - np.vstack([prev_phase[None, :], phase[:-1]])
+        dphi -= omega * dp[:, None]
+        dphi = np.mod(dphi + np.pi, 2.0 * np.pi) - np.pi
+        inc = omega + dphi / dp[:, None]
+        inc *= hop
+        if first:
+            # 最初のフレームは入力の位相をそのまま使う
+            inc[0] = 0.0
+        acc = np.cumsum(inc, axis=0)
+        acc += out_phase
+        prev_phase, prev_pos, out_phase = phase[-1], int(a[-1]), np.mod(acc[-1], 2.0 * np.pi)
+        y = np.fft.irfft(mag * np.exp(1j * acc), n=N, axis=1)
+        y *= window * norm
+        yield ola.push(y)
+    yield ola.tail
+
+
+class _Resampler(object):
+    """伸縮した信号 s を時刻 t_m = offset + m·step で読み直す（窓付き sinc、s はチャンクで受け取る）。
+    カーネルは小数部を RESAMPLE_PHASES 段に分けた表にしておき、隣り合う段を線形補間して使う。"""
+
+    def __init__(self, step, offset, n_out, half_taps=RESAMPLE_HALF_TAPS):
+        self.step = float(step)
+        self.offset = float(offset)
+        self.n_out = n_out
+        self.H = half_taps
+        self.buf = np.zeros(0)
+        self.buf_start = 0
+        self.m = 0
+        self.taps = np.arange(-half_taps + 1, half_taps + 1)
+        fc = _CUTOFF * min(1.0, 1.0 / self.step)
+        u = np.arange(RESAMPLE_PHASES + 1)[:, None] / RESAMPLE_PHASES - self.taps
+        w = 0.42 + 0.5 * np.cos(np.pi * u / self.H) + 0.08 * np.cos(2.0 * np.pi * u / self.H)
+        w[np.abs(u) >= self.H] = 0.0
+        table = fc * np.sinc(fc * u) * w
+        # 段ごとに和を 1 にする（直流を保つ）
+        table /= np.sum(table, axis=1, keepdims=True)
+        self.table = table
+        self.slope = np.diff(table, axis=0)
+
+    def push(self, chunk):
+        self.buf = np.concatenate([self.buf, chunk]) if len(self.buf) else np.asarray(chunk, dtype=np.float64)
+        return self._drain(final=False)
+
+    def finish(self):
+        self.buf = np.concatenate([self.buf, np.zeros(2 * self.H + 1)])
+        return self._drain(final=True)
+
+    def _drain(self, final):
+        end = self.buf_start + len(self.buf)
+        # floor(t) + H < end のものまで計算できる
+        last = int(np.floor((end - 1 - self.H - self.offset) / self.step))
+        if final:
+            last = self.n_out - 1
+        last = min(last, self.n_out - 1)
+        outs = []
+        while self.m <= last:
+            m1 = min(self.m + RESAMPLE_BLOCK, last + 1)
+            t = self.offset + np.arange(self.m, m1) * self.step
+            base = np.floor(t).astype(np.int64)
+            idx = (base - self.buf_start)[:, None] + self.taps
+            np.clip(idx, 0, len(self.buf) - 1, out=idx)
+            frac = (t - base) * RESAMPLE_PHASES
+            p = frac.astype(np.intp)
+            frac -= p
+            h = self.slope[p]
+            h *= frac[:, None]
+            h += self.table[p]
+            y = np.einsum('ij,ij->i', self.buf[idx], h)
+            outs.append(y)
+            self.m = m1
+        keep = min(int(np.floor(self.offset + self.m * self.step)) - self.H + 1 - self.buf_start, len(self.buf))
+        if keep > 0:
+            self.buf = self.buf[keep:]
+            self.buf_start += keep
+        return outs
+
+
+def iter_shift(audio_data, sample_rate, semitones, mode='wsola', block_frames=FRAME_BLOCK):
+    """ピッチを semitones 半音ずらした波形を、元と同じ長さになるまでブロックで返すジェネレータ"""
+    if mode not in MODES:
+        raise ValueError('mode must be one of: %s' % ', '.join(MODES))
+    semitones = float(semitones)
+    if not abs(semitones) <= MAX_SEMITONES:
+        raise ValueError('semitones must be within +-%g' % MAX_SEMITONES)
+    x = np.asarray(audio_data)
+    return _shift_blocks(x, int(sample_rate), semitone_ratio(semitones), mode, max(1, int(block_frames)))
+
+
+def _shift_blocks(x, sample_rate, alpha, mode, block):
+    if len(x) == 0:
+        return
+    if alpha == 1.0:
+        yield np.asarray(x, dtype=np.float64)
+        return
+    if mode == 'wsola':
+        N = 2 * max(8, int(round(sample_rate * WSOLA_FRAME_MS / 2000.0)))
+        D = max(1, int(round(sample_rate * WSOLA_TOLERANCE_MS / 1000.0)))
+        stretched = _wsola(x, alpha, N, D, block)
+    else:
+        N = 1 << (max(64, int(sample_rate * VOCODER_FRAME_MS / 1000.0)) - 1).bit_length()
+        stretched = _vocoder(x, alpha, N, block)
+    resampler = _Resampler(alpha, N // 2, len(x))
+    for chunk in stretched:
+        for y in resampler.push(chunk):
+            yield y
+        if resampler.m >= len(x):
+            return
+    for y in resampler.finish():
+        yield y
+
+
+def shift(audio_data, sample_rate, semitones, mode='wsola', block_frames=FRAME_BLOCK):
+    """ピッチを semitones 半音ずらした波形（元と同じ長さの float32）"""
+    x = np.asarray(audio_data)
+    out = np.empty(len(x), dtype=np.float32)
+    pos = 0
+    for y in iter_shift(x, sample_rate, semitones, mode, block_frames):
+        out[pos:pos + len(y)] = y
+        pos += len(y)
+    return out
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+決定的な合成結果のキャッシュ（formant_synthesize・research_api から使う。speaker_stats も話者統計の保存に使う）。
+
+リクエストのパラメータを正規化（150 と 150.0 は同じ値、dict はキー順、既定値は呼び出し側で埋める）した JSON の
+SHA-256 をキーにする。同じパラメータなら同じ波形になるので、キーからそのまま強い ETag を作れる:
+If-None-Match が一致すれば合成もキャッシュの参照もせずに 304 を返す。
+本体はプロセス内の LRU（合計 MEMORY_MAX_BYTES まで）と、/tmp 以下のファイル（合計 DISK_MAX_BYTES まで、
+古い順に消す）の 2 段で持つ。ディスク側は同じインスタンスの別プロセス・再起動後にも効く。
+合成の実装を変えたら RENDER_VERSION を上げて古いエントリを無効にする。
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+RENDER_VERSION = 1
+MEMORY_MAX_BYTES = 32 * 1024 * 1024
+DISK_MAX_BYTES = 256 * 1024 * 1024
+# RENDER_CACHE_DIR を空にするとディスク側を使わない
+DISK_DIR = os.environ.get('RENDER_CACHE_DIR', str(Path('/tmp') / 'render_cache'))
+
+# 条件付きリクエスト用に許可・公開するヘッダ（CORS）
+ALLOW_HEADERS = 'Content-Type, If-None-Match'
+EXPOSE_HEADERS = 'ETag, X-Render-Cache'
+
+
+def normalize(value):
+    """キーに使う正規形（整数値の数は int・それ以外は float、列は list、dict は再帰的に正規化）。150 と 150.0 は同じキーになる。"""
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, int):
+        return int(value)
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else value
+    if isinstance(value, dict):
+        return {str(k): normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    if hasattr(value, 'tolist'):
+        return normalize(value.tolist())
+    raise TypeError('unsupported parameter type: %s' % type(value).__name__)
+
+
+def render_key(kind, params):
+    """(種類, 正規化したパラメータ) の SHA-256（16 進）"""
+    text = json.dumps([RENDER_VERSION, kind, normalize(params)], sort_keys=True, separators=(',', ':'),
+                      ensure_ascii=False, allow_nan=False)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def render_etag(key):
+    return '"%s"' % key
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match のいずれかが etag と一致するか（If-None-Match は弱い比較）"""
+    if not if_none_match:
+        return False
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*' or (tag[2:] if tag.startswith('W/') else tag) == opaque:
+            return True
+    return False
+
+
+class RenderCache(object):
+    """キー -> bytes の 2 段キャッシュ。スレッドセーフ。"""
+
+    def __init__(self, memory_bytes=MEMORY_MAX_BYTES, disk_dir=DISK_DIR, disk_bytes=DISK_MAX_BYTES):
+        self.memory_bytes = int(memory_bytes)
+        self.disk_bytes = int(disk_bytes)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        if self.disk_dir is not None:
+            try:
+                self.disk_dir.mkdir(parents=True, exist_ok=True)
+            except OSError:
+                self.disk_dir = None
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                return data
+        data = self._read_disk(key)
+        if data is not None:
+            self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        data = bytes(data)
+        self._remember(key, data)
+        self._write_disk(key, data)
+
+    def get_or_render(self, key, render):
+        """(bytes, hit)。キャッシュになければ render() の戻り値（bytes）を入れて返す。"""
+        data = self.get(key)
+        if data is not None:
+            return data, True
+        data = bytes(render())
+        self.put(key, data)
+        return data, False
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        if self.disk_dir is not None:
+            for path in self.disk_dir.glob('*.bin'):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def _remember(self, key, data):
+        if len(data) > self.memory_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.memory_bytes:
+                _, dropped = self._entries.popitem(last=False)
+                self._size -= len(dropped)
+
+    def _path(self, key):
+        return self.disk_dir / ('%s.bin' % key)
+
+    def _read_disk(self, key):
+        if self.disk_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # 使った順に消すため、読んだら更新時刻を進める
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def _write_disk(self, key, data):
+        if self.disk_dir is None or len(data) > self.disk_bytes:
+            return
+        path = self._path(key)
+        tmp = '%s.tmp.%d.%d' % (path, os.getpid(), threading.get_ident())
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self._trim_disk()
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    def _trim_disk(self):
+        """合計が disk_bytes を超えていれば、更新時刻の古いファイルから消す"""
+        files = []
+        total = 0
+        for entry in os.scandir(self.disk_dir):
+            if not entry.name.endswith('.bin'):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+        if total <= self.disk_bytes:
+            return
+        files.sort()
+        for _, size, path in files:
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.disk_bytes:
+                break
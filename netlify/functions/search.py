@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+メモ検索用の転置インデックス（memos から使う）。
+
+日本語は単語区切りがないので、NFKC 正規化・小文字化した文字列の連続部分を文字 bigram に分けて索引する
+（1 文字だけの連続部分は unigram）。クエリも同じように分け、すべての gram を含む文書を BM25 で順位付けする。
+1 文字のクエリは、その文字を含む gram の和集合で探す。
+
+ポスティングは gram ごとの array('i')（文書 id）と array('H')（フィールド重み付き出現数）で持ち、
+検索時は np.frombuffer でコピーせずに numpy 配列として積集合・スコア計算を行う。
+削除は墓標（削除済み id の集合）で即時に反映し、一定数たまったらポスティングから取り除く。
+更新（同じ id の put）は古い版の gram のポスティングからだけその文書を取り除く。
+
+store の購読インタフェース（clear / put / delete）を実装しているので、
+store.subscribe(index) すればログの再生・追記に合わせて自動で更新される。
+"""
+import re
+import unicodedata
+from array import array
+
+# 索引の掃除と検索に必須（memos はこのモジュールを読み込む時点で numpy を要する）
+import numpy as np
+
+# BM25 のパラメータ
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 墓標がこの数以上、かつ文書数 × PURGE_RATIO 以上になったらポスティングから取り除く
+PURGE_MIN = 1000
+PURGE_RATIO = 0.2
+
+_RUN_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+
+def tokenize(text):
+    """文字列を gram のリストにする（連続部分ごとに bigram、1 文字なら unigram）"""
+    grams = []
+    for run in _RUN_RE.findall(normalize(text)):
+        if len(run) == 1:
+            grams.append(run)
+        else:
+            grams.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return grams
+
+
+class InvertedIndex(object):
+    """n-gram 転置インデックス。fields は {フィールド名: 重み}。"""
+
+    def __init__(self, fields):
+        self.fields = dict(fields)
+        self.clear()
+
+    # ---- store の購読インタフェース ----
+
+    def clear(self):
+        self._ids = {}        # gram -> array('i') 文書 id（追加順）
+        self._tfs = {}        # gram -> array('H') 重み付き出現数
+        self._unsorted = set()
+        self._by_char = {}    # 文字 -> その文字を含む gram の集合（1 文字クエリ用）
+        self._doc_len = array('f')
+        self._deleted = set()
+        self._n_docs = 0
+        self._total_len = 0.0
+
+    def put(self, record, old=None):
+        if old is not None:
+            self._drop(old)
+        doc_id = record['id']
+        counts = self._counts(record)
+        if doc_id in self._deleted:
+            # 墓標の残っている id の再登録（古い版が分からない）: 古いポスティングを先に掃除する
+            self._purge()
+        length = float(sum(counts.values()))
+        if len(self._doc_len) <= doc_id:
+            self._doc_len.extend([0.0] * (doc_id + 1 - len(self._doc_len)))
+        self._doc_len[doc_id] = length
+        self._n_docs += 1
+        self._total_len += length
+        for g, tf in counts.items():
+            ids = self._ids.get(g)
+            if ids is None:
+                ids = self._ids[g] = array('i')
+                self._tfs[g] = array('H')
+                for ch in set(g):
+                    self._by_char.setdefault(ch, set()).add(g)
+            elif ids[-1] > doc_id:
+                self._unsorted.add(g)
+            ids.append(doc_id)
+            self._tfs[g].append(min(int(tf), 65535))
+
+    def delete(self, old):
+        doc_id = old['id']
+        if doc_id >= len(self._doc_len) or doc_id in self._deleted:
+            return
+        self._deleted.add(doc_id)
+        self._n_docs -= 1
+        self._total_len -= self._doc_len[doc_id]
+        self._doc_len[doc_id] = 0.0
+        if len(self._deleted) >= PURGE_MIN and len(self._deleted) >= self._n_docs * PURGE_RATIO:
+            self._purge()
+
+    # ---- 内部処理 ----
+
+    def _counts(self, record):
+        """gram -> フィールド重み付き出現数"""
+        counts = {}
+        for field, weight in self.fields.items():
+            for g in tokenize(record.get(field)):
+                counts[g] = counts.get(g, 0) + weight
+        return counts
+
+    def _drop(self, old):
+        """古い版 old の gram のポスティングからだけ文書を取り除く（更新用。全体の掃除はしない）"""
+        doc_id = old['id']
+        if doc_id >= len(self._doc_len) or doc_id in self._deleted:
+            return
+        for g in self._counts(old):
+            ids = self._ids.get(g)
+            if ids is None:
+                continue
+            hit = np.flatnonzero(np.frombuffer(ids, dtype=np.int32) == doc_id)
+            if not len(hit):
+                continue
+            if len(hit) == len(ids):
+                del self._ids[g], self._tfs[g]
+                self._unsorted.discard(g)
+                for ch in set(g):
+                    self._by_char[ch].discard(g)
+                continue
+            for i in hit[::-1]:
+                del ids[i], self._tfs[g][i]
+        self._n_docs -= 1
+        self._total_len -= self._doc_len[doc_id]
+        self._doc_len[doc_id] = 0.0
+
+    def _purge(self):
+        """墓標の文書をポスティングから取り除く"""
+        if not self._deleted:
+            return
+        dead = np.fromiter(self._deleted, dtype=np.int32, count=len(self._deleted))
+        for g in list(self._ids):
+            ids = np.frombuffer(self._ids[g], dtype=np.int32)
+            keep = ~np.isin(ids, dead)
+            if keep.all():
+                continue
+            if not keep.any():
+                del self._ids[g], self._tfs[g]
+                self._unsorted.discard(g)
+                for ch in set(g):
+                    self._by_char[ch].discard(g)
+                continue
+            tfs = np.frombuffer(self._tfs[g], dtype=np.uint16)
+            self._ids[g] = array('i', ids[keep].tobytes())
+            self._tfs[g] = array('H', tfs[keep].tobytes())
+        self._deleted.clear()
+
+    def _posting(self, g):
+        """gram のポスティングを (ids, tfs) の numpy ビューで返す（id 昇順、コピーなし）"""
+        if g in self._unsorted:
+            ids = np.frombuffer(self._ids[g], dtype=np.int32)
+            order = np.argsort(ids, kind='stable')
+            self._ids[g] = array('i', ids[order].tobytes())
+            self._tfs[g] = array('H', np.frombuffer(self._tfs[g], dtype=np.uint16)[order].tobytes())
+            self._unsorted.discard(g)
+        return np.frombuffer(self._ids[g], dtype=np.int32), np.frombuffer(self._tfs[g], dtype=np.uint16)
+
+    def _char_posting(self, ch):
+        """1 文字クエリ: その文字を含む全 gram の和集合（出現数は合算）"""
+        grams = self._by_char.get(ch)
+        if not grams:
+            return None
+        parts = [self._posting(g) for g in grams]
+        ids = np.concatenate([p[0] for p in parts])
+        tfs = np.concatenate([p[1] for p in parts])
+        uniq, inverse = np.unique(ids, return_inverse=True)
+        return uniq.astype(np.int32), np.bincount(inverse, weights=tfs)
+
+    def __len__(self):
+        return self._n_docs
+
+    def search(self, query, limit=20):
+        """(doc_id, score) のリストをスコア降順で返す"""
+        hits, _ = self.search_with_total(query, limit)
+        return hits
+
+    def search_with_total(self, query, limit=20):
+        """([(doc_id, score), ...], ヒット総数) を返す。limit=None なら全件。"""
+        terms = {}
+        for g in tokenize(query):
+            terms[g] = terms.get(g, 0) + 1
+        if not terms or self._n_docs <= 0:
+            return [], 0
+        postings = []
+        for g, qtf in terms.items():
+            p = self._char_posting(g) if len(g) == 1 else (self._posting(g) if g in self._ids else None)
+            if p is None or len(p[0]) == 0:
+                return [], 0
+            postings.append((p[0], p[1], qtf))
+        # 短いポスティングから順に積集合を取り、各ポスティング内の位置も一緒に絞り込む
+        postings.sort(key=lambda p: len(p[0]))
+        doc_len = np.frombuffer(self._doc_len, dtype=np.float32)
+        cand = postings[0][0]
+        # 削除済み（墓標）の文書は長さ 0 にしてある
+        alive = doc_len[cand] > 0
+        cand = cand[alive]
+        positions = [np.flatnonzero(alive)]
+        for ids, _, _ in postings[1:]:
+            if len(cand) == 0:
+                break
+            pos = np.minimum(np.searchsorted(ids, cand), len(ids) - 1)
+            hit = ids[pos] == cand
+            cand = cand[hit]
+            positions = [p[hit] for p in positions]
+            positions.append(pos[hit])
+        total = len(cand)
+        if total == 0:
+            return [], 0
+        avgdl = self._total_len / self._n_docs if self._n_docs else 1.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len[cand] / max(avgdl, 1e-9))
+        scores = np.zeros(total, dtype=np.float32)
+        for (ids, tfs, qtf), pos in zip(postings, positions):
+            tf = tfs[pos].astype(np.float32)
+            # 墓標の文書（長さ 0）はまだポスティングに残っているので数えない
+            df = np.count_nonzero(doc_len[ids] > 0)
+            idf = np.log(1.0 + (self._n_docs - df + 0.5) / (df + 0.5))
+            scores += qtf * idf * tf * (BM25_K1 + 1) / (tf + norm)
+        if limit is not None and total > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(total)
+        top = top[np.lexsort((cand[top], -scores[top]))]
+        return [(int(cand[i]), float(scores[i])) for i in top], total
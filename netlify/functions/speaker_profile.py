@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+多話者変換の話者プロファイル（research_api の /api/stargan/convert から使う）。
+
+プロファイルは PROFILE_DIR/<名前>.json:
+  {"f0_mean": 210.0, "warp": [[500, 560], [1500, 1700], [3000, 3350]], "tilt_db": 0.5}
+  f0_mean  目標の F0 の代表値（Hz, 有声フレームの幾何平均）
+  warp     周波数伸縮カーブ。[入力 Hz, 出力 Hz] の点列（どちらも単調増加、(0, 0) は暗黙）。
+           最後の点より上は最後の点の比で伸ばす。省略時は伸縮なし
+  tilt_db  スペクトル傾斜（dB / オクターブ, TILT_REF_HZ で 0 dB）
+読み込んだプロファイルは (パス, 更新時刻) ごとにプロセス内でキャッシュし、
+(サンプリング周波数, ビン数, F0 比) ごとの包絡の表（cepstral_vc.bin_table）に前もって展開してキャッシュする。
+
+変換（convert）は、ソースの F0 の代表値とケプストラム分析を 1 回だけ求め、話者ごとに
+  包絡の表で合成（cepstral_vc.convert_many）→ F0 比 r だけピッチシフト（pitch_shift）
+を繰り返す。ピッチシフトは包絡も r 倍に動かすので、表はその分を先に戻した位置（r 倍の周波数の包絡）を読む。
+"""
+import json
+import os
+import re
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from cepstral_vc import FRAME_MS, bin_table, convert_many, frame_length
+from pitch import estimate_f0_batch
+from pitch_shift import shift as pitch_shift
+
+PROFILE_DIR = os.environ.get('STARGAN_PROFILE_DIR',
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), 'speaker_profiles'))
+# 1 リクエストで変換できる話者数
+MAX_SPEAKERS = 8
+# F0 比の上限（半音）。推定を外したときに極端なシフトをしないため
+MAX_F0_SEMITONES = 12.0
+TILT_REF_HZ = 1000.0
+# これより低い周波数には傾斜をかけない
+TILT_MIN_HZ = 100.0
+CACHE_SIZE = 64
+_NAME = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class SpeakerProfile(object):
+    """話者プロファイル。値の検査は作るときに行う（不正なら ValueError）。"""
+
+    def __init__(self, name, f0_mean, warp=None, tilt_db=0.0):
+        self.name = str(name)
+        self.f0_mean = float(f0_mean)
+        if not 40.0 <= self.f0_mean <= 1000.0:
+            raise ValueError('%s: f0_mean must be between 40 and 1000 Hz' % self.name)
+        points = np.asarray(warp if warp else [], dtype=np.float64).reshape(-1, 2)
+        points = points[points[:, 0] > 0] if len(points) else points
+        if len(points) and (np.any(np.diff(points, axis=0) <= 0) or np.any(points <= 0)):
+            raise ValueError('%s: warp points must be positive and increasing' % self.name)
+        self.warp_in = np.concatenate([[0.0], points[:, 0]])
+        self.warp_out = np.concatenate([[0.0], points[:, 1]])
+        self.tilt_db = float(tilt_db)
+
+    @classmethod
+    def from_dict(cls, name, data):
+        try:
+            return cls(name, data['f0_mean'], data.get('warp'), data.get('tilt_db', 0.0))
+        except (KeyError, TypeError) as e:
+            raise ValueError('%s: invalid profile (%s)' % (name, e))
+
+    def source_hz(self, hz):
+        """出力の周波数 hz に来る入力の周波数（伸縮カーブの逆）"""
+        hz = np.asarray(hz, dtype=np.float64)
+        if len(self.warp_in) < 2:
+            return hz.copy()
+        src = np.interp(hz, self.warp_out, self.warp_in)
+        top = hz > self.warp_out[-1]
+        src[top] = hz[top] * (self.warp_in[-1] / self.warp_out[-1])
+        return src
+
+    def log_gain(self, hz):
+        """スペクトル傾斜の対数ゲイン（自然対数）"""
+        octaves = np.log2(np.maximum(hz, TILT_MIN_HZ) / TILT_REF_HZ)
+        return self.tilt_db * octaves * (np.log(10.0) / 20.0)
+
+    def table(self, sample_rate, n_bins, semitones=0.0):
+        """semitones だけピッチシフトする前提の包絡の表（キャッシュ）"""
+        return _table(self, int(sample_rate), int(n_bins), round(float(semitones), 2))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _table(profile, sample_rate, n_bins, semitones):
+    df = sample_rate / (2.0 * (n_bins - 1))
+    # ピッチシフト後に周波数 f になる成分は、シフト前は f / r にある
+    hz = np.arange(n_bins) * df * 2.0 ** (semitones / 12.0)
+    return bin_table(profile.source_hz(hz) / df, profile.log_gain(hz))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _read_profile(path, mtime):
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return SpeakerProfile.from_dict(os.path.splitext(os.path.basename(path))[0], data)
+
+
+def load_profile(name, profile_dir=None):
+    """名前のプロファイル（ファイルが更新されるまでキャッシュを返す）。なければ ValueError。"""
+    name = str(name)
+    if not _NAME.match(name):
+        raise ValueError('invalid speaker name: %s' % name)
+    path = os.path.join(profile_dir or PROFILE_DIR, name + '.json')
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        raise ValueError('unknown speaker: %s' % name)
+    try:
+        return _read_profile(path, mtime)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError('%s: cannot read profile (%s)' % (name, e))
+
+
+def list_profiles(profile_dir=None):
+    try:
+        names = os.listdir(profile_dir or PROFILE_DIR)
+    except OSError:
+        return []
+    return sorted(n[:-5] for n in names if n.endswith('.json') and _NAME.match(n[:-5]))
+
+
+def speaker_names(form, default='speaker1'):
+    """フォームの target_speakers（カンマ区切り・JSON の配列）か target_speaker。重複は除く。"""
+    raw = form.get('target_speakers')
+    if raw in (None, ''):
+        names = [form.get('target_speaker') or default]
+    elif raw.lstrip().startswith('['):
+        try:
+            names = json.loads(raw)
+        except ValueError:
+            raise ValueError('target_speakers must be a JSON array or a comma-separated list')
+        if not isinstance(names, list):
+            raise ValueError('target_speakers must be a JSON array or a comma-separated list')
+    else:
+        names = raw.split(',')
+    names = list(dict.fromkeys(str(n).strip() for n in names if str(n).strip()))
+    if not names:
+        raise ValueError('target_speakers is empty')
+    if len(names) > MAX_SPEAKERS:
+        raise ValueError('at most %d target speakers' % MAX_SPEAKERS)
+    return names
+
+
+def f0_mean(audio_data, sample_rate):
+    """フレームごとの F0 の幾何平均（Hz）。フレームがなければ 0"""
+    f0 = np.asarray(estimate_f0_batch(audio_data, sample_rate), dtype=np.float64)
+    f0 = f0[f0 > 0]
+    return float(np.exp(np.mean(np.log(f0)))) if len(f0) else 0.0
+
+
+def convert(audio_data, sample_rate, profiles, mode='wsola'):
+    """
+    プロファイルごとの変換結果 [(波形, 半音数)]。
+    ソースの F0 と包絡の分析は 1 回だけで、話者ごとに繰り返すのは合成とピッチシフトだけ。
+    """
+    source_f0 = f0_mean(audio_data, sample_rate)
+    semitones = []
+    for p in profiles:
+        s = 12.0 * np.log2(p.f0_mean / source_f0) if source_f0 > 0 else 0.0
+        semitones.append(round(float(np.clip(s, -MAX_F0_SEMITONES, MAX_F0_SEMITONES)), 2))
+    n_bins = frame_length(sample_rate, FRAME_MS) // 2 + 1
+    tables = [p.table(sample_rate, n_bins, s) for p, s in zip(profiles, semitones)]
+    converted = convert_many(audio_data, sample_rate, tables)
+    out = []
+    for y, s in zip(converted, semitones):
+        out.append((pitch_shift(y, sample_rate, s, mode) if s else y, s))
+    return out
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+話者統計（F0 の分布・平均スペクトル包絡）の抽出とキャッシュ（research_api の /api/autovc/* から使う）。
+
+統計は WAV ファイルの内容の SHA-256（STATS_VERSION 込み）を ID にして、render_cache.RenderCache と同じ 2 段
+（プロセス内の LRU と SPEAKER_STATS_DIR 以下のファイル、古い順に消す）に JSON で持つ。
+同じ目標話者のファイルを何度送っても、デコードと分析は最初の 1 回だけで、以降は ID（target_id）だけでも変換できる。
+
+統計:
+  f0_mean / f0_std        フレームごとの F0 の幾何平均（Hz）と、対数 F0 の標準偏差（半音）
+  f0_p05 / f0_p50 / f0_p95  F0 の分位点（Hz）
+  envelope                フレームのパワーで重み付けした対数包絡（cepstral_vc.envelope）の平均。
+                          0〜Nyquist を ENVELOPE_POINTS 点に等分した周波数での値
+変換（convert）はソースの統計を同じ方法で求め、フレームごとの包絡に (目標の平均包絡 - ソースの平均包絡) を足し、
+F0 を幾何平均の比だけピッチシフトする（speaker_profile と同じく、シフトで動く分を包絡の表で先に戻す）。
+"""
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from blockproc import iter_stft
+from cepstral_vc import FRAME_MS, bin_table, convert_many, envelope, frame_length, n_cepstra
+from pitch import estimate_f0_batch
+from pitch_shift import shift as pitch_shift
+from render_cache import RenderCache
+
+# 抽出の実装を変えたら上げる（ID が変わり、古い統計は使われなくなる）
+STATS_VERSION = 1
+ENVELOPE_POINTS = 257
+MEMORY_MAX_BYTES = 8 * 1024 * 1024
+DISK_MAX_BYTES = 64 * 1024 * 1024
+# SPEAKER_STATS_DIR を空にするとディスク側を使わない
+DISK_DIR = os.environ.get('SPEAKER_STATS_DIR', str(Path('/tmp') / 'speaker_stats'))
+# F0 比の上限（半音）
+MAX_F0_SEMITONES = 12.0
+_ID = re.compile(r'^[0-9a-f]{64}$')
+
+
+def stats_id(data):
+    """WAV ファイルのバイト列から統計の ID（16 進）"""
+    h = hashlib.sha256(b'speaker-stats-%d\0' % STATS_VERSION)
+    h.update(data)
+    return h.hexdigest()
+
+
+def is_stats_id(value):
+    return isinstance(value, str) and bool(_ID.match(value))
+
+
+def f0_statistics(audio_data, sample_rate):
+    f0 = np.asarray(estimate_f0_batch(audio_data, sample_rate), dtype=np.float64)
+    f0 = f0[f0 > 0]
+    if not len(f0):
+        return {'f0_mean': 0.0, 'f0_std': 0.0, 'f0_p05': 0.0, 'f0_p50': 0.0, 'f0_p95': 0.0}
+    semitones = 12.0 * np.log2(f0)
+    p05, p50, p95 = np.percentile(f0, [5, 50, 95])
+    return {'f0_mean': float(2.0 ** (np.mean(semitones) / 12.0)), 'f0_std': float(np.std(semitones)),
+            'f0_p05': float(p05), 'f0_p50': float(p50), 'f0_p95': float(p95)}
+
+
+def mean_envelope(audio_data, sample_rate, points=ENVELOPE_POINTS):
+    """パワーで重み付けした平均対数包絡（0〜Nyquist の points 点）"""
+    N = frame_length(sample_rate, FRAME_MS)
+    n_ceps = n_cepstra(sample_rate)
+    total = np.zeros(N // 2 + 1)
+    weight = 0.0
+    for spec in iter_stft(audio_data, N):
+        power = np.sum(spec.real ** 2 + spec.imag ** 2, axis=1)
+        total += power @ envelope(spec, n_ceps)
+        weight += float(np.sum(power))
+    mean = total / weight if weight > 0 else total
+    grid = np.linspace(0.0, sample_rate / 2.0, points)
+    return np.interp(grid, np.arange(N // 2 + 1) * (sample_rate / float(N)), mean)
+
+
+def extract(audio_data, sample_rate):
+    """話者統計（JSON にできる dict）"""
+    stats = {'version': STATS_VERSION, 'sample_rate': int(sample_rate),
+             'duration': len(audio_data) / float(sample_rate)}
+    stats.update(f0_statistics(audio_data, sample_rate))
+    stats['envelope'] = [round(float(v), 5) for v in mean_envelope(audio_data, sample_rate)]
+    return stats
+
+
+def envelope_at(stats, hz):
+    """周波数 hz（配列）での平均対数包絡。Nyquist より上は最後の値"""
+    env = np.asarray(stats['envelope'], dtype=np.float64)
+    return np.interp(hz, np.linspace(0.0, stats['sample_rate'] / 2.0, len(env)), env)
+
+
+def summary(stats):
+    """包絡を除いた統計（レスポンス用）"""
+    return {k: v for k, v in stats.items() if k != 'envelope'}
+
+
+class StatsStore(object):
+    """統計 ID -> 統計の 2 段キャッシュ（RenderCache に JSON で入れる）"""
+
+    def __init__(self, memory_bytes=MEMORY_MAX_BYTES, disk_dir=DISK_DIR, disk_bytes=DISK_MAX_BYTES):
+        self.cache = RenderCache(memory_bytes, disk_dir, disk_bytes)
+
+    def get(self, target_id):
+        """統計。ID が不正・未登録（消えたものを含む）なら None"""
+        if not is_stats_id(target_id):
+            return None
+        data = self.cache.get(target_id)
+        return json.loads(data.decode('utf-8')) if data is not None else None
+
+    def get_or_extract(self, data, decode):
+        """(ID, 統計, hit)。なければ decode() -> (sample_rate, 波形) を分析して入れる"""
+        target_id = stats_id(data)
+
+        def analyze():
+            sample_rate, audio_data = decode()
+            return json.dumps(extract(audio_data, sample_rate), separators=(',', ':')).encode('utf-8')
+
+        raw, hit = self.cache.get_or_render(target_id, analyze)
+        return target_id, json.loads(raw.decode('utf-8')), hit
+
+
+def convert(audio_data, sample_rate, target, mode='wsola'):
+    """目標話者の統計 target に寄せた (波形, F0 のシフト量（半音）)。長さは入力と同じ"""
+    source = {'sample_rate': int(sample_rate)}
+    source.update(f0_statistics(audio_data, sample_rate))
+    source['envelope'] = mean_envelope(audio_data, sample_rate)
+    semitones = 0.0
+    if source['f0_mean'] > 0 and target['f0_mean'] > 0:
+        semitones = 12.0 * np.log2(target['f0_mean'] / source['f0_mean'])
+        semitones = round(float(np.clip(semitones, -MAX_F0_SEMITONES, MAX_F0_SEMITONES)), 2)
+    N = frame_length(sample_rate, FRAME_MS)
+    df = sample_rate / float(N)
+    # ピッチシフト後に周波数 f になる成分は、シフト前は f / r にある
+    hz = np.arange(N // 2 + 1) * df * 2.0 ** (semitones / 12.0)
+    table = bin_table(hz / df, envelope_at(target, hz) - envelope_at(source, hz))
+    converted = convert_many(audio_data, sample_rate, [table])[0]
+    if semitones:
+        converted = pitch_shift(converted, sample_rate, semitones, mode)
+    return converted, semitones
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+スペクトログラムの共通モジュール（research_api から使う）。
+
+scipy.signal.spectrogram（detrend='constant', scaling='density', mode='psd'）と同じ値を、
+フレームをストライドビューで FRAME_BLOCK 個ずつ切り出して rFFT し、ブロック単位で返す。
+max_frames / max_bins を指定すると、連続するフレーム・ビンをパワーの平均でまとめて間引く。
+
+バイナリ形式（stream()）はヘッダのあとにフレームを順に流す:
+  ヘッダ（リトルエンディアン、HEADER.size バイト）
+    magic b'SPG1', 値の型 u8（1 = float16 の dB, 2 = uint8 に量子化した dB）, 予約 u8, 予約 u16,
+    フレーム数 u32, ビン数 u32, サンプリング周波数 f64, 先頭フレームの時刻 t0 f64, フレーム間隔 dt f64,
+    dB の下限 f64, dB の上限 f64
+  各ビンの周波数 float32 × ビン数
+  フレームごとに ビン数 個の値。uint8 は db_min + v / 255 · (db_max - db_min) に戻す。
+dB の上限はフルスケール（|x| <= 1）の信号がとりうる PSD の上界で、下限は上限 - db_range。
+"""
+import struct
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:
+    np = None
+
+try:
+    from scipy.signal import get_window
+except ImportError:
+    get_window = None
+
+# 一度に rFFT する元フレーム数
+FRAME_BLOCK = 512
+# dB の既定のダイナミックレンジ
+DB_RANGE = 100.0
+
+MAGIC = b'SPG1'
+HEADER = struct.Struct('<4sBBHIIddddd')
+# format -> (ヘッダの型コード, 1 値のバイト数)
+FORMATS = {'f16': (1, 2), 'u8': (2, 1)}
+
+
+def _groups(n, limit):
+    """n 個を limit 個以下にまとめるときの (開始位置, 個数)"""
+    size = 1 if not limit or limit >= n else -(-n // int(limit))
+    starts = np.arange(0, n, size)
+    counts = np.minimum(size, n - starts)
+    return size, starts, counts
+
+
+def _window(name, n):
+    """周期窓（scipy.signal.get_window の既定と同じ）"""
+    if get_window is not None:
+        return get_window(name, n)
+    numpy_windows = {'hamming': np.hamming, 'hann': np.hanning, 'hanning': np.hanning, 'blackman': np.blackman}
+    if name not in numpy_windows:
+        raise ValueError('unsupported window without scipy: %s' % name)
+    return numpy_windows[name](n + 1)[:-1]
+
+
+class Spectrogram(object):
+    """1 本の信号のスペクトログラム。
+    frequencies / times は間引き後のビン・フレームの中心（まとめた範囲の平均）。"""
+
+    def __init__(self, audio_data, sample_rate, fft_size=2048, window='hamming', noverlap=None,
+                 max_frames=None, max_bins=None):
+        x = np.asarray(audio_data)
+        if x.dtype not in (np.float32, np.float64):
+            x = x.astype(np.float64)
+        self.x = x
+        self.sample_rate = float(sample_rate)
+        nperseg = max(1, min(int(fft_size), len(x)))
+        noverlap = nperseg // 2 if noverlap is None else min(int(noverlap), nperseg - 1)
+        self.nperseg = nperseg
+        self.hop = nperseg - noverlap
+        self.n_raw = (len(x) - nperseg) // self.hop + 1 if len(x) >= nperseg else 0
+        win = _window(window, nperseg)
+        self.window = win.astype(x.dtype)
+        self.scale = 1.0 / (self.sample_rate * float(np.sum(win * win)))
+        # フルスケールの PSD の上界: |X_k| <= Σ|w| を片側化（×2）して密度に直す
+        self.db_max = float(10 * np.log10(2 * float(np.sum(np.abs(win))) ** 2 * self.scale))
+
+        freqs = np.fft.rfftfreq(nperseg, 1.0 / self.sample_rate)
+        self.bin_group, self._bin_starts, self._bin_counts = _groups(len(freqs), max_bins)
+        self.frame_group, _, self._frame_counts = _groups(self.n_raw, max_frames)
+        self.frequencies = np.add.reduceat(freqs, self._bin_starts) / self._bin_counts if len(freqs) else freqs
+        g = self.frame_group
+        self.t0 = (nperseg / 2 + (g - 1) / 2 * self.hop) / self.sample_rate
+        self.dt = g * self.hop / self.sample_rate
+        centers = (nperseg / 2 + np.arange(self.n_raw) * self.hop) / self.sample_rate
+        self.times = np.add.reduceat(centers, np.arange(0, self.n_raw, g)) / self._frame_counts if self.n_raw else centers
+
+    @property
+    def n_frames(self):
+        return len(self._frame_counts)
+
+    @property
+    def n_bins(self):
+        return len(self._bin_counts)
+
+    def _power(self, a, b):
+        """元フレーム a..b-1 の PSD（ビンは間引き済み）(b-a, n_bins)"""
+        F = sliding_window_view(self.x, self.nperseg)[::self.hop][a:b]
+        F = F - np.mean(F, axis=1, keepdims=True)
+        F *= self.window
+        spec = np.fft.rfft(F, axis=1)
+        P = np.abs(spec)
+        P *= P
+        P *= P.dtype.type(self.scale)
+        # 片側スペクトル: DC と（偶数長なら）Nyquist 以外を 2 倍
+        P[:, 1:P.shape[1] - (1 if self.nperseg % 2 == 0 else 0)] *= 2
+        if self.bin_group > 1:
+            P = np.add.reduceat(P, self._bin_starts, axis=1)
+            P /= self._bin_counts.astype(P.dtype)
+        return P
+
+    def blocks(self):
+        """間引き後の PSD を (フレーム, ビン) のブロックで先頭から順に返す"""
+        g = self.frame_group
+        per = max(1, FRAME_BLOCK // g) * g
+        for s in range(0, self.n_raw, per):
+            e = min(s + per, self.n_raw)
+            out = np.zeros((-(-(e - s) // g), self.n_bins), dtype=np.float64)
+            for a in range(s, e, FRAME_BLOCK):
+                b = min(a + FRAME_BLOCK, e)
+                P = self._power(a, b)
+                if g == 1:
+                    out[a - s:b - s] = P
+                    continue
+                ids = (np.arange(a, b) - s) // g
+                first = np.flatnonzero(np.diff(ids, prepend=-1))
+                out[ids[first]] += np.add.reduceat(P, first, axis=0)
+            if g > 1:
+                out /= self._frame_counts[s // g:s // g + len(out), None]
+            yield out
+
+    def compute(self):
+        """全体を (ビン, フレーム) の配列で返す（scipy.signal.spectrogram と同じ向き）"""
+        if self.n_frames == 0:
+            return np.zeros((self.n_bins, 0))
+        return np.concatenate(list(self.blocks()), axis=0).T
+
+    def header(self, fmt, db_range=DB_RANGE):
+        code, _ = FORMATS[fmt]
+        head = HEADER.pack(MAGIC, code, 0, 0, self.n_frames, self.n_bins, self.sample_rate, self.t0, self.dt,
+                           self.db_max - float(db_range), self.db_max)
+        return head + self.frequencies.astype('<f4').tobytes()
+
+    def encode(self, P, fmt, db_range=DB_RANGE):
+        """PSD ブロックを dB にしてバイナリ化する"""
+        db_min = self.db_max - float(db_range)
+        dB = np.maximum(P, np.finfo(np.float64).tiny)
+        np.log10(dB, out=dB)
+        dB *= 10
+        np.clip(dB, db_min, self.db_max, out=dB)
+        if fmt == 'f16':
+            return dB.astype('<f2').tobytes()
+        dB -= db_min
+        dB *= 255.0 / float(db_range)
+        return np.rint(dB).astype(np.uint8).tobytes()
+
+    def stream(self, fmt='u8', db_range=DB_RANGE):
+        """ヘッダ → フレームブロックの順に bytes を返すジェネレータ（チャンク転送でそのまま流せる）。
+        引数の検査はここで先に行うので、レスポンスを返し始めてから失敗することはない。"""
+        if fmt not in FORMATS:
+            raise ValueError('unknown format: %s' % fmt)
+        if not float(db_range) > 0:
+            raise ValueError('db_range must be positive')
+        return self._stream(fmt, float(db_range))
+
+    def _stream(self, fmt, db_range):
+        yield self.header(fmt, db_range)
+        for P in self.blocks():
+            yield self.encode(P, fmt, db_range)
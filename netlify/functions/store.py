@@ -0,0 +1,584 @@
+# -*- coding: utf-8 -*-
+"""
+タスク・メモ用の保存エンジン（tasks / memos から使う）。
+
+- LogStore: 追記専用ログ（JSON Lines）＋メモリ上の id インデックス。追加・更新・削除は 1 行の追記で O(1)。
+  削除・更新で不要になった行が一定数を超えたら、生きているレコードだけを書いた一時ファイルを
+  os.replace で差し替えて圧縮する。
+- JsonStore: 従来どおり JSON ファイル全体を読み書きする実装（小規模データ・互換用）。
+
+どちらも flock でプロセス間の排他を取り、同じファイルを複数の呼び出しが同時に更新しても
+id の重複や更新の取りこぼしが起きないようにする。使う実装は open_store() が環境変数
+TASKMEMO_STORE（log | json、既定 log）で選ぶ。
+
+一覧用に (order_by の値, id) の昇順インデックスと、indexed に指定したフィールドごとの
+値別インデックスをメモリ上に持つ。page() はカーソル位置を二分探索して 1 ページ分だけを返す。
+全文検索などの派生インデックスは subscribe() で登録すると、ログの再生・追記に合わせて更新される。
+
+変更のたびに単調増加する版（version）を持ち、(版, id) の変更履歴から changes(since) で差分を返す。
+LogStore の版はログの変更行数（圧縮後も引き継ぐ）なので、同じログを読む全プロセスで一致する。
+追記・圧縮のたびに版をサイドカー（<ログ>.version）に書くので、version_info() はログを読んでいない
+インスタンスでも stat とサイドカーだけで答えられる（条件付き GET の 304 でログを再生しない）。
+JsonStore の版はファイルの更新時刻（ns）で、読み直し時は前回との差分を履歴に積む。
+"""
+import base64
+import bisect
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 不要行がこの数以上、かつ生きているレコード数 × COMPACT_RATIO 以上になったら圧縮する
+COMPACT_MIN_DEAD = 1000
+COMPACT_RATIO = 1.0
+
+# 一覧 API のページサイズ（limit 省略時と上限）
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+
+def _dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def _write_atomic(path, data):
+    """一時ファイルに書いて fsync してから rename で差し替える"""
+    tmp = '%s.tmp.%d' % (path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def encode_cursor(key):
+    """インデックスのキーを URL に載せられる不透明なカーソル文字列にする"""
+    return base64.urlsafe_b64encode(_dumps(list(key)).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """encode_cursor の逆。インデックスのキー（ソート値は文字列、id は整数）の形でなければ ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, record_id = json.loads(raw.decode('utf-8'))
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError('invalid cursor')
+    # _sort_key のソート値は常に文字列。それ以外は bisect でキーと比べられない
+    if not isinstance(value, str) or not isinstance(record_id, int) or isinstance(record_id, bool):
+        raise ValueError('invalid cursor')
+    return (value, record_id)
+
+
+def page_params(query):
+    """queryStringParameters から (limit, after) を取り出す。ページ指定がなければ None。"""
+    query = query or {}
+    if 'limit' not in query and 'after' not in query:
+        return None
+    limit = int(query.get('limit') or DEFAULT_PAGE_SIZE)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, MAX_PAGE_SIZE), query.get('after') or None
+
+
+class SortedIndex(object):
+    """(ソート値, id) の昇順リスト。作成順の追加は末尾に積むだけで、それ以外は bisect で挿入・削除する。"""
+
+    def __init__(self):
+        self.keys = []
+
+    def add(self, key):
+        keys = self.keys
+        if not keys or keys[-1] < key:
+            keys.append(key)
+        else:
+            bisect.insort(keys, key)
+
+    def remove(self, key):
+        keys = self.keys
+        i = bisect.bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            del keys[i]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def slice(self, limit=None, after=None, descending=False):
+        """after の次から最大 limit 件のキーを返す（descending なら after より前を新しい順に）"""
+        keys = self.keys
+        if descending:
+            end = bisect.bisect_left(keys, after) if after is not None else len(keys)
+            start = 0 if limit is None else max(0, end - limit)
+            return keys[start:end][::-1]
+        start = bisect.bisect_right(keys, after) if after is not None else 0
+        return keys[start:] if limit is None else keys[start:start + limit]
+
+
+class _BaseStore(object):
+    """ロック・インデックスと共通 API。サブクラスは _sync / _commit を実装する。
+    _commit(puts, deletes) は複数レコードの追加・置換と削除を 1 回の永続書き込みでまとめて反映する。"""
+
+    def __init__(self, path, order_by='created_at', indexed=()):
+        self.path = str(path)
+        self.order_by = order_by
+        self.indexed = tuple(indexed)
+        self._lock_path = self.path + '.lock'
+        self._thread_lock = threading.RLock()
+        self._lock_fd = None
+        self._listeners = []
+        self._modified = None
+        self._reset_history()
+        self._clear()
+
+    def _clear(self):
+        self._records = {}
+        self._next_id = 1
+        self._order = SortedIndex()
+        self._by_field = {f: {} for f in self.indexed}
+        for listener in self._listeners:
+            listener.clear()
+
+    def _reset_history(self, version=0):
+        """変更履歴を version 以降だけにする（それより前からの差分は changes() で返せなくなる）"""
+        self._version = version
+        self._base_version = version
+        self._history = []
+
+    def _sort_key(self, record):
+        return (record.get(self.order_by) or '', record['id'])
+
+    def _index(self, record, add):
+        key = self._sort_key(record)
+        if add:
+            self._order.add(key)
+        else:
+            self._order.remove(key)
+        for field in self.indexed:
+            buckets = self._by_field[field]
+            value = record.get(field)
+            if add:
+                buckets.setdefault(value, SortedIndex()).add(key)
+            elif value in buckets:
+                buckets[value].remove(key)
+
+    def _put_record(self, record):
+        """レコードを追加・置換してインデックスを更新する。置換前のレコードを返す。"""
+        rid = record['id']
+        old = self._records.get(rid)
+        if old is not None:
+            self._index(old, False)
+        self._records[rid] = record
+        self._index(record, True)
+        if rid >= self._next_id:
+            self._next_id = rid + 1
+        for listener in self._listeners:
+            listener.put(record, old)
+        return old
+
+    def _pop_record(self, record_id):
+        old = self._records.pop(record_id, None)
+        if old is not None:
+            self._index(old, False)
+            for listener in self._listeners:
+                listener.delete(old)
+        return old
+
+    @contextmanager
+    def _locked(self, exclusive):
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            if self._lock_fd is None:
+                self._lock_fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def subscribe(self, listener):
+        """派生インデックスを登録する。listener は clear() / put(record, old) / delete(old) を持つ。
+        登録時に現在の全レコードを put して追いつかせる。"""
+        with self._locked(False):
+            self._sync()
+            listener.clear()
+            for record in self._records.values():
+                listener.put(record, None)
+            self._listeners.append(listener)
+
+    @contextmanager
+    def reading(self):
+        """共有ロックを取り最新のログを反映した状態で、id -> レコードの dict を渡す
+        （購読中のインデックスとレコードを同じ時点で読むとき用）"""
+        with self._locked(False):
+            self._sync()
+            yield self._records
+
+    def version_info(self):
+        """(version, 最終更新時刻の epoch 秒) を返す。変更がなければファイルの stat だけで済む。"""
+        with self._locked(False):
+            self._sync()
+            return self._version, self._modified
+
+    def changes(self, since):
+        """since より後の変更を (version, changes) で返す。changes は ('put', レコード) か ('del', id) を
+        変更順に並べたもの（同じ id は最後の状態 1 件）。since が履歴の範囲外なら changes は None。"""
+        with self._locked(False):
+            self._sync()
+            if since < self._base_version or since > self._version:
+                return self._version, None
+            start = bisect.bisect_right(self._history, (since, float('inf')))
+            latest = {}
+            for version, record_id in self._history[start:]:
+                latest.pop(record_id, None)
+                latest[record_id] = version
+            out = []
+            for record_id in latest:
+                record = self._records.get(record_id)
+                out.append(('put', record) if record is not None else ('del', record_id))
+            return self._version, out
+
+    def all(self):
+        """全レコードを登録順で返す"""
+        with self._locked(False):
+            self._sync()
+            return list(self._records.values())
+
+    def page(self, limit=None, after=None, where=None, descending=False):
+        """order_by 順に 1 ページ分を返す: (records, next_cursor)。
+        after は前ページの next_cursor、where は {インデックス済みフィールド: 値}（1 つまで）。"""
+        with self._locked(False):
+            self._sync()
+            index = self._order
+            if where:
+                if len(where) > 1:
+                    raise ValueError('only one filter field is supported')
+                (field, value), = where.items()
+                if field not in self._by_field:
+                    raise ValueError('field is not indexed: %s' % field)
+                index = self._by_field[field].get(value) or SortedIndex()
+            after_key = decode_cursor(after) if after else None
+            keys = index.slice(None if limit is None else limit + 1, after_key, descending)
+            next_cursor = None
+            if limit is not None and len(keys) > limit:
+                keys = keys[:limit]
+                next_cursor = encode_cursor(keys[-1])
+            return [self._records[k[1]] for k in keys], next_cursor
+
+    def get(self, record_id):
+        with self._locked(False):
+            self._sync()
+            return self._records.get(record_id)
+
+    def insert(self, fields):
+        """新しい id を採番して追加し、追加したレコードを返す"""
+        with self._locked(True):
+            self._sync()
+            record = dict(id=self._next_id, **fields)
+            self._commit([record], ())
+            return record
+
+    def insert_many(self, fields_list):
+        """まとめて採番・追加する（同期 1 回・永続書き込み 1 回）。追加したレコードのリストを返す"""
+        with self._locked(True):
+            self._sync()
+            records = [dict(id=self._next_id + i, **fields) for i, fields in enumerate(fields_list)]
+            if records:
+                self._commit(records, ())
+            return records
+
+    def update(self, record_id, fn):
+        """fn(record) -> 新しいレコード で置き換える。存在しなければ None"""
+        with self._locked(True):
+            self._sync()
+            old = self._records.get(record_id)
+            if old is None:
+                return None
+            record = fn(dict(old))
+            record['id'] = record_id
+            self._commit([record], ())
+            return record
+
+    def delete(self, record_id):
+        """削除できたら True"""
+        with self._locked(True):
+            self._sync()
+            if record_id not in self._records:
+                return False
+            self._commit((), [record_id])
+            return True
+
+    def delete_many(self, record_ids):
+        """まとめて削除する。1 件でも存在しなければ何も削除せず、見つからなかった id のリストを返す"""
+        with self._locked(True):
+            self._sync()
+            missing = [i for i in record_ids if i not in self._records]
+            if not missing and record_ids:
+                self._commit((), list(record_ids))
+            return missing
+
+    def __len__(self):
+        with self._locked(False):
+            self._sync()
+            return len(self._records)
+
+
+class JsonStore(_BaseStore):
+    """JSON ファイル全体を毎回読み書きする実装（従来の load/save と同じ形式）"""
+
+    def __init__(self, path, **kwargs):
+        super(JsonStore, self).__init__(path, **kwargs)
+        self._mtime = None
+
+    def _sync(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            if self._records or self._mtime is not None:
+                self._clear()
+                self._reset_history(self._version + 1)
+            self._mtime = None
+            return
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if key == self._mtime:
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+        old = self._records
+        self._clear()
+        for r in items:
+            self._put_record(r)
+        version = max(st.st_mtime_ns, self._version + 1)
+        if self._mtime is None:
+            self._reset_history(version)
+        else:
+            # 他プロセスの書き込み: 前回読んだ内容との差分を 1 つの版として履歴に積む
+            self._version = version
+            for rid, r in self._records.items():
+                if old.get(rid) != r:
+                    self._history.append((version, rid))
+            for rid in old:
+                if rid not in self._records:
+                    self._history.append((version, rid))
+        self._mtime = key
+        self._modified = st.st_mtime
+
+    def version_info(self):
+        """読み込み前（や読み直し待ち）の版はファイルの更新時刻なので、stat だけで返す（_sync と同じ式）"""
+        with self._locked(False):
+            if self._mtime is None:
+                try:
+                    st = os.stat(self.path)
+                except FileNotFoundError:
+                    st = None
+                if st is not None:
+                    return max(st.st_mtime_ns, self._version + 1), st.st_mtime
+            self._sync()
+            return self._version, self._modified
+
+    def _save(self):
+        _write_atomic(self.path, json.dumps(list(self._records.values()), ensure_ascii=False, indent=2).encode('utf-8'))
+        st = os.stat(self.path)
+        self._mtime = (st.st_ino, st.st_mtime_ns, st.st_size)
+        self._modified = st.st_mtime
+        return max(st.st_mtime_ns, self._version + 1)
+
+    def _commit(self, puts, deletes):
+        for record in puts:
+            self._put_record(record)
+        for record_id in deletes:
+            self._pop_record(record_id)
+        try:
+            version = self._save()
+        except Exception:
+            # 書き込めなかった変更がメモリに残らないよう、次の _sync でファイルから読み直させる
+            self._mtime = None
+            raise
+        self._version = version
+        self._history.extend((version, r['id']) for r in puts)
+        self._history.extend((version, i) for i in deletes)
+
+
+class LogStore(_BaseStore):
+    """追記専用ログ＋ id インデックス。
+
+    ログの各行は {"op": "put", "rec": {...}} か {"op": "del", "id": n}。複数件の変更は
+    {"op": "batch", "entries": [...]} の 1 行にまとめるので、途中で落ちても一部だけが反映されることはない。
+    変更行 1 行ごとに版を 1 つ進める。圧縮後のログは末尾の {"op": "version", "v": n} で版を引き継ぐ。
+    ファイルの inode と読み込み済みオフセットを覚えておき、他プロセスが追記した分だけを読み足す。
+    legacy_path に従来の JSON ファイルを渡すと、ログがまだ無いときに一度だけ取り込む。"""
+
+    def __init__(self, path, legacy_path=None, compact_min_dead=COMPACT_MIN_DEAD, compact_ratio=COMPACT_RATIO,
+                 fsync=True, **kwargs):
+        super(LogStore, self).__init__(path, **kwargs)
+        self.legacy_path = str(legacy_path) if legacy_path else None
+        self._version_path = self.path + '.version'
+        self.compact_min_dead = compact_min_dead
+        self.compact_ratio = compact_ratio
+        self.fsync = fsync
+        self._reset()
+
+    def _reset(self):
+        self._clear()
+        self._reset_history()
+        self._dead = 0
+        self._offset = 0
+        self._inode = None
+
+    def _apply(self, entry, version=None):
+        op = entry.get('op')
+        if op in ('put', 'del', 'batch') and version is None:
+            self._version += 1
+            version = self._version
+        if op == 'put':
+            if self._put_record(entry['rec']) is not None:
+                self._dead += 1
+            self._history.append((version, entry['rec']['id']))
+        elif op == 'del':
+            if self._pop_record(entry['id']) is not None:
+                self._dead += 2
+            self._history.append((version, entry['id']))
+        elif op == 'next_id':
+            self._next_id = max(self._next_id, entry['id'])
+        elif op == 'version':
+            # 圧縮前の履歴は残っていないので、ここより前からの差分は返せない
+            self._reset_history(entry['v'])
+        elif op == 'batch':
+            for e in entry['entries']:
+                self._apply(e, version)
+
+    def _sync(self):
+        """ログの未読部分をインデックスへ反映する。差し替えられていたら読み直す。"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            if self._inode is not None:
+                self._reset()
+            if self.legacy_path and os.path.exists(self.legacy_path):
+                self._import_legacy()
+            return
+        if st.st_ino != self._inode or st.st_size < self._offset:
+            self._reset()
+            self._inode = st.st_ino
+        self._modified = st.st_mtime
+        if st.st_size == self._offset:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            if line:
+                self._apply(json.loads(line))
+        # 書き込み途中で落ちた行（改行なしの末尾）は読まずに残す
+        self._offset += end
+
+    def version_info(self):
+        """ログを読み終えていなければ、サイドカーの版がログの (inode, サイズ) と一致する限りそれを返す
+        （ログは再生しない）。一致しなければ読み込んで、サイドカーを書き直す。"""
+        with self._locked(False):
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                st = None
+            if st is not None and (st.st_ino, st.st_size) != (self._inode, self._offset):
+                version = self._read_version(st)
+                if version is not None:
+                    return version, st.st_mtime
+            self._sync()
+            if self._inode is not None and self._read_version(os.stat(self.path)) is None:
+                self._write_version()
+            return self._version, self._modified
+
+    def _read_version(self, st):
+        """サイドカーの版。ログの stat st と食い違う・読めないときは None"""
+        try:
+            with open(self._version_path, 'rb') as f:
+                meta = json.loads(f.read().decode('utf-8'))
+            if meta['inode'] == st.st_ino and meta['size'] == st.st_size:
+                return int(meta['version'])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return None
+
+    def _write_version(self):
+        """読み込み済みの位置と版をサイドカーに書く（fsync しない。落ちて食い違っても version_info が読み直すだけ）"""
+        tmp = '%s.tmp.%d' % (self._version_path, os.getpid())
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(_dumps({'inode': self._inode, 'size': self._offset, 'version': self._version}).encode('utf-8'))
+            os.replace(tmp, self._version_path)
+        except OSError:
+            pass
+
+    def _import_legacy(self):
+        with open(self.legacy_path, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+        self._write_snapshot(items)
+
+    def _write_snapshot(self, records, next_id=None, version=None):
+        lines = [_dumps({'op': 'put', 'rec': r}) for r in records]
+        if next_id is not None:
+            lines.append(_dumps({'op': 'next_id', 'id': next_id}))
+        if version is not None:
+            lines.append(_dumps({'op': 'version', 'v': version}))
+        _write_atomic(self.path, ''.join(l + '\n' for l in lines).encode('utf-8'))
+        self._reset()
+        self._sync()
+        self._write_version()
+
+    def _append(self, entries):
+        if os.path.exists(self.path) and os.path.getsize(self.path) > self._offset:
+            # 途中で切れた末尾行があれば切り詰めてから追記する
+            with open(self.path, 'r+b') as f:
+                f.truncate(self._offset)
+        data = ''.join(_dumps(e) + '\n' for e in entries).encode('utf-8')
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            if self.fsync:
+                os.fsync(fd)
+            self._modified = os.fstat(fd).st_mtime
+        finally:
+            os.close(fd)
+        if self._inode is None:
+            self._inode = os.stat(self.path).st_ino
+        for e in entries:
+            self._apply(e)
+        self._offset += len(data)
+        self._write_version()
+        self._maybe_compact()
+
+    def _commit(self, puts, deletes):
+        entries = [{'op': 'put', 'rec': r} for r in puts] + [{'op': 'del', 'id': i} for i in deletes]
+        self._append(entries if len(entries) == 1 else [{'op': 'batch', 'entries': entries}])
+
+    def _maybe_compact(self):
+        if self._dead >= self.compact_min_dead and self._dead >= len(self._records) * self.compact_ratio:
+            self._compact()
+
+    def _compact(self):
+        # order_by 順に書き直すので、次回の読み込みではインデックスが末尾追加だけで組み上がる。
+        # 削除済み id を再利用しないよう採番位置も、版が戻らないよう現在の版も残す
+        self._write_snapshot([self._records[k[1]] for k in self._order.keys], self._next_id, self._version)
+
+    def compact(self):
+        """生きているレコードだけのログに書き直す"""
+        with self._locked(True):
+            self._sync()
+            self._compact()
+
+
+def open_store(data_dir, name, kind=None, **kwargs):
+    """data_dir/<name> のストアを開く。kind（既定は環境変数 TASKMEMO_STORE）で log / json を選ぶ。
+    kwargs（order_by, indexed など）はそのままストアに渡す。"""
+    kind = kind or os.environ.get('TASKMEMO_STORE', 'log')
+    legacy = os.path.join(str(data_dir), name + '.json')
+    if kind == 'json':
+        return JsonStore(legacy, **kwargs)
+    return LogStore(os.path.join(str(data_dir), name + '.log'), legacy_path=legacy, **kwargs)
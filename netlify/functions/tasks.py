@@ -5,26 +5,20 @@ Netlify Function: タスク管理API
 """
 
 import json
-import os
 from datetime import datetime
 from pathlib import Path
 
+from bulk import bulk_delete, bulk_insert, parse_bulk_body
+from conditional import ALLOW_HEADERS, EXPOSE_HEADERS, collection_etag, is_not_modified, validator_headers
+from store import open_store, page_params
+
 # データファイルのパス（Netlify Functions環境用）
 DATA_DIR = Path('/tmp') / 'taskmemo_data'
 DATA_DIR.mkdir(exist_ok=True, parents=True)
-TASKS_FILE = DATA_DIR / 'tasks.json'
-
-def load_tasks():
-    """タスクデータを読み込む"""
-    if TASKS_FILE.exists():
-        with open(TASKS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
 
-def save_tasks(tasks):
-    """タスクデータを保存する"""
-    with open(TASKS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(tasks, f, ensure_ascii=False, indent=2)
+# 追記ログ＋ id インデックスの保存エンジン（従来の tasks.json は初回に取り込む）
+# 一覧は created_at 順のインデックス、completed での絞り込みは値別インデックスから返す
+STORE = open_store(DATA_DIR, 'tasks', order_by='created_at', indexed=('completed',))
 
 def handler(event, context):
     """Netlify Function ハンドラー"""
@@ -32,7 +26,8 @@ def handler(event, context):
     headers = {
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': 'Content-Type',
+        'Access-Control-Allow-Headers': ALLOW_HEADERS,
+        'Access-Control-Expose-Headers': EXPOSE_HEADERS,
         'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS'
     }
     
@@ -52,15 +47,95 @@ def handler(event, context):
     task_id = None
     if len(path_parts) > 3 and path_parts[-1].isdigit():
         task_id = int(path_parts[-1])
+    elif len(path_parts) > 4 and path_parts[-1] == 'toggle' and path_parts[-2].isdigit():
+        task_id = int(path_parts[-2])
     
     try:
+        # GET /tasks/changes?since=<版>
+        # since より後に追加・更新されたレコードと削除された id を返す（履歴が残っていなければ 410）
+        if method == 'GET' and path_parts[-1] == 'changes':
+            query = event.get('queryStringParameters') or {}
+            if query.get('since') in (None, ''):
+                raise ValueError('since is required')
+            version, changes = STORE.changes(int(query['since']))
+            if changes is None:
+                return {
+                    'statusCode': 410,
+                    'headers': headers,
+                    'body': json.dumps({'error': '差分の履歴がありません。一覧を取り直してください', 'version': version},
+                                       ensure_ascii=False)
+                }
+            body = {
+                'version': version,
+                'changes': [{'op': 'put', 'item': v} if op == 'put' else {'op': 'delete', 'id': v} for op, v in changes]
+            }
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': json.dumps(body, ensure_ascii=False)
+            }
+        
         # GET /tasks
-        if method == 'GET' and not task_id:
-            tasks = load_tasks()
+        # ?limit=&after=<cursor> でページ単位、?completed=true/false で絞り込み
+        elif method == 'GET' and not task_id:
+            # 版が変わっていなければ一覧を読まずに 304
+            version, modified = STORE.version_info()
+            etag = collection_etag('tasks', version)
+            cache_headers = dict(headers, **validator_headers(etag, version, modified))
+            if is_not_modified(event, etag, modified):
+                return {
+                    'statusCode': 304,
+                    'headers': cache_headers,
+                    'body': ''
+                }
+            query = event.get('queryStringParameters') or {}
+            where = None
+            if query.get('completed') not in (None, ''):
+                completed = query['completed'].lower()
+                if completed not in ('true', '1', 'false', '0'):
+                    raise ValueError('completed must be true or false')
+                where = {'completed': completed in ('true', '1')}
+            paging = page_params(query)
+            if paging is None:
+                tasks, _ = STORE.page(where=where)
+                body = tasks
+            else:
+                limit, after = paging
+                tasks, next_cursor = STORE.page(limit, after, where)
+                body = {'items': tasks, 'next_cursor': next_cursor}
             return {
                 'statusCode': 200,
+                'headers': cache_headers,
+                'body': json.dumps(body, ensure_ascii=False)
+            }
+        
+        # POST /tasks/bulk  {"items": [...]}
+        # 全件を検証してから 1 回の書き込みで追加する（1 件でも不正なら何も追加しない）
+        elif method == 'POST' and path_parts[-1] == 'bulk':
+            now = datetime.now().isoformat()
+            
+            def build(item):
+                text = str(item.get('text') or '').strip()
+                if not text:
+                    raise ValueError('タスクのテキストが必要です')
+                return {'text': text, 'completed': False, 'created_at': now}
+            
+            status, body = bulk_insert(STORE, parse_bulk_body(event.get('body'), 'items'), build)
+            return {
+                'statusCode': status,
+                'headers': headers,
+                'body': json.dumps(body, ensure_ascii=False)
+            }
+        
+        # DELETE /tasks/bulk  {"ids": [...]}
+        # 1 件でも見つからなければ何も削除しない
+        elif method == 'DELETE' and path_parts[-1] == 'bulk':
+            ids = parse_bulk_body(event.get('body'), 'ids')
+            status, body = bulk_delete(STORE, ids, 'タスクが見つかりません')
+            return {
+                'statusCode': status,
                 'headers': headers,
-                'body': json.dumps(tasks, ensure_ascii=False)
+                'body': json.dumps(body, ensure_ascii=False)
             }
         
         # POST /tasks
@@ -75,18 +150,11 @@ def handler(event, context):
                     'body': json.dumps({'error': 'タスクのテキストが必要です'}, ensure_ascii=False)
                 }
             
-            tasks = load_tasks()
-            new_id = max([t.get('id', 0) for t in tasks], default=0) + 1
-            
-            new_task = {
-                'id': new_id,
+            new_task = STORE.insert({
                 'text': text,
                 'completed': False,
                 'created_at': datetime.now().isoformat()
-            }
-            
-            tasks.append(new_task)
-            save_tasks(tasks)
+            })
             
             return {
                 'statusCode': 201,
@@ -96,18 +164,18 @@ def handler(event, context):
         
         # PUT /tasks/:id/toggle
         elif method == 'PUT' and task_id and 'toggle' in path:
-            tasks = load_tasks()
+            def toggle(task):
+                task['completed'] = not task['completed']
+                task['updated_at'] = datetime.now().isoformat()
+                return task
             
-            for task in tasks:
-                if task['id'] == task_id:
-                    task['completed'] = not task['completed']
-                    task['updated_at'] = datetime.now().isoformat()
-                    save_tasks(tasks)
-                    return {
-                        'statusCode': 200,
-                        'headers': headers,
-                        'body': json.dumps(task, ensure_ascii=False)
-                    }
+            task = STORE.update(task_id, toggle)
+            if task is not None:
+                return {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'body': json.dumps(task, ensure_ascii=False)
+                }
             
             return {
                 'statusCode': 404,
@@ -117,12 +185,7 @@ def handler(event, context):
         
         # DELETE /tasks/:id
         elif method == 'DELETE' and task_id:
-            tasks = load_tasks()
-            original_length = len(tasks)
-            tasks = [t for t in tasks if t['id'] != task_id]
-            
-            if len(tasks) < original_length:
-                save_tasks(tasks)
+            if STORE.delete(task_id):
                 return {
                     'statusCode': 200,
                     'headers': headers,
@@ -142,6 +205,13 @@ def handler(event, context):
                 'body': json.dumps({'error': 'リソースが見つかりません'}, ensure_ascii=False)
             }
     
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': f'不正なリクエストです: {str(e)}'}, ensure_ascii=False)
+        }
+    
     except Exception as e:
         return {
             'statusCode': 500,
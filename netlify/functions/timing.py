@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+リクエストの段階ごとの計測（音声を扱う Netlify Functions と research_api から使う）。
+
+    timer = request_timer('f0_analyze')
+    with timer.span('base64', bytes_in=len(raw)) as s:
+        body = base64.b64decode(raw)
+        s.bytes_out = len(body)
+    ...
+    headers.update(timer.headers(status))
+
+段階（span）ごとに経過時間、入出力のバイト数（呼び出し側が入れる）、作業領域のピーク（tracemalloc。
+METRICS_TRACE_MEMORY=1 のときだけ。遅くなるので既定は無効）を記録する。段階は入れ子にしない。
+headers() は Server-Timing（段階ごとの dur と、desc にバイト数・ピーク、最後に total）を返し、
+METRICS_FILE を指定していれば 1 リクエスト 1 行の JSON を追記する。
+SERVER_TIMING=0 なら request_timer() は共有の NULL_TIMER を返し、計測は一切しない（時刻も取らない）。
+"""
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+ENABLED = os.environ.get('SERVER_TIMING', '1') != '0'
+TRACE_MEMORY = os.environ.get('METRICS_TRACE_MEMORY', '0') == '1'
+# 空なら JSONL に書かない
+METRICS_FILE = os.environ.get('METRICS_FILE', '')
+
+# CORS で公開するヘッダ
+EXPOSE_HEADERS = 'Server-Timing'
+
+_write_lock = threading.Lock()
+
+
+class Span(object):
+    __slots__ = ('name', 'ms', 'bytes_in', 'bytes_out', 'peak', '_start', '_base', '_trace')
+
+    def __init__(self, name, bytes_in, trace):
+        self.name = name
+        self.ms = 0.0
+        self.bytes_in = bytes_in
+        self.bytes_out = None
+        self.peak = None
+        self._trace = trace
+
+    def __enter__(self):
+        if self._trace:
+            tracemalloc.reset_peak()
+            self._base = tracemalloc.get_traced_memory()[0]
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.ms = (time.perf_counter() - self._start) * 1000.0
+        if self._trace:
+            self.peak = max(tracemalloc.get_traced_memory()[1] - self._base, 0)
+        return False
+
+    def as_dict(self):
+        return {'name': self.name, 'ms': round(self.ms, 3), 'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out, 'peak_bytes': self.peak}
+
+    def server_timing(self):
+        desc = []
+        if self.bytes_in is not None:
+            desc.append('in=%d' % self.bytes_in)
+        if self.bytes_out is not None:
+            desc.append('out=%d' % self.bytes_out)
+        if self.peak is not None:
+            desc.append('peak=%d' % self.peak)
+        value = '%s;dur=%.2f' % (self.name, self.ms)
+        return value + (';desc="%s"' % ' '.join(desc) if desc else '')
+
+
+class RequestTimer(object):
+    """1 リクエストの計測"""
+
+    def __init__(self, name, trace_memory=TRACE_MEMORY, metrics_file=METRICS_FILE):
+        self.name = name
+        self.spans = []
+        self.metrics_file = metrics_file
+        self.trace = bool(trace_memory)
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._start = time.perf_counter()
+        self._finished = None
+
+    def span(self, name, bytes_in=None):
+        s = Span(name, bytes_in, self.trace)
+        self.spans.append(s)
+        return s
+
+    def finish(self, status=None):
+        """合計時間を確定して記録を返す（2 回目以降は同じものを返す）。METRICS_FILE があれば追記する。"""
+        if self._finished is None:
+            total = (time.perf_counter() - self._start) * 1000.0
+            self._finished = {'time': round(time.time(), 3), 'handler': self.name, 'status': status,
+                              'total_ms': round(total, 3), 'stages': [s.as_dict() for s in self.spans]}
+            if self.metrics_file:
+                self._append(self._finished)
+        return self._finished
+
+    def server_timing(self, status=None):
+        record = self.finish(status)
+        return ', '.join([s.server_timing() for s in self.spans] + ['total;dur=%.2f' % record['total_ms']])
+
+    def headers(self, status=None):
+        """レスポンスに足すヘッダ（Server-Timing と、別オリジンからも読めるように Timing-Allow-Origin）"""
+        return {'Server-Timing': self.server_timing(status), 'Timing-Allow-Origin': '*'}
+
+    def _append(self, record):
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        try:
+            with _write_lock, open(self.metrics_file, 'a', encoding='utf-8') as f:
+                f.write(line)
+        except OSError:
+            pass
+
+
+class _NullSpan(object):
+    """無効時の span。属性の代入も捨てる"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+class _NullTimer(object):
+    name = None
+    spans = ()
+    _span = _NullSpan()
+
+    def span(self, name, bytes_in=None):
+        return self._span
+
+    def finish(self, status=None):
+        return None
+
+    def server_timing(self, status=None):
+        return None
+
+    def headers(self, status=None):
+        return {}
+
+
+NULL_TIMER = _NullTimer()
+
+
+def request_timer(name):
+    """計測が有効なら RequestTimer、無効なら NULL_TIMER"""
+    return RequestTimer(name) if ENABLED else NULL_TIMER
@@ -1,109 +1,30 @@
 # -*- coding: utf-8 -*-
-"""Netlify Function: 簡易音声変換 API（ピッチシフト等）"""
+"""Netlify Function: 簡易音声変換 API（ピッチシフト等）
+fields: semitones（半音）, mode（wsola | vocoder）。semitones がなければ strength（0〜100）を従来と同じ比に換算する"""
 import json
 import base64
-import re
-import struct
-import io
 
 try:
     import numpy as np
 except ImportError:
     np = None
 
-def parse_multipart(body_bytes, boundary):
-    """multipart/form-data をパース"""
-    if not boundary or not body_bytes:
-        return {}, {}
-    boundary = boundary.strip().strip('"').replace('\r', '')
-    sep = b'--' + boundary.encode('utf-8') if isinstance(boundary, str) else b'--' + boundary
-    parts = body_bytes.split(sep)
-    fields = {}
-    files = {}
-    for part in parts:
-        part = part.strip()
-        if not part or part == b'--' or part.endswith(b'--'):
-            continue
-        if b'\r\n\r\n' not in part:
-            continue
-        header_block, content = part.split(b'\r\n\r\n', 1)
-        # バイナリを壊さないよう、末尾の区切り CRLF のみ除去（WAV 内の \r\n は触らない）
-        if len(content) >= 2 and content[-2:] == b'\r\n':
-            content = content[:-2]
-        elif len(content) >= 1 and content[-1:] == b'\n':
-            content = content[:-1]
-        disp = None
-        for line in header_block.split(b'\r\n'):
-            if line.lower().startswith(b'content-disposition:'):
-                disp = line.decode('utf-8', errors='ignore')
-                break
-        if not disp:
-            continue
-        name = None
-        filename = None
-        for m in re.finditer(r'name="([^"]+)"', disp, re.I):
-            name = m.group(1)
-        for m in re.finditer(r'filename="([^"]*)"', disp, re.I):
-            filename = m.group(1)
-        if name is None:
-            continue
-        if filename:
-            files[name] = (filename, content)
-        else:
-            fields[name] = content.decode('utf-8', errors='replace') if isinstance(content, bytes) else content
-    return fields, files
-
-def extract_boundary(content_type):
-    """Content-Type 文字列から boundary を大小文字を保持したまま取り出す。"""
-    if not content_type:
-        return None
-    for part in content_type.split(';'):
-        p = part.strip()
-        if p.lower().startswith('boundary='):
-            return p[len('boundary='):].strip().strip('"').replace('\r', '')
-    return None
-
-def read_wav_bytes(data):
-    """WAV バイト列から (sample_rate, samples_float32)"""
-    if len(data) < 44:
-        raise ValueError('WAV too short')
-    if data[:4] != b'RIFF' or data[8:12] != b'WAVE':
-        raise ValueError('Not WAV')
-    pos = 12
-    sample_rate = 44100
-    raw = data
-    while pos < len(data) - 8:
-        chunk_id = data[pos:pos+4]
-        chunk_size = struct.unpack('<I', data[pos+4:pos+8])[0]
-        pos += 8
-        if chunk_id == b'fmt ' and chunk_size >= 16:
-            sample_rate = struct.unpack('<I', data[pos+4:pos+8])[0]
-        if chunk_id == b'data':
-            raw = data[pos:pos+chunk_size]
-            break
-        pos += chunk_size
-    n = len(raw) // 2
-    samples = struct.unpack('<%dh' % n, raw[:n*2])
-    return sample_rate, np.array(samples, dtype=np.float32) / 32768.0
-
-def wav_write_bytes(sample_rate, waveform):
-    """int16 波形を WAV バイト列で返す"""
-    buf = io.BytesIO()
-    n = len(waveform)
-    buf.write(b'RIFF')
-    buf.write(struct.pack('<I', 36 + n * 2))
-    buf.write(b'WAVE')
-    buf.write(b'fmt ')
-    buf.write(struct.pack('<IHHIIHH', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16))
-    buf.write(b'data')
-    buf.write(struct.pack('<I', n * 2))
-    buf.write(waveform.tobytes() if hasattr(waveform, 'tobytes') else struct.pack('<%dh' % n, *waveform))
-    return buf.getvalue()
+from multipart import extract_boundary, parse_multipart
+from pitch_shift import shift as pitch_shift, shift_semitones
+from timing import EXPOSE_HEADERS, request_timer
+from wav_codec import read_wav_bytes, wav_write_bytes
 
 def handler(event, context):
+    timer = request_timer('voice_convert')
+    response = _handle(event, timer)
+    response['headers'].update(timer.headers(response['statusCode']))
+    return response
+
+def _handle(event, timer):
     headers = {
         'Access-Control-Allow-Origin': '*',
         'Access-Control-Allow-Headers': 'Content-Type',
+        'Access-Control-Expose-Headers': EXPOSE_HEADERS,
         'Access-Control-Allow-Methods': 'POST, OPTIONS',
     }
     if event.get('httpMethod') == 'OPTIONS':
@@ -125,7 +46,9 @@ def handler(event, context):
 
     raw = event.get('body') or ''
     if event.get('isBase64Encoded'):
-        body_bytes = base64.b64decode(raw)
+        with timer.span('base64', bytes_in=len(raw)) as s:
+            body_bytes = base64.b64decode(raw)
+            s.bytes_out = len(body_bytes)
     else:
         body_bytes = raw.encode('utf-8') if isinstance(raw, str) else raw
 
@@ -139,7 +62,9 @@ def handler(event, context):
         }
     boundary = boundary.replace('\r', '').strip()
 
-    fields, files = parse_multipart(body_bytes, boundary)
+    with timer.span('multipart', bytes_in=len(body_bytes)) as s:
+        fields, files = parse_multipart(body_bytes, boundary)
+        s.bytes_out = sum(len(v[1]) for v in files.values())
     if 'audio' not in files:
         return {
             'statusCode': 400,
@@ -159,7 +84,9 @@ def handler(event, context):
         audio_bytes = audio_bytes.encode('latin-1')
 
     try:
-        sample_rate, audio_data = read_wav_bytes(audio_bytes)
+        with timer.span('decode', bytes_in=len(audio_bytes)) as s:
+            sample_rate, audio_data = read_wav_bytes(audio_bytes)
+            s.bytes_out = audio_data.nbytes
     except Exception as e:
         return {
             'statusCode': 400,
@@ -174,14 +101,26 @@ def handler(event, context):
             'body': json.dumps({'error': '音声データが空です。有効なWAVファイルを選んでください。'}, ensure_ascii=False)
         }
 
-    # 簡易ピッチシフト
-    shift_factor = 1.0 + (strength - 0.5) * 0.2
-    indices = np.round(np.arange(0, len(audio_data), shift_factor)).astype(np.int64)
-    indices = indices[indices < len(audio_data)]
-    converted = audio_data[indices]
-    converted = converted / (np.max(np.abs(converted)) + 1e-8) * 0.8
-    wav_samples = (converted * 32767).astype(np.int16)
-    wav_binary = wav_write_bytes(sample_rate, wav_samples)
+    # 長さを保ったピッチシフト（semitones がなければ strength を従来と同じ比に換算）
+    try:
+        with timer.span('dsp', bytes_in=audio_data.nbytes) as s:
+            semitones = shift_semitones(fields, strength)
+            converted = pitch_shift(audio_data, sample_rate, semitones, fields.get('mode') or 'wsola')
+            converted = converted / (np.max(np.abs(converted)) + 1e-8) * 0.8
+            s.bytes_out = converted.nbytes
+    except (TypeError, ValueError) as e:
+        return {
+            'statusCode': 400,
+            'headers': {**headers, 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False)
+        }
+    with timer.span('encode', bytes_in=converted.nbytes) as s:
+        wav_samples = (converted * 32767).astype(np.int16)
+        wav_binary = wav_write_bytes(sample_rate, wav_samples)
+        s.bytes_out = len(wav_binary)
+    with timer.span('base64', bytes_in=len(wav_binary)) as s:
+        body = base64.b64encode(wav_binary).decode('ascii')
+        s.bytes_out = len(body)
 
     return {
         'statusCode': 200,
@@ -190,6 +129,6 @@ def handler(event, context):
             'Content-Type': 'audio/wav',
             'Content-Disposition': 'inline; filename="converted_voice.wav"',
         },
-        'body': base64.b64encode(wav_binary).decode('ascii'),
+        'body': body,
         'isBase64Encoded': True,
     }
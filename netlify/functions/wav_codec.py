@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+WAV 読み書きの共通モジュール（f0_analyze / voice_convert / formant_synthesize / research_api から使う）。
+サンプルは memoryview 上の np.frombuffer で直接デコードし、書き出しは 1 つの bytearray に直接詰める。
+対応形式: PCM 8/16/24/32-bit, IEEE float32/64, WAVE_FORMAT_EXTENSIBLE, 多チャンネル。
+"""
+import struct
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+HEADER_SIZE = 44
+
+WavInfo = namedtuple('WavInfo', 'sample_rate channels bits format_tag data_offset n_frames')
+
+
+def parse_wav_header(data):
+    """RIFF チャンクを走査して WavInfo を返す。data は bytes / bytearray / memoryview。"""
+    mv = memoryview(data).cast('B')
+    size = len(mv)
+    if size < 12:
+        raise ValueError('WAV too short')
+    if bytes(mv[:4]) != b'RIFF' or bytes(mv[8:12]) != b'WAVE':
+        raise ValueError('Not WAV')
+    fmt = None
+    pos = 12
+    while pos + 8 <= size:
+        chunk_id = bytes(mv[pos:pos + 4])
+        chunk_size = struct.unpack_from('<I', mv, pos + 4)[0]
+        pos += 8
+        if chunk_id == b'fmt ':
+            if chunk_size < 16 or pos + 16 > size:
+                raise ValueError('Invalid fmt chunk')
+            format_tag, channels, sample_rate, _, _, bits = struct.unpack_from('<HHIIHH', mv, pos)
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40 and pos + 26 <= size:
+                # SubFormat GUID の先頭 2 バイトが実際のフォーマット
+                format_tag = struct.unpack_from('<H', mv, pos + 24)[0]
+            fmt = (sample_rate, channels, bits, format_tag)
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise ValueError('data chunk before fmt chunk')
+            sample_rate, channels, bits, format_tag = fmt
+            if channels < 1 or bits not in (8, 16, 24, 32, 64):
+                raise ValueError('Unsupported WAV format: %d ch, %d bit' % (channels, bits))
+            # 途中で切れたファイルは読める範囲だけ使う
+            available = min(chunk_size, size - pos)
+            n_frames = available // (channels * (bits // 8))
+            return WavInfo(sample_rate, channels, bits, format_tag, pos, n_frames)
+        # チャンクは 2 バイト境界に揃えられる
+        pos += chunk_size + (chunk_size & 1)
+    raise ValueError('data chunk not found')
+
+
+def _sample_dtype(info):
+    if info.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        if info.bits == 32:
+            return np.dtype('<f4')
+        if info.bits == 64:
+            return np.dtype('<f8')
+    elif info.format_tag == WAVE_FORMAT_PCM:
+        if info.bits == 8:
+            return np.dtype('u1')
+        if info.bits == 16:
+            return np.dtype('<i2')
+        if info.bits == 32:
+            return np.dtype('<i4')
+        if info.bits == 24:
+            return None
+    raise ValueError('Unsupported WAV format tag %d (%d bit)' % (info.format_tag, info.bits))
+
+
+def decode_wav(data, mono=False):
+    """WAV バイト列から (sample_rate, samples) を返す。samples は [-1, 1) の float32 で形状 (n, channels)。
+    mono=True なら先頭チャンネルのみを 1 次元で返す（従来の research_api と同じ扱い）。"""
+    info = parse_wav_header(data)
+    mv = memoryview(data).cast('B')
+    n, ch = info.n_frames, info.channels
+    dtype = _sample_dtype(info)
+    if dtype is None:
+        # 24-bit: 3 バイト組を int32 の上位 24 ビットに詰めてから正規化
+        raw = np.frombuffer(mv, dtype=np.uint8, count=n * ch * 3, offset=info.data_offset).reshape(n, ch, 3)
+        if mono:
+            raw = raw[:, :1]
+        out = (raw[..., 0].astype(np.int32) << 8) | (raw[..., 1].astype(np.int32) << 16) | (raw[..., 2].astype(np.int32) << 24)
+        samples = out.astype(np.float32)
+        samples *= 1.0 / 2147483648.0
+    else:
+        raw = np.frombuffer(mv, dtype=dtype, count=n * ch, offset=info.data_offset).reshape(n, ch)
+        if mono:
+            raw = raw[:, :1]
+        samples = raw.astype(np.float32)
+        if dtype.kind == 'u':
+            samples -= 128.0
+            samples *= 1.0 / 128.0
+        elif dtype.kind == 'i':
+            samples *= 1.0 / float(1 << (dtype.itemsize * 8 - 1))
+    if mono:
+        return info.sample_rate, samples.reshape(-1)
+    return info.sample_rate, samples
+
+
+def read_wav_bytes(data):
+    """WAV バイト列から (sample_rate, samples_float32) を返す。多チャンネルは先頭チャンネルを使う。"""
+    return decode_wav(data, mono=True)
+
+
+def encode_wav(sample_rate, samples):
+    """サンプル配列を WAV の bytearray にする。中間バッファなしでヘッダとデータを 1 回で詰める。
+    dtype で形式を決める: int16 / int32 / uint8 は PCM、float32 は IEEE float。2 次元なら (n, channels)。"""
+    samples = np.asarray(samples)
+    if samples.dtype not in (np.int16, np.int32, np.uint8, np.float32):
+        raise ValueError('Unsupported sample dtype: %s' % samples.dtype)
+    channels = 1 if samples.ndim == 1 else samples.shape[1]
+    width = samples.dtype.itemsize
+    format_tag = WAVE_FORMAT_IEEE_FLOAT if samples.dtype == np.float32 else WAVE_FORMAT_PCM
+    data_size = samples.size * width
+    buf = bytearray(HEADER_SIZE + data_size + (data_size & 1))
+    struct.pack_into('<4sI4s4sIHHIIHH4sI', buf, 0,
+                     b'RIFF', len(buf) - 8, b'WAVE',
+                     b'fmt ', 16, format_tag, channels, sample_rate,
+                     sample_rate * channels * width, channels * width, width * 8,
+                     b'data', data_size)
+    dst = np.frombuffer(buf, dtype=samples.dtype.newbyteorder('<'), count=samples.size, offset=HEADER_SIZE)
+    dst[:] = samples.reshape(-1)
+    return buf
+
+
+def wav_write_bytes(sample_rate, waveform):
+    """int16 波形を WAV バイト列で返す"""
+    return encode_wav(sample_rate, np.asarray(waveform, dtype=np.int16))
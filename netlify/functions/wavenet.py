@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+WaveNet の拡張因果畳み込みスタック（research_api の /api/wavenet/generate から使う）。
+
+構成（van den Oord et al. 2016 のゲート付き残差ブロック）:
+  h = w_in · x + b_in                                   入力 1ch -> res_channels
+  各層（拡張 d）: z = Σ_k W_k · h[t - k·d] + b          カーネル幅 K の因果畳み込み -> 2·res_channels
+                 u = tanh(z_f) ⊙ σ(z_g)
+                 h += W_res · u,  skip += W_skip · u    （W_res と W_skip は 1 枚の行列で一度に）
+  y = tanh(w_out2 · relu(W_out1 · relu(skip) + b_out1) + b_out2)
+重みは乱数（seed, fan-in で正規化, バイアス 0 なので無音は無音のまま）か、npz から読む（load）。
+
+計算はサンプル方向にまとめて行う: 各タップ k の入力 h[t - k·d] をブロック (channels, T) として並べ、
+層ごとに K 回の行列積にする。ブロック境界をまたぐ過去の値は、層ごとに直近 (K - 1)·d サンプルを持つ
+循環バッファ（_Ring）から読む。WaveNetStream.process() にどんな大きさのブロック（1 サンプルでも）を
+続けて渡しても、全体を一度に処理したのと同じ出力になる。generate() は BLOCK_SAMPLES ずつの同じ処理。
+"""
+import zipfile
+import zlib
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+KERNEL_SIZE = 2
+MAX_KERNEL_SIZE = 8
+MAX_CHANNELS = 512
+MAX_LAYERS = 40
+MAX_DILATION = 1 << 14
+# generate() が一度に処理するサンプル数
+BLOCK_SAMPLES = 4096
+CACHE_SIZE = 4
+DTYPE = np.float32 if np is not None else None
+
+
+def _check_sizes(res_channels, skip_channels, kernel_size):
+    if not (1 <= res_channels <= MAX_CHANNELS and 1 <= skip_channels <= MAX_CHANNELS):
+        raise ValueError('channels must be between 1 and %d' % MAX_CHANNELS)
+    if not 1 <= kernel_size <= MAX_KERNEL_SIZE:
+        raise ValueError('kernel_size must be between 1 and %d' % MAX_KERNEL_SIZE)
+
+
+def _sigmoid(z):
+    return 0.5 + 0.5 * np.tanh(0.5 * z)
+
+
+class _Ring(object):
+    """(channels, length) の循環バッファ。直近 length サンプルの層の入力を持つ（pos が最も古い列）"""
+
+    def __init__(self, channels, length):
+        self.length = length
+        self.buf = np.zeros((channels, length), dtype=DTYPE)
+        self.pos = 0
+
+    def tap(self, h, offset):
+        """h[:, t - offset]（t = 0..T-1）。ブロックより前の分はバッファから"""
+        T = h.shape[1]
+        out = np.empty_like(h)
+        n_hist = min(offset, T)
+        idx = (self.pos + self.length - offset + np.arange(n_hist)) % self.length
+        out[:, :n_hist] = self.buf[:, idx]
+        out[:, n_hist:] = h[:, :T - n_hist]
+        return out
+
+    def push(self, h):
+        T = h.shape[1]
+        if T >= self.length:
+            self.buf[:] = h[:, T - self.length:]
+            self.pos = 0
+        else:
+            self.buf[:, (self.pos + np.arange(T)) % self.length] = h
+            self.pos = (self.pos + T) % self.length
+
+
+class WaveNet(object):
+    """重みを持つネットワーク。入力は変えない（状態は WaveNetStream が持つ）。"""
+
+    def __init__(self, dilations, weights):
+        self.dilations = [int(d) for d in dilations]
+        if not 1 <= len(self.dilations) <= MAX_LAYERS:
+            raise ValueError('dilation_rates must have 1 to %d layers' % MAX_LAYERS)
+        if any(not 1 <= d <= MAX_DILATION for d in self.dilations):
+            raise ValueError('dilation rates must be between 1 and %d' % MAX_DILATION)
+        w = {k: np.asarray(v, dtype=DTYPE) for k, v in weights.items() if k != 'dilations'}
+        try:
+            L, K, C2, C = w['conv_w'].shape
+            S = w['out1_w'].shape[0]
+            shapes = {'input_w': (C,), 'input_b': (C,), 'conv_b': (L, C2), 'res_skip_w': (L, C + S, C),
+                      'res_skip_b': (L, C + S), 'out1_w': (S, S), 'out1_b': (S,), 'out2_w': (S,), 'out2_b': ()}
+            bad = [k for k, shape in shapes.items() if w[k].shape != shape]
+        except (KeyError, ValueError) as e:
+            raise ValueError('invalid WaveNet weights (%s)' % e)
+        if bad or C2 != 2 * C or L != len(self.dilations):
+            raise ValueError('invalid WaveNet weights (shape mismatch: %s)' % ', '.join(bad or ['conv_w']))
+        _check_sizes(C, S, K)
+        self.kernel_size, self.res_channels, self.skip_channels = K, C, S
+        self.w = w
+
+    @classmethod
+    def random(cls, dilations, res_channels=64, skip_channels=64, kernel_size=KERNEL_SIZE, seed=0):
+        C, S, K, L = int(res_channels), int(skip_channels), int(kernel_size), len(dilations)
+        # 重みを作る前に（__init__ でも同じ検査をする）
+        _check_sizes(C, S, K)
+        rng = np.random.default_rng(seed)
+
+        def init(shape, fan_in):
+            return rng.standard_normal(shape) / np.sqrt(fan_in)
+
+        weights = {
+            'input_w': init((C,), 1), 'input_b': np.zeros(C),
+            'conv_w': init((L, K, 2 * C, C), K * C), 'conv_b': np.zeros((L, 2 * C)),
+            'res_skip_w': init((L, C + S, C), C), 'res_skip_b': np.zeros((L, C + S)),
+            'out1_w': init((S, S), S), 'out1_b': np.zeros(S),
+            'out2_w': init((S,), S), 'out2_b': np.zeros(()),
+        }
+        return cls(dilations, weights)
+
+    @classmethod
+    def load(cls, f):
+        """npz（パスかファイル）から。キーは random() の重みと同じ名前＋ dilations。読めなければ ValueError"""
+        try:
+            data = np.load(f, allow_pickle=False)
+        except (OSError, ValueError, EOFError, zipfile.BadZipFile) as e:
+            raise ValueError('cannot read WaveNet weights (%s)' % e)
+        if not isinstance(data, np.lib.npyio.NpzFile):
+            raise ValueError('WaveNet weights must be an npz archive (np.savez), not a single array')
+        try:
+            with data:
+                weights = {k: data[k] for k in data.files}
+        except (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile, zlib.error) as e:
+            raise ValueError('cannot read WaveNet weights (%s)' % e)
+        if 'dilations' not in weights:
+            raise ValueError('invalid WaveNet weights (dilations missing)')
+        return cls(weights['dilations'].tolist(), weights)
+
+    def save(self, f):
+        np.savez(f, dilations=np.asarray(self.dilations), **self.w)
+
+    @property
+    def receptive_field(self):
+        return (self.kernel_size - 1) * sum(self.dilations) + 1
+
+    def stream(self):
+        return WaveNetStream(self)
+
+    def generate(self, audio_data, block=BLOCK_SAMPLES):
+        """全体を BLOCK_SAMPLES ずつ処理した出力（長さは入力と同じ, float32）"""
+        x = np.asarray(audio_data)
+        out = np.empty(len(x), dtype=DTYPE)
+        stream = self.stream()
+        for s in range(0, len(x), block):
+            out[s:s + block] = stream.process(x[s:s + block])
+        return out
+
+
+class WaveNetStream(object):
+    """層ごとの循環バッファを持ち、ブロックを続けて処理する"""
+
+    def __init__(self, net):
+        self.net = net
+        K, C = net.kernel_size, net.res_channels
+        self.rings = [_Ring(C, (K - 1) * d) if K > 1 else None for d in net.dilations]
+
+    def process(self, block):
+        net, w = self.net, self.net.w
+        C, K = net.res_channels, net.kernel_size
+        x = np.asarray(block, dtype=DTYPE)
+        h = np.outer(w['input_w'], x)
+        h += w['input_b'][:, None]
+        skip = np.zeros((net.skip_channels, len(x)), dtype=DTYPE)
+        for l, (d, ring) in enumerate(zip(net.dilations, self.rings)):
+            conv = w['conv_w'][l]
+            z = conv[0] @ h
+            for k in range(1, K):
+                z += conv[k] @ ring.tap(h, k * d)
+            z += w['conv_b'][l][:, None]
+            if ring is not None:
+                ring.push(h)
+            u = np.tanh(z[:C])
+            u *= _sigmoid(z[C:])
+            rs = w['res_skip_w'][l] @ u
+            rs += w['res_skip_b'][l][:, None]
+            h = h + rs[:C]
+            skip += rs[C:]
+        np.maximum(skip, 0, out=skip)
+        y = w['out1_w'] @ skip
+        y += w['out1_b'][:, None]
+        np.maximum(y, 0, out=y)
+        return np.tanh(w['out2_w'] @ y + w['out2_b'])
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def random_wavenet(dilations, res_channels, skip_channels, kernel_size=KERNEL_SIZE, seed=0):
+    """乱数の重みのネットワーク（同じ構成・seed は使い回す）。dilations は tuple"""
+    return WaveNet.random(list(dilations), res_channels, skip_channels, kernel_size, seed)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+帯域制限ウェーブテーブルによる倍音オシレータの共通モジュール（klatt から使う）。
+
+1 周期 Σ_{h=1..H} h^-rolloff sin(2π h φ) を TABLE_SIZE 点のテーブルに irfft 一回で作り、
+位相の累積（F0 の軌跡をサンプルごとに積分）と線形補間で読み出す。読み出しの計算量は倍音数 H によらない。
+エイリアシングを防ぐため、F0 をオクターブ帯域に分け、帯域ごとに
+「帯域の上端の F0 でも cutoff（既定は Nyquist の ANTIALIAS_RATIO 倍）を超えない倍音数」に絞ったテーブルを持つ（ミップマップ）。
+テーブルは (倍音数, rolloff, サンプリング周波数, cutoff) ごとに LRU キャッシュする。
+"""
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TABLE_SIZE = 4096
+# 最も低い帯域の下端（これより低い F0 は最初の帯域のテーブルで鳴らす）
+F0_MIN = 20.0
+# cutoff を指定しないときの Nyquist に対する比
+ANTIALIAS_RATIO = 0.9
+CACHE_SIZE = 32
+# render() が一度に処理するサンプル数（作業領域の大きさ）
+CHUNK = 1 << 16
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def wavetable(n_harmonics, rolloff=1.0):
+    """1 周期のテーブル (TABLE_SIZE + 1,)。末尾は補間用に先頭を繰り返す。キャッシュを返すので書き換えないこと。"""
+    n_harmonics = min(int(n_harmonics), TABLE_SIZE // 2 - 1)
+    spec = np.zeros(TABLE_SIZE // 2 + 1, dtype=np.complex128)
+    h = np.arange(1, n_harmonics + 1, dtype=np.float64)
+    # sin の係数は rFFT で -i·N/2
+    spec[1:n_harmonics + 1] = -0.5j * TABLE_SIZE * h ** -float(rolloff)
+    table = np.empty(TABLE_SIZE + 1)
+    table[:TABLE_SIZE] = np.fft.irfft(spec, n=TABLE_SIZE)
+    table[TABLE_SIZE] = table[0]
+    table.setflags(write=False)
+    return table
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def mipmap(n_harmonics, rolloff, sample_rate, cutoff=None):
+    """オクターブ帯域ごとのテーブル (帯域数, TABLE_SIZE + 1)。帯域 b は F0 ∈ [F0_MIN·2^b, F0_MIN·2^(b+1))。"""
+    cutoff = ANTIALIAS_RATIO * sample_rate / 2.0 if cutoff is None else min(float(cutoff), sample_rate / 2.0)
+    tables = []
+    top = F0_MIN * 2.0
+    while True:
+        n = min(int(n_harmonics), int(cutoff // top))
+        tables.append(wavetable(max(n, 1), rolloff))
+        if n <= 1:
+            break
+        top *= 2.0
+    out = np.vstack(tables)
+    out.setflags(write=False)
+    return out
+
+
+class Oscillator(object):
+    """帯域制限した倍音列のオシレータ。render() を続けて呼ぶと位相が途切れずにつながる。"""
+
+    def __init__(self, sample_rate, n_harmonics=10, rolloff=1.0, cutoff=None):
+        if int(n_harmonics) < 1:
+            raise ValueError('n_harmonics must be positive')
+        self.sample_rate = float(sample_rate)
+        self.tables = mipmap(int(n_harmonics), float(rolloff), int(sample_rate), cutoff)
+        self.phase = 0.0
+
+    def render(self, f0):
+        """F0 の軌跡 f0（サンプルごと, Hz）の長さだけ波形を返す。作業領域は CHUNK サンプル分だけ。"""
+        f0 = np.asarray(f0, dtype=np.float64)
+        out = np.empty(len(f0))
+        for s in range(0, len(f0), CHUNK):
+            self._render(f0[s:s + CHUNK], out[s:s + CHUNK])
+        return out
+
+    def _render(self, f0, out):
+        cycle = np.cumsum(f0)
+        cycle *= 1.0 / self.sample_rate
+        cycle += self.phase
+        self.phase = float(cycle[-1] % 1.0)
+        pos = np.remainder(cycle, 1.0, out=cycle)
+        pos *= TABLE_SIZE
+        i = pos.astype(np.intp)
+        frac = np.subtract(pos, i, out=pos)
+        band = np.maximum(f0, F0_MIN)
+        band *= 1.0 / F0_MIN
+        np.log2(band, out=band)
+        i += np.minimum(band.astype(np.intp), len(self.tables) - 1) * (TABLE_SIZE + 1)
+        flat = self.tables.reshape(-1)
+        lo = flat[i]
+        np.take(flat, i + 1, out=out)
+        out -= lo
+        out *= frac
+        out += lo
@@ -121,14 +121,11 @@ async function synthesizeFormant() {
     
     // サーバー側APIを使用する場合
     try {
-        const response = await fetch(`${API_BASE}/formant/synthesize`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ f0, f1, f2, f3, b1, b2, duration: 1.0 })
-        });
+        // 同じパラメータなら 304 で手元の結果を使う（fetchRendered は research_advanced.js）
+        const response = await fetchRendered('/formant/synthesize', { f0, f1, f2, f3, b1, b2, duration: 1.0 });
         
         if (response.ok) {
-            const blob = await response.blob();
+            const blob = response.blob;
             const arrayBuffer = await blob.arrayBuffer();
             initAudioContext();
             const audioBuffer = await audioContext.decodeAudioData(arrayBuffer);
@@ -468,6 +465,11 @@ async function analyzeSpectrum() {
         formData.append('audio', blob);
         formData.append('fft_size', document.getElementById('fft-size').value);
         formData.append('window_type', document.getElementById('window-type').value);
+        // 描画先のピクセル数までサーバー側で間引き、uint8 の dB をフレーム順に受け取りながら描く
+        const canvas = document.getElementById('spectrogram');
+        formData.append('format', 'u8');
+        formData.append('max_frames', Math.max(1, canvas.offsetWidth * 2));
+        formData.append('max_bins', 300 * 2);
         
         const apiResponse = await fetch(`${API_BASE}/spectrum/analyze`, {
             method: 'POST',
@@ -475,9 +477,7 @@ async function analyzeSpectrum() {
         });
         
         if (apiResponse.ok) {
-            const data = await apiResponse.json();
-            drawSpectrogramFromAPI(data);
-            drawPowerSpectrumFromAPI(data);
+            await drawSpectrogramStream(apiResponse, 'spectrogram', 'power-spectrum');
             return;
         }
     } catch (error) {
@@ -637,6 +637,189 @@ function drawPowerSpectrumFromAPI(data) {
     drawGrid(ctx, width, height);
 }
 
+// ========== バイナリのスペクトログラム（SPG1 形式） ==========
+// research_api の format=u8 / f16。ヘッダ 56 バイト + ビンの周波数 float32 × nBins、以降フレーム順に nBins 個ずつの dB 値
+
+const SPG_HEADER_SIZE = 56;
+let spgFloat16Table = null;
+let spgPalette = null;
+
+function parseSpectrogramHeader(bytes) {
+    const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+    if (String.fromCharCode(bytes[0], bytes[1], bytes[2], bytes[3]) !== 'SPG1') {
+        throw new Error('不正なスペクトログラム形式です');
+    }
+    const nBins = view.getUint32(12, true);
+    const frequencies = new Float32Array(nBins);
+    for (let i = 0; i < nBins; i++) {
+        frequencies[i] = view.getFloat32(SPG_HEADER_SIZE + 4 * i, true);
+    }
+    return {
+        type: bytes[4],  // 1 = float16, 2 = uint8
+        bytesPerValue: bytes[4] === 1 ? 2 : 1,
+        nFrames: view.getUint32(8, true),
+        nBins,
+        sampleRate: view.getFloat64(16, true),
+        t0: view.getFloat64(24, true),
+        dt: view.getFloat64(32, true),
+        dbMin: view.getFloat64(40, true),
+        dbMax: view.getFloat64(48, true),
+        frequencies,
+        size: SPG_HEADER_SIZE + 4 * nBins
+    };
+}
+
+function float16Table() {
+    if (!spgFloat16Table) {
+        spgFloat16Table = new Float32Array(65536);
+        for (let h = 0; h < 65536; h++) {
+            const sign = h & 0x8000 ? -1 : 1;
+            const exp = (h >> 10) & 0x1f;
+            const frac = h & 0x3ff;
+            if (exp === 0) spgFloat16Table[h] = sign * Math.pow(2, -14) * (frac / 1024);
+            else if (exp === 31) spgFloat16Table[h] = frac ? NaN : sign * Infinity;
+            else spgFloat16Table[h] = sign * Math.pow(2, exp - 15) * (1 + frac / 1024);
+        }
+    }
+    return spgFloat16Table;
+}
+
+function decodeSpectrogramFrames(header, bytes) {
+    // dB 値（フレーム順）の Float32Array
+    const n = bytes.length / header.bytesPerValue;
+    const out = new Float32Array(n);
+    if (header.type === 1) {
+        const table = float16Table();
+        const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+        for (let i = 0; i < n; i++) out[i] = table[view.getUint16(2 * i, true)];
+    } else {
+        const step = (header.dbMax - header.dbMin) / 255;
+        for (let i = 0; i < n; i++) out[i] = header.dbMin + bytes[i] * step;
+    }
+    return out;
+}
+
+async function readSpectrogramStream(response, onFrames) {
+    // チャンクが届くたびに、そろったフレームだけ onFrames(header, 先頭フレーム番号, dB 値) に渡す
+    const reader = response.body.getReader();
+    let pending = new Uint8Array(0);
+    let header = null;
+    let frame = 0;
+    for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        const merged = new Uint8Array(pending.length + value.length);
+        merged.set(pending);
+        merged.set(value, pending.length);
+        pending = merged;
+        if (!header) {
+            if (pending.length < SPG_HEADER_SIZE) continue;
+            const nBins = new DataView(pending.buffer).getUint32(12, true);
+            if (pending.length < SPG_HEADER_SIZE + 4 * nBins) continue;
+            header = parseSpectrogramHeader(pending);
+            pending = pending.slice(header.size);
+        }
+        const frameBytes = header.nBins * header.bytesPerValue;
+        const count = frameBytes > 0 ? Math.floor(pending.length / frameBytes) : 0;
+        if (count > 0) {
+            onFrames(header, frame, decodeSpectrogramFrames(header, pending.subarray(0, count * frameBytes)));
+            frame += count;
+            pending = pending.slice(count * frameBytes);
+        }
+    }
+    if (!header) throw new Error('スペクトログラムが空です');
+    return header;
+}
+
+function spectrogramPalette() {
+    // 従来の hsl(240 - 180·i, 100%, 50 + 30·i %) を 256 段の RGB にしておく
+    if (!spgPalette) {
+        spgPalette = new Uint8ClampedArray(256 * 3);
+        for (let i = 0; i < 256; i++) {
+            const t = i / 255;
+            const h = (240 - t * 180) / 360;
+            const l = (50 + t * 30) / 100;
+            const q = l < 0.5 ? 2 * l : 1;  // 彩度 100%
+            const p = 2 * l - q;
+            const channel = (x) => {
+                x = (x + 1) % 1;
+                if (x < 1 / 6) return p + (q - p) * 6 * x;
+                if (x < 1 / 2) return q;
+                if (x < 2 / 3) return p + (q - p) * (2 / 3 - x) * 6;
+                return p;
+            };
+            spgPalette[3 * i] = channel(h + 1 / 3) * 255;
+            spgPalette[3 * i + 1] = channel(h) * 255;
+            spgPalette[3 * i + 2] = channel(h - 1 / 3) * 255;
+        }
+    }
+    return spgPalette;
+}
+
+async function drawSpectrogramStream(response, canvasId, powerCanvasId) {
+    const canvas = document.getElementById(canvasId);
+    const ctx = canvas.getContext('2d');
+    const width = canvas.width = canvas.offsetWidth * 2;
+    const height = canvas.height = 300 * 2;
+    ctx.fillStyle = '#000';
+    ctx.fillRect(0, 0, width, height);
+    const palette = spectrogramPalette();
+    
+    return readSpectrogramStream(response, (header, first, values) => {
+        const count = values.length / header.nBins;
+        const x0 = Math.floor(first * width / header.nFrames);
+        const x1 = Math.floor((first + count) * width / header.nFrames);
+        if (x1 <= x0) return;
+        const image = ctx.createImageData(x1 - x0, height);
+        const range = header.dbMax - header.dbMin;
+        for (let x = x0; x < x1; x++) {
+            const frame = Math.min(count - 1, Math.floor(x * header.nFrames / width) - first);
+            for (let y = 0; y < height; y++) {
+                const bin = Math.min(header.nBins - 1, Math.floor((height - 1 - y) * header.nBins / height));
+                const level = Math.round(Math.min(Math.max((values[frame * header.nBins + bin] - header.dbMin) / range, 0), 1) * 255);
+                const o = 4 * (y * (x1 - x0) + (x - x0));
+                image.data[o] = palette[3 * level];
+                image.data[o + 1] = palette[3 * level + 1];
+                image.data[o + 2] = palette[3 * level + 2];
+                image.data[o + 3] = 255;
+            }
+        }
+        ctx.putImageData(image, x0, 0);
+        if (first === 0 && powerCanvasId) {
+            drawPowerSpectrumFromFrame(header, values.subarray(0, header.nBins), powerCanvasId);
+        }
+    });
+}
+
+function drawPowerSpectrumFromFrame(header, dbValues, canvasId) {
+    // 先頭フレームの dB スペクトル
+    const canvas = document.getElementById(canvasId);
+    const ctx = canvas.getContext('2d');
+    const width = canvas.width = canvas.offsetWidth * 2;
+    const height = canvas.height = 300 * 2;
+    
+    ctx.fillStyle = '#000';
+    ctx.fillRect(0, 0, width, height);
+    
+    const maxFreq = header.frequencies[header.nBins - 1] || 1;
+    const range = header.dbMax - header.dbMin;
+    
+    ctx.strokeStyle = '#00ff88';
+    ctx.lineWidth = 2;
+    ctx.beginPath();
+    
+    for (let i = 0; i < header.nBins; i++) {
+        const x = (header.frequencies[i] / maxFreq) * width;
+        const y = height - ((dbValues[i] - header.dbMin) / range) * height;
+        
+        if (i === 0) ctx.moveTo(x, y);
+        else ctx.lineTo(x, y);
+    }
+    
+    ctx.stroke();
+    drawGrid(ctx, width, height);
+}
+
 // ========== Neural TTS ==========
 
 async function synthesizeTTS() {
@@ -650,14 +833,10 @@ async function synthesizeTTS() {
     const rate = parseFloat(document.getElementById('speech-rate').value);
     
     try {
-        const response = await fetch(`${API_BASE}/tts/synthesize`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ text, speaker, rate })
-        });
+        const response = await fetchRendered('/tts/synthesize', { text, speaker, rate });
         
         if (response.ok) {
-            const blob = await response.blob();
+            const blob = response.blob;
             const url = URL.createObjectURL(blob);
             document.getElementById('tts-audio').src = url;
             drawMelSpectrogram();
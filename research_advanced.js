@@ -26,6 +26,38 @@ if (typeof window.API_BASE === 'undefined') {
 }
 var API_BASE = window.API_BASE;
 
+// 合成 API（formant / tts / vits）の応答を本文ごとに覚えておき、同じ本文なら If-None-Match を付けて送る。
+// サーバーは正規化したパラメータのハッシュを ETag にしているので、一致すれば 304 だけが返り手元の Blob を使い回す
+const RENDER_CACHE_LIMIT = 32;
+if (typeof window.renderCache === 'undefined') {
+    window.renderCache = new Map();
+}
+
+async function fetchRendered(path, payload) {
+    const body = JSON.stringify(payload);
+    const key = path + '\n' + body;
+    const cached = window.renderCache.get(key);
+    const headers = { 'Content-Type': 'application/json' };
+    if (cached) headers['If-None-Match'] = cached.etag;
+    const response = await fetch(`${API_BASE}${path}`, { method: 'POST', headers, body });
+    if (response.status === 304 && cached) {
+        window.renderCache.delete(key);
+        window.renderCache.set(key, cached);
+        return { ok: true, blob: cached.blob };
+    }
+    if (!response.ok) return { ok: false, response };
+    const blob = await response.blob();
+    const etag = response.headers.get('ETag');
+    if (etag) {
+        window.renderCache.delete(key);
+        window.renderCache.set(key, { etag, blob });
+        while (window.renderCache.size > RENDER_CACHE_LIMIT) {
+            window.renderCache.delete(window.renderCache.keys().next().value);
+        }
+    }
+    return { ok: true, blob };
+}
+
 // Initialize Audio Context
 function initAudioContext() {
     if (!window.audioContext) {
@@ -231,6 +263,7 @@ async function convertCycleGAN() {
             logExperiment('CycleGAN-VC', {
                 lambda_cyc: lambdaCyc,
                 lambda_id: lambdaId,
+                realtime_factor: parseFloat(response.headers.get('X-Realtime-Factor')) || null,
                 source_file: document.getElementById('cyclegan-source')?.files[0]?.name || 'unknown'
             });
             
@@ -473,6 +506,8 @@ function applyStarGANTransform(buffer) {
 
 var autovcSourceBuffer = null;
 var autovcTargetBuffer = null;
+// サーバーに登録済みの目標話者の統計の ID（同じ目標なら 2 回目からファイルを送らない）
+var autovcTargetId = null;
 
 function loadAutoVCSource() {
     const file = document.getElementById('autovc-source').files[0];
@@ -492,6 +527,7 @@ function loadAutoVCTarget() {
         document.getElementById('autovc-target-audio').src = url;
         loadAudioBuffer(file).then(buffer => {
             autovcTargetBuffer = buffer;
+            autovcTargetId = null;
         });
     }
 }
@@ -517,19 +553,30 @@ async function convertAutoVC() {
     
     try {
         const sourceBlob = await audioBufferToBlob(autovcSourceBuffer);
-        const targetBlob = await audioBufferToBlob(autovcTargetBuffer);
-        const formData = new FormData();
-        formData.append('source', sourceBlob);
-        formData.append('target', targetBlob);
-        formData.append('content_dim', contentDim);
-        formData.append('speaker_dim', speakerDim);
+        const send = async (useId) => {
+            const formData = new FormData();
+            formData.append('source', sourceBlob);
+            if (useId) {
+                formData.append('target_id', autovcTargetId);
+            } else {
+                formData.append('target', await audioBufferToBlob(autovcTargetBuffer));
+            }
+            formData.append('content_dim', contentDim);
+            formData.append('speaker_dim', speakerDim);
+            return fetch(`${API_BASE}/autovc/convert`, {
+                method: 'POST',
+                body: formData
+            });
+        };
         
-        const response = await fetch(`${API_BASE}/autovc/convert`, {
-            method: 'POST',
-            body: formData
-        });
+        let response = await send(!!autovcTargetId);
+        if (response.status === 404 && autovcTargetId) {
+            // サーバー側のキャッシュから消えていたらファイルを送り直す
+            response = await send(false);
+        }
         
         if (response.ok) {
+            autovcTargetId = response.headers.get('X-Target-Id') || autovcTargetId;
             const blob = await response.blob();
             const url = URL.createObjectURL(blob);
             document.getElementById('autovc-output-audio').src = url;
@@ -614,20 +661,16 @@ async function synthesizeVITS() {
     const noiseScale = parseFloat(document.getElementById('noise-scale').value);
     
     try {
-        const response = await fetch(`${API_BASE}/vits/synthesize`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                text,
-                speaker,
-                lambda_kl: lambdaKl,
-                lambda_adv: lambdaAdv,
-                noise_scale: noiseScale
-            })
+        const response = await fetchRendered('/vits/synthesize', {
+            text,
+            speaker,
+            lambda_kl: lambdaKl,
+            lambda_adv: lambdaAdv,
+            noise_scale: noiseScale
         });
         
         if (response.ok) {
-            const blob = await response.blob();
+            const blob = response.blob;
             const url = URL.createObjectURL(blob);
             document.getElementById('vits-output-audio').src = url;
             
@@ -779,6 +822,9 @@ async function performAnalysis() {
         formData.append('fft_size', fftSize);
         formData.append('window_type', windowType);
         formData.append('lpc_order', lpcOrder);
+        // 描画先のピクセル数までサーバー側で間引く
+        formData.append('max_frames', Math.max(1, document.getElementById('analysis-spectrogram').offsetWidth * 2));
+        formData.append('max_bins', 300 * 2);
         
         const response = await fetch(`${API_BASE}/analysis/spectral`, {
             method: 'POST',
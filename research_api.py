@@ -5,83 +5,150 @@
 音声処理とNeural TTS用のAPIエンドポイント
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 import numpy as np
-import scipy.io.wavfile as wavfile
-import scipy.signal as signal
 from scipy.fft import fft, fftfreq
-import io
 import base64
 from datetime import datetime
+import io
 import json
+import os
+import sys
+import time
+
+# Netlify Functions と共通の処理モジュール（netlify/functions/*.py）を読み込む
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'netlify', 'functions'))
+from bregman import PAIRWISE_MAX_CELLS, as_points, kmeans as bregman_kmeans, kmeans_pp as bregman_kmeans_pp, pairwise as bregman_pairwise
+from bregman import bregman_div, chord_gap_div, jensen_bregman_div, skew_jensen_centroid, skew_jensen_div
+from cepstral_vc import convert as cepstral_convert
+from multipart import extract_boundary, parse_multipart_stream
+from klatt import FormantSynth, synth_params as formant_synth_params
+from lpc import analyze as lpc_analyze, lpc_coefficients
+from mfcc import iter_mfcc
+from pitch import estimate_f0_batch
+from pitch_shift import shift as pitch_shift, shift_semitones
+from render_cache import RenderCache, etag_matches, render_etag, render_key
+from speaker_profile import convert as speaker_convert, list_profiles, load_profile, speaker_names
+from speaker_stats import StatsStore, convert as speaker_stats_convert, summary as speaker_stats_summary
+from spectrogram import DB_RANGE, FORMATS as SPECTROGRAM_FORMATS, Spectrogram
+from timing import EXPOSE_HEADERS as TIMING_EXPOSE_HEADERS, NULL_TIMER, request_timer
+from wav_codec import encode_wav, read_wav_bytes
+from wavenet import WaveNet, random_wavenet
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-LPC-Coefficients', 'ETag', 'X-Render-Cache', 'X-Realtime-Factor', 'X-F0-Shift',
+                          'X-Target-Id', 'X-Target-Cache', TIMING_EXPOSE_HEADERS])
+
+# アップロードを request.stream から読むときのチャンクサイズ
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# MFCC を計算するときに一度に渡すサンプル数
+MFCC_CHUNK_SAMPLES = 1 << 18
+
+@app.before_request
+def _start_timer():
+    g.timer = request_timer(request.endpoint or request.path)
+
+@app.after_request
+def _timing_headers(response):
+    # ストリーミングのレスポンスは本文を生成する前に確定するので、その分の処理は含まれない
+    response.headers.update(g.get('timer', NULL_TIMER).headers(response.status_code))
+    return response
+
+def _span(stage, bytes_in=None):
+    """このリクエストの計測の段階（timing.RequestTimer.span）"""
+    return g.get('timer', NULL_TIMER).span(stage, bytes_in)
+
+def _multipart_upload():
+    """multipart/form-data を request.stream から逐次パースし (form, files) を返す。
+    Werkzeug のフォームパーサを通さないので、WAV はパート本文のバッファから直接デコードできる。
+    files[name] = (filename, memoryview)。同じリクエスト内では結果を使い回す。"""
+    if 'multipart' not in g:
+        boundary = extract_boundary(request.content_type)
+        chunks = iter(lambda: request.stream.read(UPLOAD_CHUNK_SIZE), b'')
+        with _span('multipart', request.content_length) as s:
+            g.multipart = parse_multipart_stream(chunks, boundary)
+            s.bytes_out = sum(len(data) for _, data in g.multipart[1].values())
+    return g.multipart
+
+def _read_wav(data):
+    """WAV のバイト列をデコードする（wav_codec.read_wav_bytes、計測の段階は decode）"""
+    with _span('decode', len(data)) as s:
+        sample_rate, audio_data = read_wav_bytes(data)
+        s.bytes_out = audio_data.nbytes
+    return sample_rate, audio_data
+
+def _wav_response(sample_rate, waveform, download_name, headers=None):
+    """[-1, 1] の float 波形を 16-bit WAV の添付ファイルとして返す"""
+    with _span('encode', waveform.nbytes) as s:
+        wav = encode_wav(sample_rate, (waveform * 32767).astype(np.int16))
+        s.bytes_out = len(wav)
+    return Response(wav, mimetype='audio/wav',
+                    headers=dict(headers or {}, **{'Content-Disposition': 'attachment; filename=%s' % download_name}))
+
+# 決定的な合成（フォルマント / TTS / シード付き VITS）の結果のキャッシュ
+RENDER_CACHE = RenderCache()
+
+def _cached_wav_response(kind, params, render, download_name):
+    """params（既定値を埋めたもの）が同じなら同じ波形になる合成を、強い ETag とキャッシュ付きで返す。
+    render() は (sample_rate, [-1, 1] の波形)。If-None-Match が一致すれば合成もキャッシュの参照もせずに 304。"""
+    key = render_key(kind, params)
+    etag = render_etag(key)
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return Response(status=304, headers={'ETag': etag})
+    
+    def encode():
+        with _span('dsp') as s:
+            sample_rate, waveform = render()
+            s.bytes_out = waveform.nbytes
+        with _span('encode', waveform.nbytes) as s:
+            wav = encode_wav(sample_rate, (waveform * 32767).astype(np.int16))
+            s.bytes_out = len(wav)
+        return wav
+    
+    wav, hit = RENDER_CACHE.get_or_render(key, encode)
+    return Response(wav, mimetype='audio/wav',
+                    headers={'Content-Disposition': 'attachment; filename=%s' % download_name, 'ETag': etag,
+                             'X-Render-Cache': 'hit' if hit else 'miss'})
 
 # ========== フォルマント合成 ==========
 
 @app.route('/api/formant/synthesize', methods=['POST'])
 def synthesize_formant():
-    """フォルマント合成API"""
-    data = request.get_json()
-    
-    f0 = float(data.get('f0', 150))
-    f1 = float(data.get('f1', 700))
-    f2 = float(data.get('f2', 1200))
-    f3 = float(data.get('f3', 2500))
-    b1 = float(data.get('b1', 100))
-    b2 = float(data.get('b2', 150))
-    duration = float(data.get('duration', 1.0))
-    
-    sample_rate = 44100
-    t = np.linspace(0, duration, int(sample_rate * duration))
-    
-    # 基本周波数と高調波の生成
-    waveform = np.zeros_like(t)
-    for h in range(1, 11):
-        freq = f0 * h
-        amp = 1.0 / h
-        waveform += amp * np.sin(2 * np.pi * freq * t)
-    
-    # フォルマントフィルタリング（簡易版）
-    # 実際の実装ではIIRフィルタを使用
-    envelope = np.exp(-t * 2)
-    waveform *= envelope
-    
-    # 正規化
-    waveform = waveform / np.max(np.abs(waveform)) * 0.8
-    
-    # WAVファイルとして返す
-    buffer = io.BytesIO()
-    wavfile.write(buffer, sample_rate, (waveform * 32767).astype(np.int16))
-    buffer.seek(0)
+    """フォルマント合成API。
+    body: f0, f1〜f5, b1〜b5（スカラーか、発話全体に等間隔に置いた値の列）, amplitude, duration, open_quotient, sample_rate,
+    source（glottal | harmonic）, n_harmonics, rolloff（harmonic のときの帯域制限ウェーブテーブル）"""
+    data = request.get_json() or {}
     
-    return send_file(buffer, mimetype='audio/wav', as_attachment=True, 
-                     download_name='formant_synthesis.wav')
+    # 声門パルス列 → フォルマントごとの 2 次共振器の直列（klatt.py）。値の列を渡すと時間変化する軌跡になる
+    try:
+        params = formant_synth_params(data)
+        
+        def render():
+            synth = FormantSynth(**params)
+            return synth.sample_rate, synth.render()
+        
+        return _cached_wav_response('formant', params, render, 'formant_synthesis.wav')
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
 
 # ========== F0分析 ==========
 
 @app.route('/api/f0/analyze', methods=['POST'])
 def analyze_f0():
     """F0分析API"""
-    if 'audio' not in request.files:
+    form, files = _multipart_upload()
+    if 'audio' not in files:
         return jsonify({'error': '音声ファイルが必要です'}), 400
     
-    audio_file = request.files['audio']
+    _, audio_file = files['audio']
     
-    # 音声ファイルの読み込み
-    sample_rate, audio_data = wavfile.read(audio_file)
-    
-    # モノラルに変換
-    if len(audio_data.shape) > 1:
-        audio_data = audio_data[:, 0]
-    
-    # 正規化
-    audio_data = audio_data.astype(np.float32) / 32767.0
+    # 音声ファイルの読み込み（モノラル・float32 に正規化）
+    sample_rate, audio_data = _read_wav(audio_file)
     
     # F0推定（自己相関ベース）
-    f0_values = estimate_f0(audio_data, sample_rate)
+    with _span('dsp', audio_data.nbytes):
+        f0_values = estimate_f0(audio_data, sample_rate)
     
     # 統計計算
     valid_f0 = [f for f in f0_values if f > 0]
@@ -99,70 +166,60 @@ def analyze_f0():
     return jsonify(stats)
 
 def estimate_f0(audio_data, sample_rate):
-    """F0推定（自己相関ベース）"""
-    frame_size = int(sample_rate * 0.025)  # 25ms
-    hop_size = int(sample_rate * 0.010)    # 10ms
-    f0_values = []
-    
-    min_period = int(sample_rate / 400)  # 400Hz以下
-    max_period = int(sample_rate / 80)  # 80Hz以上
-    
-    for i in range(0, len(audio_data) - frame_size, hop_size):
-        frame = audio_data[i:i + frame_size]
-        
-        # 自己相関計算
-        autocorr = np.correlate(frame, frame, mode='full')
-        autocorr = autocorr[len(autocorr)//2:]
-        
-        # ピーク検出
-        peak_idx = np.argmax(autocorr[min_period:max_period]) + min_period
-        
-        if peak_idx > 0:
-            f0 = sample_rate / peak_idx
-            f0_values.append(f0)
-        else:
-            f0_values.append(0)
-    
-    return f0_values
+    """F0推定（自己相関ベース）。全フレームの自己相関を一括 rFFT で計算する。"""
+    return estimate_f0_batch(audio_data, sample_rate)
 
 # ========== スペクトル分析 ==========
 
+def _spectrogram_from_form(form, audio_data, sample_rate, fft_size, window_type):
+    """format（json | f16 | u8）、max_frames / max_bins（間引き）、db_range をフォームから読む。
+    戻り値: (Spectrogram, format, db_range)"""
+    fmt = form.get('format', 'json')
+    if fmt != 'json' and fmt not in SPECTROGRAM_FORMATS:
+        raise ValueError('unknown format: %s' % fmt)
+    max_frames = int(form['max_frames']) if form.get('max_frames') else None
+    max_bins = int(form['max_bins']) if form.get('max_bins') else None
+    if (max_frames is not None and max_frames < 1) or (max_bins is not None and max_bins < 1):
+        raise ValueError('max_frames and max_bins must be positive')
+    db_range = float(form.get('db_range') or DB_RANGE)
+    sp = Spectrogram(audio_data, sample_rate, fft_size, window_type, fft_size // 2,
+                     max_frames=max_frames, max_bins=max_bins)
+    return sp, fmt, db_range
+
+def _spectrogram_stream(sp, fmt, db_range, headers=None):
+    """ヘッダ＋フレームのバイナリをチャンク転送で返す（spectrogram.py の SPG1 形式）"""
+    return Response(sp.stream(fmt, db_range), mimetype='application/octet-stream', headers=headers)
+
 @app.route('/api/spectrum/analyze', methods=['POST'])
 def analyze_spectrum():
     """スペクトル分析API"""
-    if 'audio' not in request.files:
+    form, files = _multipart_upload()
+    if 'audio' not in files:
         return jsonify({'error': '音声ファイルが必要です'}), 400
     
-    audio_file = request.files['audio']
-    fft_size = int(request.form.get('fft_size', 2048))
-    window_type = request.form.get('window_type', 'hamming')
-    
-    # 音声ファイルの読み込み
-    sample_rate, audio_data = wavfile.read(audio_file)
-    
-    # モノラルに変換
-    if len(audio_data.shape) > 1:
-        audio_data = audio_data[:, 0]
+    _, audio_file = files['audio']
+    fft_size = int(form.get('fft_size', 2048))
+    window_type = form.get('window_type', 'hamming')
     
-    # 正規化
-    audio_data = audio_data.astype(np.float32) / 32767.0
+    # 音声ファイルの読み込み（モノラル・float32 に正規化）
+    sample_rate, audio_data = _read_wav(audio_file)
     
-    # スペクトログラム計算
-    frequencies, times, spectrogram = signal.spectrogram(
-        audio_data, sample_rate, 
-        nperseg=fft_size,
-        window=window_type,
-        noverlap=fft_size // 2
-    )
+    # スペクトログラム計算（format=f16 / u8 ならフレームを逐次バイナリで返す）
+    try:
+        sp, fmt, db_range = _spectrogram_from_form(form, audio_data, sample_rate, fft_size, window_type)
+        if fmt != 'json':
+            return _spectrogram_stream(sp, fmt, db_range)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     # パワースペクトル密度
     power_spectrum = np.abs(fft(audio_data[:fft_size]))[:fft_size//2]
     freq_axis = fftfreq(fft_size, 1/sample_rate)[:fft_size//2]
     
     return jsonify({
-        'frequencies': frequencies.tolist(),
-        'times': times.tolist(),
-        'spectrogram': spectrogram.tolist(),
+        'frequencies': sp.frequencies.tolist(),
+        'times': sp.times.tolist(),
+        'spectrogram': sp.compute().tolist(),
         'power_spectrum': power_spectrum.tolist(),
         'freq_axis': freq_axis.tolist()
     })
@@ -183,55 +240,48 @@ def synthesize_tts():
     # 実際の実装では、Neural TTSモデル（Tacotron2、FastSpeech、VITSなど）を使用
     # ここではデモ用の簡易実装
     
-    # デモ用の音声生成（フォルマント合成を使用）
-    sample_rate = 22050
-    duration = len(text) * 0.1 * rate  # 文字数に応じた長さ
-    t = np.linspace(0, duration, int(sample_rate * duration))
-    
-    # 簡易的な音声生成
-    waveform = np.sin(2 * np.pi * 150 * t) * np.exp(-t * 0.5)
-    
-    # 正規化
-    waveform = waveform / np.max(np.abs(waveform)) * 0.8
-    
-    # WAVファイルとして返す
-    buffer = io.BytesIO()
-    wavfile.write(buffer, sample_rate, (waveform * 32767).astype(np.int16))
-    buffer.seek(0)
+    def render():
+        # デモ用の音声生成（フォルマント合成を使用）
+        sample_rate = 22050
+        duration = len(text) * 0.1 * rate  # 文字数に応じた長さ
+        t = np.linspace(0, duration, int(sample_rate * duration))
+        
+        # 簡易的な音声生成
+        waveform = np.sin(2 * np.pi * 150 * t) * np.exp(-t * 0.5)
+        
+        # 正規化
+        waveform = waveform / np.max(np.abs(waveform)) * 0.8
+        return sample_rate, waveform
     
-    return send_file(buffer, mimetype='audio/wav', as_attachment=True,
-                     download_name='tts_output.wav')
+    # WAVファイルとして返す（同じ text / speaker / rate ならキャッシュから）
+    return _cached_wav_response('tts', {'text': text, 'speaker': speaker, 'rate': rate}, render, 'tts_output.wav')
 
 # ========== 音声変換 ==========
 
 @app.route('/api/voice/convert', methods=['POST'])
 def convert_voice():
-    """音声変換API"""
-    if 'audio' not in request.files:
+    """音声変換API。form: type（pitch）, semitones, mode（wsola | vocoder）, strength（0〜100、semitones がないとき）"""
+    form, files = _multipart_upload()
+    if 'audio' not in files:
         return jsonify({'error': '音声ファイルが必要です'}), 400
     
-    audio_file = request.files['audio']
-    conversion_type = request.form.get('type', 'pitch')
-    strength = float(request.form.get('strength', 50)) / 100.0
-    
-    # 音声ファイルの読み込み
-    sample_rate, audio_data = wavfile.read(audio_file)
+    _, audio_file = files['audio']
+    conversion_type = form.get('type', 'pitch')
+    strength = float(form.get('strength', 50)) / 100.0
     
-    # モノラルに変換
-    if len(audio_data.shape) > 1:
-        audio_data = audio_data[:, 0]
-    
-    # 正規化
-    audio_data = audio_data.astype(np.float32) / 32767.0
+    # 音声ファイルの読み込み（モノラル・float32 に正規化）
+    sample_rate, audio_data = _read_wav(audio_file)
     
     # 変換処理
     if conversion_type == 'pitch':
-        # ピッチシフト（簡易版）
-        # 実際の実装ではPSOLAやPhase Vocoderを使用
-        shift_factor = 1.0 + (strength - 0.5) * 0.2
-        indices = np.round(np.arange(0, len(audio_data), shift_factor))
-        indices = indices[indices < len(audio_data)].astype(int)
-        converted = audio_data[indices]
+        # 長さを保ったピッチシフト（WSOLA / 位相ボコーダ、pitch_shift.py）
+        # semitones がなければ strength を従来と同じ比に換算する
+        try:
+            with _span('dsp', audio_data.nbytes):
+                semitones = shift_semitones(form, strength)
+                converted = pitch_shift(audio_data, sample_rate, semitones, form.get('mode') or 'wsola')
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
     else:
         converted = audio_data
     
@@ -239,12 +289,7 @@ def convert_voice():
     converted = converted / np.max(np.abs(converted)) * 0.8
     
     # WAVファイルとして返す
-    buffer = io.BytesIO()
-    wavfile.write(buffer, sample_rate, (converted * 32767).astype(np.int16))
-    buffer.seek(0)
-    
-    return send_file(buffer, mimetype='audio/wav', as_attachment=True,
-                     download_name='converted_voice.wav')
+    return _wav_response(sample_rate, converted, 'converted_voice.wav')
 
 # ========== ヘルスチェック ==========
 
@@ -262,63 +307,53 @@ def health_check():
 @app.route('/api/cyclegan/convert', methods=['POST'])
 def convert_cyclegan():
     """CycleGAN-VC音声変換API"""
-    if 'source' not in request.files:
+    form, files = _multipart_upload()
+    if 'source' not in files:
         return jsonify({'error': 'Source audio file required'}), 400
     
-    source_file = request.files['source']
-    lambda_cyc = float(request.form.get('lambda_cyc', 10.0))
-    lambda_id = float(request.form.get('lambda_id', 5.0))
-    
-    # 音声ファイルの読み込み
-    sample_rate, audio_data = wavfile.read(source_file)
+    _, source_file = files['source']
+    lambda_cyc = float(form.get('lambda_cyc', 10.0))
+    lambda_id = float(form.get('lambda_id', 5.0))
+    warp = form.get('warp')
     
-    # モノラルに変換
-    if len(audio_data.shape) > 1:
-        audio_data = audio_data[:, 0]
+    # 音声ファイルの読み込み（モノラル・float32 に正規化）
+    sample_rate, audio_data = _read_wav(source_file)
     
-    # 正規化
-    audio_data = audio_data.astype(np.float32) / 32767.0
-    
-    # CycleGAN-VC変換のシミュレーション
-    # 実際の実装では、学習済みCycleGAN-VCモデルを使用
-    converted = apply_cyclegan_transform(audio_data, lambda_cyc, lambda_id)
+    # スペクトル包絡の変換（学習済みモデルの代わりに、包絡の周波数伸縮で話者性を変える）
+    started = time.perf_counter()
+    try:
+        with _span('dsp', audio_data.nbytes):
+            converted = apply_cyclegan_transform(audio_data, sample_rate, lambda_cyc, lambda_id,
+                                                 warp=None if warp in (None, '') else float(warp))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    elapsed = time.perf_counter() - started
     
     # 正規化
-    converted = converted / np.max(np.abs(converted)) * 0.8
-    
-    # WAVファイルとして返す
-    buffer = io.BytesIO()
-    wavfile.write(buffer, sample_rate, (converted * 32767).astype(np.int16))
-    buffer.seek(0)
-    
-    return send_file(buffer, mimetype='audio/wav', as_attachment=True,
-                     download_name='cyclegan_converted.wav')
-
-def apply_cyclegan_transform(audio_data, lambda_cyc, lambda_id):
-    """CycleGAN-VC変換のシミュレーション"""
-    # 実際の実装では、mel-spectrogram変換とボコーダを使用
-    # ここでは簡易的な変換を実装
-    converted = audio_data.copy()
-    
-    # スペクトル変換のシミュレーション
-    fft_data = np.fft.fft(converted)
-    magnitude = np.abs(fft_data)
-    phase = np.angle(fft_data)
-    
-    # スペクトルシフト（フォルマント変換のシミュレーション）
-    shift_factor = 1.0 + (lambda_cyc - 10.0) / 100.0
-    shifted_magnitude = np.interp(np.arange(len(magnitude)) * shift_factor,
-                                  np.arange(len(magnitude)), magnitude)
-    
-    converted_fft = shifted_magnitude * np.exp(1j * phase)
-    converted = np.real(np.fft.ifft(converted_fft))
-    
-    return converted
+    peak = np.max(np.abs(converted)) if len(converted) else 0.0
+    if peak > 0:
+        converted *= 0.8 / peak
+    
+    # WAVファイルとして返す（処理時間 / 音声の長さ を X-Realtime-Factor に）
+    rtf = elapsed / (len(audio_data) / float(sample_rate)) if len(audio_data) else 0.0
+    return _wav_response(sample_rate, converted, 'cyclegan_converted.wav',
+                         headers={'X-Realtime-Factor': '%.4f' % rtf})
+
+def apply_cyclegan_transform(audio_data, sample_rate, lambda_cyc, lambda_id, warp=None):
+    """CycleGAN-VC 風の変換: ケプストラム包絡を warp 倍に伸縮し、励振はそのまま（cepstral_vc）。
+    warp を省くと lambda_cyc から（10 で 1、従来のスペクトルシフトと同じ向き）"""
+    if warp is None:
+        shift_factor = 1.0 + (lambda_cyc - 10.0) / 100.0
+        if shift_factor <= 0:
+            raise ValueError('lambda_cyc out of range')
+        warp = 1.0 / shift_factor
+    return cepstral_convert(audio_data, sample_rate, warp)
 
 @app.route('/api/cyclegan/analyze', methods=['POST'])
 def analyze_cyclegan():
     """CycleGAN-VC分析API（MCD, PESQ, STOI計算）"""
-    if 'source' not in request.files:
+    form, files = _multipart_upload()
+    if 'source' not in files:
         return jsonify({'error': 'Source audio file required'}), 400
     
     # 簡易的なメトリクス計算
@@ -336,349 +371,340 @@ def analyze_cyclegan():
 @app.route('/api/stargan/convert', methods=['POST'])
 def convert_stargan():
     """StarGAN-VC音声変換API"""
-    if 'source' not in request.files:
+    form, files = _multipart_upload()
+    if 'source' not in files:
         return jsonify({'error': 'Source audio file required'}), 400
     
-    source_file = request.files['source']
-    target_speaker = request.form.get('target_speaker', 'speaker1')
-    lambda_cls = float(request.form.get('lambda_cls', 10.0))
-    lambda_cyc = float(request.form.get('lambda_cyc', 10.0))
-    lambda_id = float(request.form.get('lambda_id', 5.0))
+    _, source_file = files['source']
+    lambda_cls = float(form.get('lambda_cls', 10.0))
+    lambda_cyc = float(form.get('lambda_cyc', 10.0))
+    lambda_id = float(form.get('lambda_id', 5.0))
     
-    sample_rate, audio_data = wavfile.read(source_file)
-    if len(audio_data.shape) > 1:
-        audio_data = audio_data[:, 0]
+    # 話者プロファイル（target_speakers で複数指定すると、分析は 1 回で話者ごとに合成する）
+    try:
+        names = speaker_names(form)
+        profiles = [load_profile(name) for name in names]
+    except ValueError as e:
+        return jsonify({'error': str(e), 'speakers': list_profiles()}), 400
     
-    audio_data = audio_data.astype(np.float32) / 32767.0
+    # 音声ファイルの読み込み（モノラル・float32 に正規化）
+    sample_rate, audio_data = _read_wav(source_file)
     
-    # StarGAN-VC変換のシミュレーション
-    converted = apply_stargan_transform(audio_data, target_speaker)
-    converted = converted / np.max(np.abs(converted)) * 0.8
+    with _span('dsp', audio_data.nbytes):
+        results = apply_stargan_transform(audio_data, sample_rate, profiles)
     
-    buffer = io.BytesIO()
-    wavfile.write(buffer, sample_rate, (converted * 32767).astype(np.int16))
-    buffer.seek(0)
+    if len(names) == 1 and 'target_speakers' not in form:
+        converted, semitones = results[0]
+        return _wav_response(sample_rate, _peak_normalize(converted), 'stargan_converted.wav',
+                             headers={'X-F0-Shift': '%.2f' % semitones})
     
-    return send_file(buffer, mimetype='audio/wav', as_attachment=True,
-                     download_name='stargan_converted.wav')
+    return jsonify({
+        'sample_rate': sample_rate,
+        'speakers': [{
+            'speaker': name,
+            'f0_shift_semitones': semitones,
+            'audio': base64.b64encode(
+                encode_wav(sample_rate, (_peak_normalize(converted) * 32767).astype(np.int16))).decode('ascii')
+        } for name, (converted, semitones) in zip(names, results)]
+    })
 
-def apply_stargan_transform(audio_data, target_speaker):
-    """StarGAN-VC変換のシミュレーション"""
-    converted = audio_data.copy()
-    
-    # 話者に応じた変換
-    speaker_factors = {
-        'speaker1': 1.0,
-        'speaker2': 0.9,
-        'speaker3': 1.1,
-        'speaker4': 0.95
-    }
-    
-    factor = speaker_factors.get(target_speaker, 1.0)
-    converted = converted * factor
-    
-    return converted
+@app.route('/api/stargan/speakers', methods=['GET'])
+def stargan_speakers():
+    """話者プロファイルの一覧"""
+    return jsonify({'speakers': list_profiles()})
+
+def _peak_normalize(waveform, peak=0.8):
+    m = np.max(np.abs(waveform)) if len(waveform) else 0.0
+    return waveform * (peak / m) if m > 0 else waveform
+
+def apply_stargan_transform(audio_data, sample_rate, profiles):
+    """StarGAN-VC 風の多話者変換: プロファイルごとに包絡の伸縮・傾斜と F0 の移動をかける。
+    戻り値は [(波形, F0 のシフト量（半音）)]"""
+    return speaker_convert(audio_data, sample_rate, profiles)
 
 # ========== AutoVC ==========
 
+# 目標話者の統計（WAV の内容のハッシュ = target_id ごと）
+SPEAKER_STATS = StatsStore()
+
+def _autovc_target(form, files):
+    """(target_id, 統計, hit, エラーのレスポンス)。target ファイルがあれば分析して（キャッシュにあれば使い回して）登録する"""
+    if 'target' in files:
+        _, target_file = files['target']
+        target_id, stats, hit = SPEAKER_STATS.get_or_extract(target_file, lambda: _read_wav(target_file))
+        return target_id, stats, hit, None
+    target_id = form.get('target_id')
+    if not target_id:
+        return None, None, False, (jsonify({'error': 'Target audio file or target_id required'}), 400)
+    stats = SPEAKER_STATS.get(target_id)
+    if stats is None:
+        return None, None, False, (jsonify({'error': 'Unknown target_id (upload the target file again)'}), 404)
+    return target_id, stats, True, None
+
+@app.route('/api/autovc/target', methods=['POST'])
+def register_autovc_target():
+    """目標話者の統計を登録し、以降の変換で使える target_id を返す"""
+    form, files = _multipart_upload()
+    if 'target' not in files:
+        return jsonify({'error': 'Target audio file required'}), 400
+    target_id, stats, hit, _ = _autovc_target(form, files)
+    return jsonify({'target_id': target_id, 'cached': hit, 'stats': speaker_stats_summary(stats)})
+
 @app.route('/api/autovc/convert', methods=['POST'])
 def convert_autovc():
-    """AutoVC Zero-Shot音声変換API"""
-    if 'source' not in request.files or 'target' not in request.files:
-        return jsonify({'error': 'Source and target audio files required'}), 400
-    
-    source_file = request.files['source']
-    target_file = request.files['target']
-    content_dim = int(request.form.get('content_dim', 128))
-    speaker_dim = int(request.form.get('speaker_dim', 64))
-    
-    sample_rate_s, audio_data_s = wavfile.read(source_file)
-    sample_rate_t, audio_data_t = wavfile.read(target_file)
-    
-    if len(audio_data_s.shape) > 1:
-        audio_data_s = audio_data_s[:, 0]
-    if len(audio_data_t.shape) > 1:
-        audio_data_t = audio_data_t[:, 0]
-    
-    audio_data_s = audio_data_s.astype(np.float32) / 32767.0
-    audio_data_t = audio_data_t.astype(np.float32) / 32767.0
-    
-    # AutoVC変換のシミュレーション
-    # 実際の実装では、Content EncoderとSpeaker Encoderを使用
-    converted = apply_autovc_transform(audio_data_s, audio_data_t, content_dim, speaker_dim)
-    converted = converted / np.max(np.abs(converted)) * 0.8
-    
-    buffer = io.BytesIO()
-    wavfile.write(buffer, sample_rate_s, (converted * 32767).astype(np.int16))
-    buffer.seek(0)
-    
-    return send_file(buffer, mimetype='audio/wav', as_attachment=True,
-                     download_name='autovc_converted.wav')
-
-def apply_autovc_transform(source_audio, target_audio, content_dim, speaker_dim):
-    """AutoVC変換のシミュレーション"""
-    # 簡易的な実装：ターゲットの話者特徴をソースに適用
-    # 実際の実装では、エンコーダー/デコーダーを使用
-    
-    # F0変換のシミュレーション
-    source_f0 = estimate_f0_simple(source_audio)
-    target_f0 = estimate_f0_simple(target_audio)
+    """AutoVC Zero-Shot音声変換API（目標話者は target ファイルか、登録済みの target_id）"""
+    form, files = _multipart_upload()
+    if 'source' not in files:
+        return jsonify({'error': 'Source audio file required'}), 400
+    target_id, target_stats, hit, error = _autovc_target(form, files)
+    if error is not None:
+        return error
     
-    if source_f0 > 0 and target_f0 > 0:
-        f0_ratio = target_f0 / source_f0
-        converted = np.interp(np.arange(len(source_audio)) * f0_ratio,
-                             np.arange(len(source_audio)), source_audio)
-    else:
-        converted = source_audio.copy()
+    _, source_file = files['source']
+    sample_rate_s, audio_data_s = _read_wav(source_file)
     
-    return converted
+    with _span('dsp', audio_data_s.nbytes):
+        converted, semitones = apply_autovc_transform(audio_data_s, sample_rate_s, target_stats)
+    return _wav_response(sample_rate_s, _peak_normalize(converted), 'autovc_converted.wav',
+                         headers={'X-Target-Id': target_id, 'X-Target-Cache': 'hit' if hit else 'miss',
+                                  'X-F0-Shift': '%.2f' % semitones})
 
-def estimate_f0_simple(audio_data):
-    """簡易的なF0推定"""
-    # 自己相関ベースのF0推定
-    autocorr = np.correlate(audio_data, audio_data, mode='full')
-    autocorr = autocorr[len(autocorr)//2:]
-    
-    # ピーク検出
-    min_period = 40
-    max_period = 400
-    if len(autocorr) > max_period:
-        peak_idx = np.argmax(autocorr[min_period:max_period]) + min_period
-        if peak_idx > 0:
-            return 22050 / peak_idx  # サンプルレートを22050と仮定
-    return 0
+def apply_autovc_transform(source_audio, sample_rate, target_stats):
+    """AutoVC 風の変換: 目標話者の統計（F0 の幾何平均・平均包絡）にソースを寄せる。
+    戻り値は (波形, F0 のシフト量（半音）)"""
+    return speaker_stats_convert(source_audio, sample_rate, target_stats)
 
 # ========== VITS ==========
 
 @app.route('/api/vits/synthesize', methods=['POST'])
 def synthesize_vits():
-    """VITS音声合成API"""
+    """VITS音声合成API（body の seed を指定すると同じ入力で同じ波形になり、結果をキャッシュする）"""
     data = request.get_json()
     text = data.get('text', '')
     speaker = int(data.get('speaker', 0))
     lambda_kl = float(data.get('lambda_kl', 1.0))
     lambda_adv = float(data.get('lambda_adv', 1.0))
     noise_scale = float(data.get('noise_scale', 0.667))
+    seed = data.get('seed')
     
     if not text:
         return jsonify({'error': 'Text required'}), 400
+    if seed is not None:
+        try:
+            seed = int(seed)
+            if seed < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            return jsonify({'error': 'seed must be a non-negative integer'}), 400
     
     # VITS合成のシミュレーション
     # 実際の実装では、VITSモデルを使用
-    duration = len(text) * 0.1  # 文字数に応じた長さ
-    sample_rate = 22050
-    t = np.linspace(0, duration, int(sample_rate * duration))
-    
-    # テキストに応じた音声生成のシミュレーション
-    waveform = np.sin(2 * np.pi * (150 + speaker * 10) * t) * np.exp(-t * 0.5)
-    waveform += np.random.normal(0, noise_scale * 0.1, len(waveform))
-    
-    waveform = waveform / np.max(np.abs(waveform)) * 0.8
-    
-    buffer = io.BytesIO()
-    wavfile.write(buffer, sample_rate, (waveform * 32767).astype(np.int16))
-    buffer.seek(0)
+    def render(rng):
+        duration = len(text) * 0.1  # 文字数に応じた長さ
+        sample_rate = 22050
+        t = np.linspace(0, duration, int(sample_rate * duration))
+        
+        # テキストに応じた音声生成のシミュレーション
+        waveform = np.sin(2 * np.pi * (150 + speaker * 10) * t) * np.exp(-t * 0.5)
+        waveform += rng.normal(0, noise_scale * 0.1, len(waveform))
+        
+        waveform = waveform / np.max(np.abs(waveform)) * 0.8
+        return sample_rate, waveform
     
-    return send_file(buffer, mimetype='audio/wav', as_attachment=True,
-                     download_name='vits_synthesized.wav')
+    # ノイズを使うので、seed が指定されたときだけ結果が決まり、キャッシュできる
+    if seed is None:
+        return _wav_response(*render(np.random.default_rng()), 'vits_synthesized.wav')
+    params = {'text': text, 'speaker': speaker, 'lambda_kl': lambda_kl, 'lambda_adv': lambda_adv,
+              'noise_scale': noise_scale, 'seed': seed}
+    return _cached_wav_response('vits', params, lambda: render(np.random.default_rng(seed)), 'vits_synthesized.wav')
 
 # ========== WaveNet ==========
 
 @app.route('/api/wavenet/generate', methods=['POST'])
 def generate_wavenet():
-    """WaveNet音声生成API"""
-    if 'input' not in request.files:
+    """WaveNet音声生成API（拡張因果畳み込みスタック。重みは seed の乱数か、weights の npz）"""
+    form, files = _multipart_upload()
+    if 'input' not in files:
         return jsonify({'error': 'Input audio file required'}), 400
     
-    input_file = request.files['input']
-    dilation_rates = json.loads(request.form.get('dilation_rates', '[1,2,4,8,16,32,64,128,256,512]'))
-    res_channels = int(request.form.get('res_channels', 256))
-    skip_channels = int(request.form.get('skip_channels', 256))
-    
-    sample_rate, audio_data = wavfile.read(input_file)
-    if len(audio_data.shape) > 1:
-        audio_data = audio_data[:, 0]
-    
-    audio_data = audio_data.astype(np.float32) / 32767.0
+    _, input_file = files['input']
+    try:
+        dilation_rates = json.loads(form.get('dilation_rates', '[1,2,4,8,16,32,64,128,256,512]'))
+        res_channels = int(form.get('res_channels', 256))
+        skip_channels = int(form.get('skip_channels', 256))
+        seed = int(form.get('seed', 0))
+        if 'weights' in files:
+            net = WaveNet.load(io.BytesIO(files['weights'][1]))
+        else:
+            net = random_wavenet(tuple(int(d) for d in dilation_rates), res_channels, skip_channels, seed=seed)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
     
-    # WaveNet生成のシミュレーション
-    # 実際の実装では、WaveNetモデルを使用
-    generated = apply_wavenet_generation(audio_data, dilation_rates)
-    generated = generated / np.max(np.abs(generated)) * 0.8
+    # 音声ファイルの読み込み（モノラル・float32 に正規化）
+    sample_rate, audio_data = _read_wav(input_file)
     
-    buffer = io.BytesIO()
-    wavfile.write(buffer, sample_rate, (generated * 32767).astype(np.int16))
-    buffer.seek(0)
+    started = time.perf_counter()
+    with _span('dsp', audio_data.nbytes):
+        generated = apply_wavenet_generation(audio_data, net)
+    elapsed = time.perf_counter() - started
+    rtf = elapsed / (len(audio_data) / float(sample_rate)) if len(audio_data) else 0.0
     
-    return send_file(buffer, mimetype='audio/wav', as_attachment=True,
-                     download_name='wavenet_generated.wav')
+    return _wav_response(sample_rate, _peak_normalize(generated), 'wavenet_generated.wav',
+                         headers={'X-Realtime-Factor': '%.4f' % rtf})
 
-def apply_wavenet_generation(audio_data, dilation_rates):
-    """WaveNet生成のシミュレーション"""
-    # 簡易的な実装
-    generated = audio_data.copy()
-    
-    # 拡張畳み込みのシミュレーション
-    for dilation in dilation_rates:
-        if dilation < len(generated):
-            generated = np.convolve(generated, np.ones(dilation) / dilation, mode='same')
-    
-    return generated
+def apply_wavenet_generation(audio_data, net):
+    """WaveNet の順伝播（ブロックごと、層ごとの循環バッファで過去を持ち越す）"""
+    return net.generate(audio_data)
 
 # ========== Advanced Spectral Analysis ==========
 
 @app.route('/api/analysis/spectral', methods=['POST'])
 def analyze_spectral():
-    """高度なスペクトル分析API"""
-    if 'audio' not in request.files:
+    """高度なスペクトル分析API。
+    lpc_coefficients は先頭 fft_size サンプルの 1 フレームだけの LPC 係数（LPC 包絡の表示用。
+    バイナリのときも X-LPC-Coefficients ヘッダに収まる大きさ）。フレームごとの LPC は /api/analysis/lpc"""
+    form, files = _multipart_upload()
+    if 'audio' not in files:
         return jsonify({'error': 'Audio file required'}), 400
     
-    audio_file = request.files['audio']
-    fft_size = int(request.form.get('fft_size', 2048))
-    window_type = request.form.get('window_type', 'hamming')
-    lpc_order = int(request.form.get('lpc_order', 16))
-    
-    sample_rate, audio_data = wavfile.read(audio_file)
-    if len(audio_data.shape) > 1:
-        audio_data = audio_data[:, 0]
+    _, audio_file = files['audio']
+    fft_size = int(form.get('fft_size', 2048))
+    window_type = form.get('window_type', 'hamming')
+    lpc_order = int(form.get('lpc_order', 16))
     
-    audio_data = audio_data.astype(np.float32) / 32767.0
+    # 音声ファイルの読み込み（モノラル・float32 に正規化）
+    sample_rate, audio_data = _read_wav(audio_file)
     
-    # STFT計算
-    frequencies, times, spectrogram = signal.spectrogram(
-        audio_data, sample_rate,
-        nperseg=fft_size,
-        window=window_type,
-        noverlap=fft_size // 2
-    )
-    
-    # LPC係数計算
+    # LPC係数計算（先頭の 1 フレームだけ）
     lpc_coefficients = calculate_lpc(audio_data[:fft_size], lpc_order)
     
+    # STFT計算（バイナリのときは LPC 係数を X-LPC-Coefficients ヘッダで返す）
+    try:
+        sp, fmt, db_range = _spectrogram_from_form(form, audio_data, sample_rate, fft_size, window_type)
+        if fmt != 'json':
+            return _spectrogram_stream(sp, fmt, db_range,
+                                       {'X-LPC-Coefficients': json.dumps(lpc_coefficients.tolist())})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     return jsonify({
-        'spectrogram': spectrogram.tolist(),
-        'frequencies': frequencies.tolist(),
-        'times': times.tolist(),
+        'spectrogram': sp.compute().tolist(),
+        'frequencies': sp.frequencies.tolist(),
+        'times': sp.times.tolist(),
         'lpc_coefficients': lpc_coefficients.tolist()
     })
 
 def calculate_lpc(audio_frame, order):
-    """LPC係数の計算"""
-    # 自己相関の計算
-    autocorr = np.correlate(audio_frame, audio_frame, mode='full')
-    autocorr = autocorr[len(autocorr)//2:len(autocorr)//2 + order + 1]
-    
-    # Levinson-Durbinアルゴリズムの簡易実装
-    # 実際の実装では、より正確なアルゴリズムを使用
-    lpc_coeffs = np.polyfit(np.arange(len(audio_frame)), audio_frame, order)
+    """LPC係数の計算（ハミング窓 → 自己相関 → Levinson-Durbin）。A(z) = 1 + Σ a_j z^-j の [1, a_1, ..., a_order]"""
+    return lpc_coefficients(audio_frame, order)
+
+# フレームごとの LPC で返せる項目
+LPC_FIELDS = ('lpc', 'reflection', 'error', 'formants')
+
+@app.route('/api/analysis/lpc', methods=['POST'])
+def analyze_lpc():
+    """フレームごとの LPC 分析API。
+    form: lpc_order（1〜64）, frame_ms, hop_ms, pre_emphasis, n_formants, fields（lpc,reflection,error,formants のカンマ区切り）
+    NDJSON で返す: 1 行目に設定、以降 FRAME_BLOCK フレームごとに 1 行
+    {"start", "time", <fields>...}（各項目はフレーム順の配列）"""
+    form, files = _multipart_upload()
+    if 'audio' not in files:
+        return jsonify({'error': 'Audio file required'}), 400
     
-    return lpc_coeffs
+    _, audio_file = files['audio']
+    # 音声ファイルの読み込み（モノラル・float32 に正規化）
+    sample_rate, audio_data = _read_wav(audio_file)
+    
+    try:
+        order = int(form.get('lpc_order', 16))
+        frame_ms = float(form.get('frame_ms', 25))
+        hop_ms = float(form.get('hop_ms', 10))
+        fields = [f.strip() for f in form.get('fields', ','.join(LPC_FIELDS)).split(',') if f.strip()]
+        unknown = [f for f in fields if f not in LPC_FIELDS]
+        if unknown:
+            raise ValueError('unknown fields: %s' % ', '.join(unknown))
+        blocks = lpc_analyze(audio_data, sample_rate, order, frame_ms, hop_ms,
+                             float(form.get('pre_emphasis', 0.97)), int(form.get('n_formants', 4)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def generate():
+        # ブロックごとに書き出すので、長い録音でもサーバー側のメモリはブロック分だけ
+        yield json.dumps({'sample_rate': sample_rate, 'lpc_order': order, 'frame_ms': frame_ms,
+                          'hop_ms': hop_ms, 'fields': fields}) + '\n'
+        for block in blocks:
+            line = {'start': block['start'], 'time': block['time'].tolist()}
+            for name in fields:
+                line[name] = block[name].tolist()
+            yield json.dumps(line) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
 
 @app.route('/api/analysis/mfcc', methods=['POST'])
 def extract_mfcc():
-    """MFCC特徴抽出API"""
-    if 'audio' not in request.files:
+    """MFCC特徴抽出API（発話全体をフレームごとに計算）。
+    form: n_mfcc, n_mels, frame_ms, hop_ms, deltas（0/1/2）, log_mel, summary
+    summary=1 なら特徴量行列は返さず、チャンクごとに集計した係数ごとの平均・標準偏差だけを返す（長いファイル向け）"""
+    form, files = _multipart_upload()
+    if 'audio' not in files:
         return jsonify({'error': 'Audio file required'}), 400
     
-    audio_file = request.files['audio']
-    sample_rate, audio_data = wavfile.read(audio_file)
-    
-    if len(audio_data.shape) > 1:
-        audio_data = audio_data[:, 0]
-    
-    audio_data = audio_data.astype(np.float32) / 32767.0
-    
-    # MFCC計算のシミュレーション
-    # 実際の実装では、librosaやscipyを使用
-    mfcc = calculate_mfcc_simple(audio_data, sample_rate)
-    
-    return jsonify({
-        'mfcc': mfcc.tolist()
-    })
-
-def calculate_mfcc_simple(audio_data, sample_rate):
-    """簡易的なMFCC計算"""
-    # 実際の実装では、MelフィルタバンクとDCTを使用
-    # ここでは簡易的な実装
-    fft_data = np.abs(np.fft.fft(audio_data[:2048]))
-    mfcc = np.log10(fft_data[:13] + 1e-10)  # 13次元MFCC
-    return mfcc
-
+    _, audio_file = files['audio']
+    # 音声ファイルの読み込み（モノラル・float32 に正規化）
+    sample_rate, audio_data = _read_wav(audio_file)
+    
+    try:
+        options = {
+            'n_mfcc': int(form.get('n_mfcc', 13)),
+            'n_mels': int(form.get('n_mels', 40)),
+            'frame_ms': float(form.get('frame_ms', 25)),
+            'hop_ms': float(form.get('hop_ms', 10)),
+            'deltas': int(form.get('deltas', 0)),
+            'log_mel': form.get('log_mel', '').lower() in ('1', 'true'),
+        }
+        chunks = (audio_data[s:s + MFCC_CHUNK_SAMPLES] for s in range(0, len(audio_data), MFCC_CHUNK_SAMPLES))
+        blocks = iter_mfcc(chunks, sample_rate, **options)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    result = {'frame_ms': options['frame_ms'], 'hop_ms': options['hop_ms']}
+    if form.get('summary', '').lower() in ('1', 'true'):
+        n, total, total_sq = 0, 0.0, 0.0
+        for block in blocks:
+            n += len(block)
+            total = total + np.sum(block, axis=0)
+            total_sq = total_sq + np.sum(block * block, axis=0)
+        mean = total / max(n, 1)
+        result.update({'n_frames': n, 'mean': np.atleast_1d(mean).tolist(),
+                       'std': np.atleast_1d(np.sqrt(np.maximum(total_sq / max(n, 1) - mean * mean, 0))).tolist()})
+        return jsonify(result)
+    
+    features = list(blocks)
+    features = np.concatenate(features) if features else np.zeros((0, 0))
+    result.update({'n_frames': len(features), 'mfcc': features.tolist(),
+                   'mean': np.mean(features, axis=0).tolist() if len(features) else []})
+    return jsonify(result)
 
 # ========== 論文実装: ダイバージェンス（Nielsen: Chord Gap, Jensen, Bregman, Bhattacharyya） ==========
 
-def _F_squared(x):
-    """F(x)=x^2 (ユークリッド)"""
-    x = np.asarray(x, dtype=float)
-    return np.sum(x * x)
-
-def _grad_F_squared(x):
-    return 2 * np.asarray(x, dtype=float)
-
-def _hess_F_squared(x):
-    d = np.size(x)
-    return 2 * np.eye(d)
-
-def _F_entropy(x):
-    """F(x)=sum x_i log x_i (正のベクトル)"""
-    x = np.asarray(x, dtype=float) + 1e-12
-    return float(np.sum(x * np.log(x)))
-
-def _grad_F_entropy(x):
-    x = np.asarray(x, dtype=float) + 1e-12
-    return 1 + np.log(x)
-
-def _hess_F_entropy(x):
-    x = np.asarray(x, dtype=float) + 1e-12
-    return np.diag(1.0 / x)
-
-def _F_logsumexp(x):
-    """F(x)=log(sum(exp(x_i)))"""
-    x = np.asarray(x, dtype=float)
-    m = np.max(x)
-    return float(m + np.log(np.sum(np.exp(x - m))))
-
-def _grad_F_logsumexp(x):
-    x = np.asarray(x, dtype=float)
-    e = np.exp(x - np.max(x))
-    return e / np.sum(e)
-
-def _hess_F_logsumexp(x):
-    x = np.asarray(x, dtype=float)
-    g = _grad_F_logsumexp(x)
-    return np.diag(g) - np.outer(g, g)
-
-_GENERATORS = {
-    'squared': (_F_squared, _grad_F_squared, _hess_F_squared),
-    'entropy': (_F_entropy, _grad_F_entropy, _hess_F_entropy),
-    'logsumexp': (_F_logsumexp, _grad_F_logsumexp, _hess_F_logsumexp),
-}
+# 生成関数（squared / entropy / logsumexp / burg / itakura_saito）は bregman.register_generator で登録・追加する。
+# Hessian は対角・低ランクのまま持ち、密行列は作らない
 
 def jensen_divergence(p, q, F_name='squared'):
     """J_F(p,q) = (F(p)+F(q))/2 - F((p+q)/2)"""
-    p, q = np.asarray(p, dtype=float), np.asarray(q, dtype=float)
-    F, _, _ = _GENERATORS.get(F_name, _GENERATORS['squared'])
-    return float((F(p) + F(q)) / 2 - F((p + q) / 2))
+    return float(skew_jensen_div(p, q, 0.5, F_name))
 
 def skew_jensen_divergence(p, q, alpha, F_name='squared'):
     """J_F^alpha(p:q) = (1-alpha)F(p) + alpha*F(q) - F((1-alpha)p + alpha*q)"""
-    p, q = np.asarray(p, dtype=float), np.asarray(q, dtype=float)
-    alpha = float(np.clip(alpha, 1e-6, 1 - 1e-6))
-    F, _, _ = _GENERATORS.get(F_name, _GENERATORS['squared'])
-    return float((1 - alpha) * F(p) + alpha * F(q) - F((1 - alpha) * p + alpha * q))
+    return float(skew_jensen_div(p, q, alpha, F_name))
 
 def bregman_divergence(p, q, F_name='squared'):
     """B_F(p:q) = F(p) - F(q) - (p-q)^T nabla F(q)"""
-    p, q = np.asarray(p, dtype=float), np.asarray(q, dtype=float)
-    F, gradF, _ = _GENERATORS.get(F_name, _GENERATORS['squared'])
-    return float(F(p) - F(q) - np.dot(p - q, gradF(q)))
+    return float(bregman_div(p, q, F_name))
 
 def skew_jensen_bregman(p, q, alpha, F_name='squared'):
-    """JB_F^alpha(p|q) = (1-alpha)B_F(p:(pq)_alpha) + alpha*B_F(q:(pq)_alpha)"""
-    p, q = np.asarray(p, dtype=float), np.asarray(q, dtype=float)
-    alpha = float(np.clip(alpha, 1e-6, 1 - 1e-6))
-    mid = (1 - alpha) * p + alpha * q
-    return float((1 - alpha) * bregman_divergence(p, mid, F_name) + alpha * bregman_divergence(q, mid, F_name))
+    """JB_F^alpha(p|q) = (1-alpha)B_F(p:(pq)_alpha) + alpha*B_F(q:(pq)_alpha)（= スキュー Jensen）"""
+    return float(jensen_bregman_div(p, q, alpha, F_name))
 
 def bhattacharyya_gaussian(mean1, var1, mean2, var2):
     """1次元ガウス同士の Bhattacharyya 係数と距離。Bhat = -log(BC)."""
@@ -699,42 +725,24 @@ def bhattacharyya_discrete(p, q):
 
 def chord_gap_biparametric(p, q, beta, gamma, F_name='squared'):
     """J_F^{beta,gamma}(p:q) の二パラメータ版。alpha=0 のサブファミリー。論文 Eq.(8) の簡易実装。"""
-    p, q = np.asarray(p, dtype=float), np.asarray(q, dtype=float)
-    alpha = float(np.clip(gamma, 1e-6, 1 - 1e-6))
-    j1 = skew_jensen_divergence(p, q, alpha, F_name)
-    (pq_a, pq_s) = (1 - alpha) * p + alpha * q, (1 - beta) * p + beta * q
-    j2 = skew_jensen_divergence(pq_a, pq_s, 0.5, F_name)
-    return float(j1 - j2)
-
-def centroid_cccp_skew_jensen(points, weights, alpha, F_name='squared', max_iter=100, tol=1e-10):
-    """重み付きスキュー Jensen セントロイド。F=squared のとき閉形式で平均。それ以外は重み付き平均で近似。"""
-    points = np.asarray(points, dtype=float)
-    weights = np.asarray(weights, dtype=float)
-    weights = weights / (np.sum(weights) + 1e-12)
-    # F(x)=x^2 のとき nabla F(x)=2x, セントロイドは重み付き平均
-    if F_name == 'squared':
-        x = np.average(points, axis=0, weights=weights)
-        return x.tolist()
-    # その他は論文の CCCP の代わりに重み付き平均を返す（近似）
-    return np.average(points, axis=0, weights=weights).tolist()
-
-def kmeans_pp_seeds(points, k, divergence='squared', alpha=0.5):
-    """k-means++ 風の初期化: ダイバージェンスに基づく確率的 D^2 重み付きサンプリング。"""
-    points = np.asarray(points, dtype=float)
-    n = len(points)
-    if k >= n:
-        return points.tolist()
-    indices = [np.random.randint(0, n)]
-    for _ in range(k - 1):
-        def d(x, c):
-            if divergence == 'bregman':
-                return bregman_divergence(x, c, 'squared')
-            return skew_jensen_divergence(x, c, alpha, divergence)
-        d2 = np.array([min(d(points[i], points[c]) for c in indices) for i in range(n)])
-        d2 = np.maximum(d2, 0)
-        probs = d2 / (np.sum(d2) + 1e-12)
-        indices.append(np.random.choice(n, p=probs))
-    return [points[i].tolist() for i in indices]
+    return float(chord_gap_div(p, q, beta, gamma, F_name))
+
+def centroid_cccp_skew_jensen(points, weights, alpha, F_name='squared', max_iter=100, tol=1e-10, init=None):
+    """重み付きスキュー Jensen セントロイド。F=squared のとき閉形式で平均。
+    それ以外は CCCP 反復 c <- (nabla F)^{-1}(sum w_i nabla F((1-alpha)p_i + alpha c))。init でウォームスタート。
+    戻り値: (centroid のリスト, 反復回数, 収束したか)"""
+    r = skew_jensen_centroid(as_points(points), weights, alpha, F_name, max_iter, tol, init)
+    return r['centroid'].tolist(), r['iterations'], r['converged']
+
+def kmeans_pp_seeds(points, k, divergence='squared', alpha=0.5, seed=None):
+    """k-means++ 風の初期化: ダイバージェンスに基づく確率的 D^2 重み付きサンプリング。
+    divergence は 'bregman'（F=squared）か、スキュー Jensen の生成関数名。"""
+    X = as_points(points)
+    if divergence == 'bregman':
+        indices = bregman_kmeans_pp(X, k, 'bregman', alpha, 'squared', seed)
+    else:
+        indices = bregman_kmeans_pp(X, k, 'skew_jensen', alpha, divergence, seed)
+    return X[indices].tolist()
 
 
 @app.route('/api/divergence/jensen', methods=['POST'])
@@ -806,8 +814,10 @@ def api_centroid():
     weights = np.array(data.get('weights', [1.0 / len(points)] * len(points)))
     alpha = float(data.get('alpha', 0.5))
     F_name = data.get('F', 'squared')
-    c = centroid_cccp_skew_jensen(points, weights, alpha, F_name)
-    return jsonify({'centroid': c})
+    max_iter = min(int(data.get('max_iter', 100)), 1000)
+    tol = float(data.get('tol', 1e-10))
+    c, iterations, converged = centroid_cccp_skew_jensen(points, weights, alpha, F_name, max_iter, tol, data.get('init'))
+    return jsonify({'centroid': c, 'iterations': iterations, 'converged': converged})
 
 @app.route('/api/divergence/kmeans_pp', methods=['POST'])
 def api_kmeans_pp():
@@ -815,9 +825,45 @@ def api_kmeans_pp():
     points = np.array(data.get('points', [[0, 0], [1, 1], [2, 0], [0, 2]]))
     k = int(data.get('k', 2))
     alpha = float(data.get('alpha', 0.5))
-    seeds = kmeans_pp_seeds(points, k, 'squared', alpha)
+    seeds = kmeans_pp_seeds(points, k, data.get('F', 'squared'), alpha, data.get('seed'))
     return jsonify({'seeds': seeds})
 
+@app.route('/api/divergence/kmeans', methods=['POST'])
+def api_kmeans():
+    """Bregman / スキュー Jensen k-means（k-means++ 初期化＋Lloyd 反復）"""
+    data = request.get_json() or {}
+    points = as_points(data.get('points', [[0, 0], [1, 1], [2, 0], [0, 2]]))
+    k = int(data.get('k', 2))
+    divergence = data.get('divergence', 'skew_jensen')
+    alpha = float(data.get('alpha', 0.5))
+    F_name = data.get('F', 'squared')
+    max_iter = min(int(data.get('max_iter', 100)), 1000)
+    r = bregman_kmeans(points, k, divergence, alpha, F_name, max_iter=max_iter, seed=data.get('seed'))
+    return jsonify({'centers': r['centers'].tolist(), 'labels': r['labels'].tolist(), 'inertia': r['inertia'],
+                    'iterations': r['iterations'], 'seeds': r['seeds'].tolist()})
+
+@app.route('/api/divergence/pairwise', methods=['POST'])
+def api_pairwise():
+    """P (n×d) と Q (m×d) の全組のダイバージェンス行列。top_k を指定すると行ごとの近傍だけを返す。
+    行列全体が PAIRWISE_MAX_CELLS を超えるときは top_k が必要（Netlify の divergence と同じ）。"""
+    data = request.get_json() or {}
+    try:
+        P = as_points(data.get('P', [[0, 0], [1, 1]]))
+        Q = as_points(data['Q']) if data.get('Q') is not None else None
+        args = (data.get('divergence', 'skew_jensen'), data.get('F', 'squared'), float(data.get('alpha', 0.5)),
+                float(data.get('beta', 0.3)), float(data.get('gamma', 0.5)))
+        m = len(P) if Q is None else len(Q)
+        top_k = data.get('top_k')
+        if top_k is None:
+            if len(P) * m > PAIRWISE_MAX_CELLS:
+                raise ValueError('matrix too large (%d x %d); use top_k' % (len(P), m))
+            D = bregman_pairwise(P, Q, *args)
+            return jsonify({'shape': [len(P), m], 'matrix': D.tolist()})
+        indices, values = bregman_pairwise(P, Q, *args, top_k=int(top_k))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'shape': [len(P), m], 'indices': indices.tolist(), 'values': values.tolist()})
+
 
 # ========== 論文実装: 音声変換の損失式（CycleGAN-VC, StarGAN-VC） ==========
 